@@ -1,48 +1,267 @@
 import psycopg2 as psql; # PostgresSQL Connector
 from psycopg2.extras import execute_values; # Insert many rows with one query.
-from psycopg2 import sql;
 import numpy as np; # For array manipulation and fast matrix math if needed.
 import pandas as pd;
 import dotenv;
+import os; import sys;
+# The shared modules live in ./common, next to the A1 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."));
+from common import db; # Pooled connections shared with the A2 scripts.
+from common import copy_text; # Column-wise DataFrame -> COPY text serialization.
+from common import copy_binary; # Column-wise DataFrame -> binary COPY encoding.
+from common import cli; # Shared flags and results of the non-interactive entry points.
+from common import instrument; # Per-operation timing of the database round trips (@instrument.traced).
+from common import prepared; # Server-side prepared statements of the single-row helpers.
+import csv; # Only used to read the header line of the CSV files for the COPY loader.
+import time; # Timing of the loaders, to report rows/sec.
+import queue; import threading; # Lets the chunked loader parse the next chunk while the current one is written.
+from concurrent.futures import ThreadPoolExecutor; # Worker pool of the parallel loader.
+
+# Where the CSV extracts live, relative to the parent directory of A1.
+CSV_PATHS = {
+    "customers": "./A1/CSV/customers.csv",
+    "orders": "./A1/CSV/orders.csv",
+    "deliveries": "./A1/CSV/deliveries.csv",
+};
+
+# Postgres type of every column the CSV files carry, from ./A1/SQL-Queries/create-tables.sql.
+# The COPY of the loaders encodes every column with its type, and the graph insert casts its VALUES to them.
+TABLE_COLUMN_TYPES = {
+    "customers": {"name": "text", "email": "text", "phone": "text", "address": "text"},
+    "orders": {"customer_id": "int4", "order_date": "date", "total_amount": "numeric",
+               "product_id": "int4", "product_category": "text", "product_name": "text"},
+    "deliveries": {"order_id": "int4", "delivery_date": "date", "status": "text"},
+};
+
+# Wire format of bulk_insert: "binary" sends values already encoded with the types above, "text" lets Postgres parse them.
+BULK_COPY_FORMAT = "binary";
+
+# How the loaders skip rows that are already in the table:
+# "columns" keeps a UNIQUE index over every attribute except the primary key (ON CONFLICT on all of them),
+# "hash" keeps a UNIQUE index over ONE BIGINT column, row_hash, a 64-bit fingerprint of the row computed in Python.
+DEDUP_MODE = "columns";
+ROW_HASH_COLUMN = "row_hash";
+
+# Settings of the chunked loader.
+CHUNK_SIZE = 50000; # Rows parsed and inserted at a time.
+COMMIT_EVERY = 10; # Commit after this many chunks.
+PREFETCH_CHUNKS = 1; # Chunks parsed ahead of the one being written, 0 turns the overlap off.
+
+# Settings of the parallel loader.
+PARALLEL_WORKERS = 4; # Worker threads, each one with its own database connection.
+KEY_RANGE_SIZE = 10000; # Customers per key range, orders and deliveries are split along the same ranges.
+
+# Settings of the graph insert.
+GRAPH_BATCH_SIZE = 1000; # Customer -> order -> delivery bundles inserted per transaction.
+
+# Primary key of every table, the parallel loader sets it explicitly instead of using the SERIAL.
+TABLE_PRIMARY_KEYS = {"customers": "customer_id", "orders": "order_id", "deliveries": "delivery_id"};
 # ==================================================== [HELPER FUNCTIONS] =================================================================== #
-def bulk_insert(table_name, df_arg, cursor_arg, conn_arg):
+def ensure_unique_index(table_name, cols, cursor_arg, conn_arg):
     '''
-    Inserts many rows at the same time into a particular table.
-    It also forces a constraint to make the combination of the rest of the attributes
-    except the primary key UNIQUE, so that during development the table does not quickly
-    get super large.
+    Creates the UNIQUE index over every attribute except the primary key, which is what the
+    ON CONFLICT clauses of the loaders use to skip rows that are already in the table.
     Returns a flag, 1 if successful, -1 is failed.
     '''
-    df_arg = pd.DataFrame(df_arg);
-    # Convert DataFrame to list of TUPLES.
-    records = [tuple(x) for x in df_arg.to_numpy()];
-
-    # The column names from the dataframe, as one string with , delimiters.
-    cols = ",".join(list(df_arg.columns));
-
-    # Enforces all attributes except the PK are not duplicated in the table.
     try:
         cursor_arg.execute(f"""
             CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_unique_index
             ON {table_name} ({cols})
             """);
         print(f"Unique constraint {table_name}_unique_index was succesfully added!");
+        return 1;
     except Exception as e:
         conn_arg.rollback();
         print(f"Error adding unique constraint to {table_name}: {e}")
         return -1;
 
+
+def ensure_row_hash(table_name, cursor_arg, conn_arg):
+    '''
+    Hash mode version of ensure_unique_index: adds the row_hash column with its UNIQUE index, and drops the
+    UNIQUE index over every attribute if an earlier run created it, so writes only maintain one 8 byte key.
+    Rows loaded before the column existed have a NULL row_hash, start on fresh tables (bulk delete) to deduplicate everything.
+    Returns a flag, 1 if successful, -1 is failed.
+    '''
+    try:
+        cursor_arg.execute(f"""
+            ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {ROW_HASH_COLUMN} BIGINT;
+            CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_row_hash_index ON {table_name} ({ROW_HASH_COLUMN});
+            DROP INDEX IF EXISTS {table_name}_unique_index;
+            """);
+        print(f"Unique constraint {table_name}_row_hash_index was succesfully added!");
+        return 1;
+    except Exception as e:
+        conn_arg.rollback();
+        print(f"Error adding the row hash to {table_name}: {e}");
+        return -1;
+
+
+def canonical_column(table_name, col, series):
+    '''
+    Converts a column to the type of the table column (see TABLE_COLUMN_TYPES), so the same value gets the same
+    fingerprint whether pandas inferred its type (bulk loader) or read it as text (chunked loader).
+    '''
+    col_type = TABLE_COLUMN_TYPES.get(table_name, {}).get(col, "text");
+    if(col_type in ("int2", "int4", "int8")):
+        return pd.to_numeric(series, errors="coerce").astype("Int64");
+    elif(col_type == "numeric"):
+        return pd.to_numeric(series, errors="coerce").astype(np.float64);
+    elif(col_type == "date"):
+        return pd.to_datetime(series, errors="coerce");
+    return series.astype("string");
+
+
+def fingerprint_rows(table_name, df_arg, drop_duplicates=True):
+    '''
+    Adds the row_hash column to a DataFrame: a 64-bit fingerprint of every row, computed for all rows at once with
+    pd.util.hash_pandas_object over the columns converted by canonical_column.
+    With drop_duplicates, rows whose fingerprint already appeared earlier in the frame are dropped before anything is
+    sent (duplicated() uses a hash table), the ones already in the table are skipped by ON CONFLICT (row_hash).
+    '''
+    canonical = pd.DataFrame({col: canonical_column(table_name, col, df_arg[col]) for col in df_arg.columns});
+    hashes = pd.util.hash_pandas_object(canonical, index=False).to_numpy().view(np.int64);
+    df_arg = df_arg.assign(**{ROW_HASH_COLUMN: hashes});
+    if(drop_duplicates):
+        df_arg = df_arg[~df_arg[ROW_HASH_COLUMN].duplicated().to_numpy()];
+    return df_arg;
+
+
+def create_staging_table(table_name, cols, cursor_arg):
+    '''
+    Creates an empty TEMPORARY table with the given columns of `table_name`, which is dropped
+    as soon as the transaction commits. The extra staging_row column remembers the order the rows
+    were copied in, so the SERIAL keys of the real table are handed out in the same order as the CSV file
+    (orders.csv and deliveries.csv refer to their parents by that order).
+    Returns the name of the staging table.
+    '''
+    staging_name = f"{table_name}_staging";
+    cursor_arg.execute(f"DROP TABLE IF EXISTS {staging_name}");
+    cursor_arg.execute(f"""
+        CREATE TEMPORARY TABLE {staging_name} ON COMMIT DROP AS
+        SELECT {cols} FROM {table_name} WITH NO DATA
+        """);
+    cursor_arg.execute(f"ALTER TABLE {staging_name} ADD COLUMN staging_row BIGSERIAL");
+    return staging_name;
+
+
+def merge_from_staging(table_name, staging_name, cols, cursor_arg, conflict_cols=None):
+    '''
+    Moves the rows of a staging table into the real table, with the same rule as bulk_insert:
+    if the exact same thing already exists, do not add it to the table.
+    `conflict_cols` are the columns of the UNIQUE index that decides it, all of `cols` by default.
+    Returns the number of rows that were actually added.
+    '''
+    cursor_arg.execute(f"""
+        INSERT INTO {table_name} ({cols})
+        SELECT {cols}
+        FROM {staging_name}
+        ORDER BY staging_row
+        ON CONFLICT ({conflict_cols or cols})
+        DO NOTHING
+        """);
+    return cursor_arg.rowcount;
+
+
+def copy_to_staging(staging_name, df_arg, column_types, cursor_arg):
+    '''
+    Sends a DataFrame to a staging table with COPY, in the BULK_COPY_FORMAT wire format: binary values encoded with
+    `column_types` (./common/copy_binary.py), or COPY text (./common/copy_text.py) that Postgres parses itself.
+    Values that do not fit their column raise, so the transaction is rolled back instead of loading NULLs.
+    Returns the number of rows copied.
+    '''
+    if(BULK_COPY_FORMAT == "binary"):
+        return copy_binary.copy_dataframe(df_arg, staging_name, column_types, cursor_arg);
+    return copy_text.copy_dataframe(df_arg, staging_name, cursor_arg, column_types=column_types);
+
+
+@instrument.traced
+def copy_insert(table_name, csv_path, cursor_arg, conn_arg):
+    '''
+    Streaming version of bulk_insert, for CSV extracts that are too big to hold in memory.
+    The CSV file is sent to Postgres with COPY FROM STDIN into a staging table, a few KB at a time,
+    and then merged into the real table with the same deduplication rules as bulk_insert.
+    Memory use stays flat no matter how big the file is, since the rows never become Python objects.
+
+    Args:
+        table_name (str): Name of the table to load (customers, orders or deliveries).
+        csv_path (str): Path to the CSV file, its header must use the column names of the table.
+        cursor_arg (cursor): psycopg2 cursor object.
+        conn_arg (connection): psycopg2 connection object.
+
+    Returns:
+        A flag, 1 if successful, -1 is failed.
+    '''
+    start_time = time.perf_counter();
+    try:
+        with open(csv_path, "r", encoding="utf-8", newline="") as csv_file:
+            # Only the header line is read in Python, COPY reads the rest of the file itself.
+            cols = ",".join(next(csv.reader([csv_file.readline()])));
+
+            if(ensure_unique_index(table_name, cols, cursor_arg, conn_arg) == -1):
+                return -1;
+
+            staging_name = create_staging_table(table_name, cols, cursor_arg);
+            cursor_arg.copy_expert(
+                sql=f"COPY {staging_name} ({cols}) FROM STDIN WITH (FORMAT csv)",
+                file=csv_file
+            );
+            copied_rows = cursor_arg.rowcount;
+
+        merged_rows = merge_from_staging(table_name, staging_name, cols, cursor_arg);
+
+        # commit() places the data in the real table, and drops the staging table.
+        conn_arg.commit();
+        elapsed = time.perf_counter() - start_time;
+        rows_per_sec = copied_rows / elapsed if elapsed > 0 else 0.0;
+        print(f"COPY LOAD INTO {table_name} SUCCESS! {copied_rows} rows copied, {merged_rows} new rows "
+              f"in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec)\n");
+        return 1;
+
+    except Exception as e:
+        conn_arg.rollback();
+        print(f"Error copying {csv_path} into {table_name}: {e}");
+        return -1;
+
+
+@instrument.traced
+def bulk_insert(table_name, df_arg, cursor_arg, conn_arg):
+    '''
+    Inserts many rows at the same time into a particular table.
+    It also forces a constraint to make the combination of the rest of the attributes
+    except the primary key UNIQUE, so that during development the table does not quickly
+    get super large.
+    The DataFrame is encoded column by column into binary COPY with the types of TABLE_COLUMN_TYPES
+    (see ./common/copy_binary.py, or COPY text with BULK_COPY_FORMAT = "text") and copied into a staging table,
+    instead of building one Python tuple per row for execute_values.
+    With DEDUP_MODE = "hash", rows are deduplicated by their row_hash fingerprint instead.
+    Returns a flag, 1 if successful, -1 is failed.
+    '''
+    df_arg = pd.DataFrame(df_arg);
+    column_types = TABLE_COLUMN_TYPES.get(table_name, {});
+
+    if(DEDUP_MODE == "hash"):
+        df_arg = fingerprint_rows(table_name, df_arg);
+        column_types = {**column_types, ROW_HASH_COLUMN: "int8"};
+        conflict_cols = ROW_HASH_COLUMN;
+        if(ensure_row_hash(table_name, cursor_arg, conn_arg) == -1):
+            return -1;
+    else:
+        # Enforces all attributes except the PK are not duplicated in the table.
+        conflict_cols = ",".join(list(df_arg.columns));
+        if(ensure_unique_index(table_name, conflict_cols, cursor_arg, conn_arg) == -1):
+            return -1;
+
+    # The column names from the dataframe, as one string with , delimiters.
+    cols = ",".join(list(df_arg.columns));
+
     # BULK INSERTION HAPPENS HERE, if the exact same thing already exists, do not add it
-    # to the table.
-    query = f"""
-    INSERT INTO {table_name} ({cols}) 
-    VALUES %s
-    ON CONFLICT ({cols}) 
-    DO NOTHING
-    """;
+    # to the table (merge_from_staging).
     try:
-        execute_values(cur=cursor_arg, sql=query, argslist=records);
-        
+        staging_name = create_staging_table(table_name, cols, cursor_arg);
+        copy_to_staging(staging_name, df_arg, column_types, cursor_arg);
+        merge_from_staging(table_name, staging_name, cols, cursor_arg, conflict_cols);
+
         # commit() places the data to the postgresSQL database.
         conn_arg.commit();
         print(f"BULK INSERT OPERATION INTO {table_name} SUCCESS!\n");
@@ -54,15 +273,302 @@ def bulk_insert(table_name, df_arg, cursor_arg, conn_arg):
         return -1;
 
 
-def bulk_delete(table_name, df_arg, conn_arg, cursor_arg):
+def coerce_chunk(table_name, chunk_df):
     '''
-    Deletes every entry from each table, but DOES NOT delete the table itself.
+    Converts a chunk of CSV text into the types of the table columns (see TABLE_COLUMN_TYPES).
+    Values that do not parse, and empty cells, become None so they are inserted as NULL.
+    Returns the chunk as a DataFrame of plain Python objects, which is what psycopg2 can adapt.
     '''
-    df_arg = pd.DataFrame(df_arg);
+    column_types = TABLE_COLUMN_TYPES.get(table_name, {});
+    for col in chunk_df.columns:
+        col_type = column_types.get(col, "text");
+        if(col_type in ("int2", "int4", "int8")):
+            chunk_df[col] = pd.to_numeric(chunk_df[col], errors="coerce").astype("Int64");
+        elif(col_type == "numeric"):
+            chunk_df[col] = pd.to_numeric(chunk_df[col], errors="coerce");
+        elif(col_type == "date"):
+            chunk_df[col] = pd.to_datetime(chunk_df[col], errors="coerce").dt.date;
+
+    chunk_df = chunk_df.astype(object);
+    return chunk_df.where(chunk_df.notna(), None);
+
+
+def read_csv_chunks(table_name, csv_path, chunk_size=CHUNK_SIZE):
+    '''
+    Generator that reads a CSV file `chunk_size` rows at a time, the same way bulk_insert reads the whole file:
+    pandas parses the numbers, and the text columns of `table_name` are kept as text (so "0123" keeps its zero).
+    The COPY encoders check every value against its column type. Only one chunk is held in memory at a time.
+    '''
+    text_cols = {col: str for col, col_type in TABLE_COLUMN_TYPES.get(table_name, {}).items() if col_type == "text"};
+    yield from pd.read_csv(filepath_or_buffer=csv_path, chunksize=chunk_size, dtype=text_cols);
+
+
+def prefetch_chunks(chunk_iter, prefetch=PREFETCH_CHUNKS):
+    '''
+    Runs a chunk generator on a background thread, so parsing chunk k+1 happens while chunk k is
+    being written to the database. At most `prefetch` parsed chunks wait in the queue, which keeps
+    memory bounded. Errors from the parsing thread are raised again in the caller.
+    '''
+    if(prefetch <= 0):
+        yield from chunk_iter;
+        return;
+
+    chunk_queue = queue.Queue(maxsize=prefetch);
+    stop_event = threading.Event();
+    end_of_chunks = object();
+
+    def producer():
+        try:
+            for chunk in chunk_iter:
+                # Wait for room in the queue, unless the consumer gave up.
+                while(not stop_event.is_set()):
+                    try:
+                        chunk_queue.put(chunk, timeout=0.1);
+                        break;
+                    except queue.Full:
+                        continue;
+                if(stop_event.is_set()):
+                    return;
+            chunk_queue.put(end_of_chunks);
+        except Exception as e:
+            chunk_queue.put(e);
+
+    parser_thread = threading.Thread(target=producer, daemon=True);
+    parser_thread.start();
+    try:
+        while(True):
+            chunk = chunk_queue.get();
+            if(chunk is end_of_chunks):
+                break;
+            if(isinstance(chunk, Exception)):
+                raise chunk;
+            yield chunk;
+    finally:
+        stop_event.set();
+
+
+@instrument.traced
+def chunked_insert(table_name, csv_path, cursor_arg, conn_arg, chunk_size=CHUNK_SIZE, commit_every=COMMIT_EVERY, prefetch=PREFETCH_CHUNKS):
+    '''
+    Bounded-memory version of bulk_insert: reads the CSV file one chunk at a time and loads every chunk the way
+    bulk_insert loads the whole file (COPY into a staging table, then merged with ON CONFLICT), committing every
+    `commit_every` chunks, so multi-GB files load with constant memory.
+    Uses the same UNIQUE index and ON CONFLICT rule as bulk_insert, so a failed load can simply be run again.
+
+    Args:
+        table_name (str): Name of the table to load (customers, orders or deliveries).
+        csv_path (str): Path to the CSV file, its header must use the column names of the table.
+        cursor_arg (cursor): psycopg2 cursor object.
+        conn_arg (connection): psycopg2 connection object.
+        chunk_size (int): Rows per chunk.
+        commit_every (int): Number of chunks per transaction.
+        prefetch (int): Chunks parsed ahead on a background thread, 0 to parse and write one after the other.
+        With DEDUP_MODE = "hash", every chunk gets its row_hash fingerprints and rows repeated inside it are dropped.
+
+    Returns:
+        A flag, 1 if successful, -1 is failed.
+    '''
+    start_time = time.perf_counter();
+    total_rows = 0; chunk_count = 0;
+    cols = None;
+    column_types = {**TABLE_COLUMN_TYPES.get(table_name, {}), ROW_HASH_COLUMN: "int8"};
+    try:
+        for chunk_df in prefetch_chunks(read_csv_chunks(table_name, csv_path, chunk_size), prefetch):
+            if(DEDUP_MODE == "hash"):
+                chunk_df = fingerprint_rows(table_name, chunk_df);
+            # The header is only known once the first chunk is parsed.
+            if(cols is None):
+                cols = ",".join(list(chunk_df.columns));
+                if(DEDUP_MODE == "hash"):
+                    conflict_cols = ROW_HASH_COLUMN;
+                    flag = ensure_row_hash(table_name, cursor_arg, conn_arg);
+                else:
+                    conflict_cols = cols;
+                    flag = ensure_unique_index(table_name, cols, cursor_arg, conn_arg);
+                if(flag == -1):
+                    return -1;
+
+            # The staging table is dropped by every commit, so each chunk gets a new one.
+            staging_name = create_staging_table(table_name, cols, cursor_arg);
+            copy_to_staging(staging_name, chunk_df, column_types, cursor_arg);
+            merge_from_staging(table_name, staging_name, cols, cursor_arg, conflict_cols);
+            total_rows += len(chunk_df);
+            chunk_count += 1;
+
+            if(chunk_count % commit_every == 0):
+                conn_arg.commit();
+
+        conn_arg.commit();
+        elapsed = time.perf_counter() - start_time;
+        rows_per_sec = total_rows / elapsed if elapsed > 0 else 0.0;
+        print(f"CHUNKED INSERT INTO {table_name} SUCCESS! {total_rows} rows in {chunk_count} chunks, "
+              f"{elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec)\n");
+        return 1;
+
+    except Exception as e:
+        # Only the chunks since the last commit are undone.
+        conn_arg.rollback();
+        print(f"Error inserting chunk {chunk_count + 1} of {csv_path} into {table_name}: {e}");
+        return -1;
+
+
+def load_table(table_name, loader, df_arg, cursor_arg, conn_arg, chunk_size=CHUNK_SIZE):
+    '''
+    Loads one table with the loader picked in main(): 0 = bulk_insert, 1 = copy_insert, 2 = chunked_insert.
+    copy_insert never reads the rows in Python, so it cannot fingerprint them, with DEDUP_MODE = "hash" the chunked loader is used instead.
+    Returns the flag of that loader, 1 if successful, -1 is failed.
+    '''
+    if(loader == 1 and DEDUP_MODE == "hash"):
+        print(f"The COPY loader cannot compute row hashes, loading {table_name} with the chunked loader...");
+        loader = 2;
+    if(loader == 1):
+        return copy_insert(table_name=table_name, csv_path=CSV_PATHS[table_name], cursor_arg=cursor_arg, conn_arg=conn_arg);
+    elif(loader == 2):
+        return chunked_insert(table_name=table_name, csv_path=CSV_PATHS[table_name], cursor_arg=cursor_arg, conn_arg=conn_arg, chunk_size=chunk_size);
+    return bulk_insert(table_name=table_name, df_arg=df_arg, cursor_arg=cursor_arg, conn_arg=conn_arg);
+
+
+@instrument.traced
+def insert_key_range(table_name, range_df, cursor_arg, conn_arg):
+    '''
+    Inserts one key range of a table, with its primary keys already set, and commits it.
+    The range is copied into a staging table like bulk_insert does, then inserted in key order.
+    Rows that clash with the primary key or the UNIQUE index are skipped, so ranges can be loaded again.
+    Returns a flag, 1 if successful, -1 is failed.
+    '''
+    cols = ",".join(list(range_df.columns));
+    column_types = {**TABLE_COLUMN_TYPES.get(table_name, {}), TABLE_PRIMARY_KEYS[table_name]: "int4", ROW_HASH_COLUMN: "int8"};
+    try:
+        staging_name = create_staging_table(table_name, cols, cursor_arg);
+        copy_to_staging(staging_name, range_df, column_types, cursor_arg);
+        cursor_arg.execute(f"""
+            INSERT INTO {table_name} ({cols})
+            SELECT {cols}
+            FROM {staging_name}
+            ORDER BY staging_row
+            ON CONFLICT DO NOTHING
+            """);
+        conn_arg.commit();
+        return 1;
+    except Exception as e:
+        conn_arg.rollback();
+        print(f"Error inserting key range into {table_name}: {e}");
+        return -1;
+
+
+@instrument.traced
+def parallel_load(cust_df, ord_df, del_df, manager, workers=PARALLEL_WORKERS, range_size=KEY_RANGE_SIZE):
+    '''
+    Loads customers, orders and deliveries in parallel, split into key ranges, with one pooled connection per worker thread.
+
+    The CSV files refer to their parents by position (orders.customer_id = row number in customers.csv, and so on),
+    which is the SERIAL key they get on fresh tables. Ranges committed out of order would break that, so here every
+    row gets its position as an explicit primary key, and the sequences are moved past them at the end.
+    Positions are only the right keys on EMPTY tables, so nothing is loaded if customers, orders or deliveries
+    already have rows (truncate them first with bulk_delete()).
 
-    # Required to be a list of tuples for execute_values.
-    records = [tuple(x) for x in df_arg.to_numpy()];
+    Customers are split into ranges of `range_size` keys. The orders of range k only wait for customers range k
+    to commit, and the deliveries of those orders only wait for the orders of range k, instead of the whole table.
+    Tasks are submitted parents first, so a task that waits on its parent range never blocks a free worker
+    from picking that parent up, and a task only holds a connection while it is inserting.
 
+    Args:
+        cust_df, ord_df, del_df (DataFrame): Contents of customers.csv, orders.csv and deliveries.csv.
+        manager (db.ConnectionManager): Pool the workers borrow their connections from, it should hold at least `workers` connections.
+        workers (int): Number of worker threads.
+        range_size (int): Customers per key range.
+
+    Returns:
+        A dict with the flag of each table, 1 if every range was loaded, -1 if any range failed or a table is not empty.
+    '''
+    start_time = time.perf_counter();
+
+    # Give every row its position as the primary key.
+    cust_df = pd.DataFrame(cust_df); ord_df = pd.DataFrame(ord_df); del_df = pd.DataFrame(del_df);
+    if(DEDUP_MODE == "hash"):
+        # Repeated rows are kept here, dropping them would shift the positions the children refer to.
+        # ON CONFLICT skips them when they are inserted.
+        cust_df = fingerprint_rows("customers", cust_df, drop_duplicates=False);
+        ord_df = fingerprint_rows("orders", ord_df, drop_duplicates=False);
+        del_df = fingerprint_rows("deliveries", del_df, drop_duplicates=False);
+    cust_df.insert(0, "customer_id", np.arange(1, len(cust_df) + 1));
+    ord_df.insert(0, "order_id", np.arange(1, len(ord_df) + 1));
+    del_df.insert(0, "delivery_id", np.arange(1, len(del_df) + 1));
+
+    # Range of every customer, of every order (the range of its customer) and every delivery (the range of its order).
+    # Rows without a valid parent go to range 0, the parent's foreign key decides if they are accepted.
+    range_count = max(1, int(np.ceil(len(cust_df) / range_size)));
+    cust_range = (cust_df["customer_id"].to_numpy() - 1) // range_size;
+    ord_customer = pd.to_numeric(ord_df["customer_id"], errors="coerce").fillna(0).to_numpy(dtype=np.int64);
+    ord_range = np.clip((ord_customer - 1) // range_size, 0, range_count - 1);
+    del_order = pd.to_numeric(del_df["order_id"], errors="coerce").fillna(0).to_numpy(dtype=np.int64);
+    del_order_valid = (del_order >= 1) & (del_order <= len(ord_df));
+    del_range = np.zeros(len(del_df), dtype=np.int64);
+    del_range[del_order_valid] = ord_range[del_order[del_order_valid] - 1];
+
+    # The UNIQUE indexes are created once up front, not by every worker.
+    with manager.connection() as setup_conn:
+        setup_cursor = setup_conn.cursor();
+        # Existing rows already hold some of the positional keys, and their children would point to the wrong parents.
+        for table_name in TABLE_PRIMARY_KEYS:
+            setup_cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})");
+            if(setup_cursor.fetchone()[0]):
+                setup_conn.rollback();
+                print(f"Parallel load failed!\n The {table_name} table is not empty, the parallel loader only loads into empty tables.");
+                return {"customers": -1, "orders": -1, "deliveries": -1};
+        for table_name, table_df in (("customers", cust_df), ("orders", ord_df), ("deliveries", del_df)):
+            if(DEDUP_MODE == "hash"):
+                flag = ensure_row_hash(table_name, setup_cursor, setup_conn);
+            else:
+                cols = ",".join([col for col in table_df.columns if col != TABLE_PRIMARY_KEYS[table_name]]);
+                flag = ensure_unique_index(table_name, cols, setup_cursor, setup_conn);
+            if(flag == -1):
+                return {"customers": -1, "orders": -1, "deliveries": -1};
+        setup_conn.commit();
+
+    def load_range(table_name, range_df, parent_future):
+        # Wait until the parent range is committed, and skip this range if the parent failed.
+        if(parent_future is not None and parent_future.result() != 1):
+            print(f"Parent range failed, {len(range_df)} rows of {table_name} remain untouched...");
+            return -1;
+        with manager.connection() as conn_arg:
+            return insert_key_range(table_name, range_df, conn_arg.cursor(), conn_arg);
+
+    futures = {"customers": [], "orders": [], "deliveries": []};
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for k in range(range_count):
+            futures["customers"].append(executor.submit(load_range, "customers", cust_df[cust_range == k], None));
+        for k in range(range_count):
+            futures["orders"].append(executor.submit(load_range, "orders", ord_df[ord_range == k], futures["customers"][k]));
+        for k in range(range_count):
+            futures["deliveries"].append(executor.submit(load_range, "deliveries", del_df[del_range == k], futures["orders"][k]));
+
+    flags = {};
+    for table_name, table_futures in futures.items():
+        flags[table_name] = 1 if all(future.result() == 1 for future in table_futures) else -1;
+
+    # Move the SERIAL sequences past the explicit keys, so the single-row inserts that follow do not collide.
+    with manager.transaction() as (setup_conn, setup_cursor):
+        for table_name, key in TABLE_PRIMARY_KEYS.items():
+            setup_cursor.execute(f"""
+                SELECT setval(pg_get_serial_sequence('{table_name}', '{key}'), COALESCE(MAX({key}), 1))
+                FROM {table_name}
+                """);
+
+    elapsed = time.perf_counter() - start_time;
+    total_rows = len(cust_df) + len(ord_df) + len(del_df);
+    rows_per_sec = total_rows / elapsed if elapsed > 0 else 0.0;
+    print(f"PARALLEL LOAD FINISHED! {total_rows} rows in {range_count} key ranges with {workers} workers, "
+          f"{elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec)\n");
+    return flags;
+
+
+@instrument.traced
+def bulk_delete(table_name, df_arg, conn_arg, cursor_arg):
+    '''
+    Deletes every entry from each table, but DOES NOT delete the table itself.
+    df_arg is not used, TRUNCATE does not need the rows.
+    '''
     # Truncate the table to reset the PKs when the data is deleted from a table.
     query = f"""TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE""";
 
@@ -78,6 +584,7 @@ def bulk_delete(table_name, df_arg, conn_arg, cursor_arg):
         return -1;
 
 
+@instrument.traced
 def single_insert(table_name, row_dict, returning_col, cursor_arg, conn_arg):
     """
     Inserts ONE row into a given table.
@@ -99,16 +606,10 @@ def single_insert(table_name, row_dict, returning_col, cursor_arg, conn_arg):
         cols = list(row_dict.keys());
         vals = list(row_dict.values());
 
-        # Build safe SQL identifiers using psycopg2.sql
-        query = sql.SQL("INSERT INTO {table} ({fields}) VALUES ({placeholders}) RETURNING {returning};").format(
-            table=sql.Identifier(table_name),
-            fields=sql.SQL(", ").join(map(sql.Identifier, cols)),
-            placeholders=sql.SQL(", ").join(sql.Placeholder() * len(cols)),
-            returning=sql.Identifier(returning_col)
-        )
-
-        # Execute query
-        cursor_arg.execute(query, vals);
+        # Safe SQL identifiers with psycopg2.sql, composed once per (table, columns) and PREPAREd once per connection,
+        # every later call only sends EXECUTE with the values.
+        query = prepared.insert_statement(table_name, cols, returning_col, cursor_arg);
+        prepared.execute(query, vals, cursor_arg);
         result = cursor_arg.fetchone()[0];
 
         conn_arg.commit();
@@ -120,25 +621,328 @@ def single_insert(table_name, row_dict, returning_col, cursor_arg, conn_arg):
         print(f"Error inserting into {table_name}: {e}");
         return None;
 
-# ==================================================== [MAIN FUNCTION] =================================================================== #
-def main():
-    # STEP 1: Read the csv files into panda dataframes.
-    cust_df = pd.read_csv(filepath_or_buffer="./A1/CSV/customers.csv");
-    ord_df = pd.read_csv(filepath_or_buffer="./A1/CSV/orders.csv");
-    del_df = pd.read_csv(filepath_or_buffer="./A1/CSV/deliveries.csv");
+# ==================================================== [GRAPH INSERT] =================================================================== #
+def insert_level(table_name, level_df, cursor_arg):
+    '''
+    Inserts the rows of one table of a batch of bundles with ONE statement, and returns the primary key of every row.
+    Every row gets its key from the SERIAL sequence inside the statement, so the keys RETURNING hands back can be matched
+    to the rows they were sent for. Rows skipped by ON CONFLICT (already in the table, with the UNIQUE index of either
+    DEDUP_MODE) get the key of the row they clash with instead. Identical rows of the batch are sent once and share a key,
+    the second one would not see the first one inserted by the same statement.
+    Raises a ValueError if a row was neither inserted nor found.
+
+    Args:
+        table_name (str): customers, orders or deliveries.
+        level_df (DataFrame): The rows, with the columns of TABLE_COLUMN_TYPES (parent keys already filled in).
+        cursor_arg (cursor): psycopg2 cursor object.
 
-    # List of dataframes.
-    dataframes_list = [cust_df, ord_df, del_df];
+    Returns:
+        NumPy array with the primary key of every row of `level_df`, in order.
+    '''
+    key = TABLE_PRIMARY_KEYS[table_name];
+    cols = list(TABLE_COLUMN_TYPES[table_name]);
+    column_types = {**TABLE_COLUMN_TYPES[table_name], ROW_HASH_COLUMN: "int8"};
+    if(DEDUP_MODE == "hash"):
+        level_df = fingerprint_rows(table_name, level_df[cols], drop_duplicates=False);
+        cols = cols + [ROW_HASH_COLUMN];
+        match_cols = [ROW_HASH_COLUMN];
+    else:
+        match_cols = cols;
+    level_df = coerce_chunk(table_name, level_df[cols].copy());
 
+    # Number of the group of identical rows of every row, only the first row of each group is sent.
+    groups = level_df.groupby(cols, dropna=False, sort=False).ngroup().to_numpy();
+    first_rows = ~pd.Series(groups).duplicated().to_numpy();
+    records = [(int(group), *values) for group, values in zip(groups[first_rows], level_df[first_rows].itertuples(index=False, name=None))];
+
+    col_list = ", ".join(cols);
+    query = f"""
+    WITH input AS MATERIALIZED (
+        SELECT nextval(pg_get_serial_sequence('{table_name}', '{key}')) AS new_key, v.*
+        FROM (VALUES %s) AS v (input_row, {col_list})
+    ),
+    inserted AS (
+        INSERT INTO {table_name} ({key}, {col_list})
+        SELECT new_key, {col_list}
+        FROM input
+        ORDER BY input_row
+        ON CONFLICT DO NOTHING
+        RETURNING {key}
+    )
+    SELECT input.input_row, COALESCE(inserted.{key}, existing.{key})
+    FROM input
+    LEFT JOIN inserted ON inserted.{key} = input.new_key
+    LEFT JOIN LATERAL (
+        SELECT t.{key}
+        FROM {table_name} AS t
+        WHERE inserted.{key} IS NULL AND {" AND ".join(f"t.{col} = input.{col}" for col in match_cols)}
+        LIMIT 1
+    ) AS existing ON TRUE
+    """;
+    # The casts give the VALUES the types of the table, so they can be compared with its columns.
+    template = "(%s, " + ", ".join(f"%s::{column_types.get(col, 'text')}" for col in cols) + ")";
+    rows = execute_values(cur=cursor_arg, sql=query, argslist=records, template=template, page_size=len(records), fetch=True);
+
+    keys_by_group = dict(rows);
+    if(any(keys_by_group.get(group) is None for group in range(len(records)))):
+        raise ValueError(f"Some {table_name} rows were neither inserted nor found.");
+    return np.array([keys_by_group[group] for group in groups], dtype=np.int64);
+
+
+@instrument.traced
+def insert_bundles(bundles, cursor_arg, conn_arg, batch_size=GRAPH_BATCH_SIZE):
+    '''
+    Inserts many customer -> order -> delivery bundles, `batch_size` bundles per transaction.
+    Every batch costs one multi-row INSERT ... RETURNING per table (see insert_level) and ONE commit: the customer ids it
+    returns are written into the orders in memory, and the order ids into the deliveries, instead of inserting,
+    committing and reading back one row at a time.
+    Like the loaders, rows that are already in the table are not inserted again, the bundle gets the keys of the existing rows.
+
+    Args:
+        bundles (list): Dicts like {"customer": {name, email, phone, address}, "orders": [{order_date, total_amount,
+            product_id, product_category, product_name, "deliveries": [{delivery_date, status}, ...]}, ...]}.
+            Missing columns are NULL, customer_id and order_id are filled in.
+        cursor_arg (cursor): psycopg2 cursor object.
+        conn_arg (connection): psycopg2 connection object.
+        batch_size (int): Bundles per transaction.
+
+    Returns:
+        A list with the keys of every bundle, {"customer_id", "orders": [{"order_id", "delivery_ids": [...]}, ...]}.
+        None if a batch failed, that batch is rolled back but the batches before it stay committed.
+    '''
+    # The UNIQUE indexes ON CONFLICT relies on, once for all the batches.
+    for table_name in TABLE_PRIMARY_KEYS:
+        if(DEDUP_MODE == "hash"):
+            flag = ensure_row_hash(table_name, cursor_arg, conn_arg);
+        else:
+            flag = ensure_unique_index(table_name, ",".join(TABLE_COLUMN_TYPES[table_name]), cursor_arg, conn_arg);
+        if(flag == -1):
+            return None;
+    conn_arg.commit();
+
+    start_time = time.perf_counter();
+    results = [];
+    for start in range(0, len(bundles), batch_size):
+        batch = bundles[start:start + batch_size];
+        # One row per customer, order and delivery, with the position of its parent in the level above.
+        customers = [bundle["customer"] for bundle in batch];
+        orders = []; order_parents = []; deliveries = []; delivery_parents = [];
+        for bundle_row, bundle in enumerate(batch):
+            for order in bundle.get("orders", []):
+                order_parents.append(bundle_row);
+                orders.append(order);
+                for delivery in order.get("deliveries", []):
+                    delivery_parents.append(len(orders) - 1);
+                    deliveries.append(delivery);
+        try:
+            customer_ids = insert_level("customers", pd.DataFrame(customers, columns=list(TABLE_COLUMN_TYPES["customers"])), cursor_arg);
+            order_ids = np.array([], dtype=np.int64);
+            if(len(orders) > 0):
+                orders_df = pd.DataFrame(orders, columns=list(TABLE_COLUMN_TYPES["orders"]));
+                orders_df["customer_id"] = customer_ids[order_parents];
+                order_ids = insert_level("orders", orders_df, cursor_arg);
+            delivery_ids = np.array([], dtype=np.int64);
+            if(len(deliveries) > 0):
+                deliveries_df = pd.DataFrame(deliveries, columns=list(TABLE_COLUMN_TYPES["deliveries"]));
+                deliveries_df["order_id"] = order_ids[delivery_parents];
+                delivery_ids = insert_level("deliveries", deliveries_df, cursor_arg);
+            conn_arg.commit();
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"Graph insert of bundles {start} to {start + len(batch) - 1} failed!\n", e);
+            return None;
+
+        # Same shape as the bundles, with the keys.
+        batch_results = [{"customer_id": int(customer_id), "orders": []} for customer_id in customer_ids];
+        for order_row, bundle_row in enumerate(order_parents):
+            batch_results[bundle_row]["orders"].append({"order_id": int(order_ids[order_row]), "delivery_ids": []});
+        order_results = [order for bundle_result in batch_results for order in bundle_result["orders"]];
+        for delivery_row, order_row in enumerate(delivery_parents):
+            order_results[order_row]["delivery_ids"].append(int(delivery_ids[delivery_row]));
+        results.extend(batch_results);
+
+    elapsed = time.perf_counter() - start_time;
+    print(f"GRAPH INSERT OF {len(bundles)} BUNDLES SUCCESS! {elapsed:.2f}s ({len(bundles) / elapsed if elapsed > 0 else 0.0:,.0f} bundles/sec)");
+    return results;
+
+def count_rows(cursor_arg, conn_arg):
+    '''
+    Returns the number of rows of every table of the load, keyed by table name.
+    '''
+    counts = {};
+    for table_name in CSV_PATHS:
+        cursor_arg.execute(f"SELECT COUNT(*) FROM {table_name}");
+        counts[table_name] = cursor_arg.fetchone()[0];
+    conn_arg.commit();
+    return counts;
+
+
+def count_csv_rows(csv_path):
+    '''
+    Number of data lines of a CSV file (without the header), counted without parsing it. Used by the dry runs.
+    '''
+    with open(csv_path, "rb") as csv_file:
+        return max(sum(1 for _ in csv_file) - 1, 0);
+
+
+def load_tables(loader, manager, conn_arg, cursor_arg, chunk_size=CHUNK_SIZE, workers=PARALLEL_WORKERS):
+    '''
+    Loads the three CSV files with one of the loaders (0 = bulk, 1 = streaming COPY, 2 = chunked, 3 = parallel),
+    parents first, and only if the parent table was loaded.
+    Returns a dict with the flag of each table, 1 if successful, -1 if failed, 0 if it was not attempted.
+    '''
+    # Read the csv files into panda dataframes (not needed by the COPY and chunked loaders).
+    cust_df = None; ord_df = None; del_df = None;
+    if(loader == 0 or loader == 3):
+        cust_df = pd.read_csv(filepath_or_buffer=CSV_PATHS["customers"]);
+        ord_df = pd.read_csv(filepath_or_buffer=CSV_PATHS["orders"]);
+        del_df = pd.read_csv(filepath_or_buffer=CSV_PATHS["deliveries"]);
+
+    if(loader == 3):
+        return parallel_load(cust_df, ord_df, del_df, manager, workers=workers);
+
+    cust_flag = 0; ord_flag = 0; del_flag = 0;
+    cust_flag = load_table(table_name="customers", loader=loader, df_arg=cust_df, cursor_arg=cursor_arg, conn_arg=conn_arg, chunk_size=chunk_size);
+
+    # Only insert into Orders, if inserting into Customers was successful.
+    if(cust_flag == 1):
+        ord_flag = load_table(table_name="orders", loader=loader, df_arg=ord_df, cursor_arg=cursor_arg, conn_arg=conn_arg, chunk_size=chunk_size);
+    else:
+        print("Customer Insertion failed, Orders table remains untouched...\n");
+
+    # Only insert into Deliveries, if inserting into Orders was successful.
+    if(ord_flag == 1):
+        del_flag = load_table(table_name="deliveries", loader=loader, df_arg=del_df, cursor_arg=cursor_arg, conn_arg=conn_arg, chunk_size=chunk_size);
+    else:
+        print("Order Insertion failed, Delivieries table remains untouched...\n");
+    return {"customers": cust_flag, "orders": ord_flag, "deliveries": del_flag};
+
+
+def run_sample_inserts(psql_cursor, conn):
+    '''
+    The inserts and updates asked by the assignment, run after the CSV files are loaded.
+    '''
+    # ============================== [STEP 3: ADD UPDATE DATA WITH PYTHON.] =========================
+    # Adding customer Liam and one more customer, each with an order and its delivery, in ONE graph insert:
+    # one INSERT per table and one commit, the new customer ids are written into the orders and the order ids
+    # into the deliveries in memory. Rerunning it gives back the keys of the rows inserted the first time.
+    bundles = [
+        {
+            "customer": {"name": "Liam Nelson", "email": "liam.nelson@example.com", "phone": "555-2468", "address": "111 Elm Street"},
+            "orders": [{
+                "order_date": "2025-06-01", "total_amount": "180.00", "product_id": "116",
+                "product_category": "Electronics", "product_name": "Bluetooth Speaker",
+                "deliveries": [{"delivery_date": "2025-06-03", "status": "Pending"}],
+            }],
+        },
+        {
+            "customer": {"name": "Carlos Morera Pinilla", "email": "carlos.morerapinilla@ucalgary.ca", "phone": "123-4567", "address": "1902 Starlight Blvd"},
+            "orders": [{
+                "order_date": "2025-09-17", "total_amount": 110.50, "product_id": 117,
+                "product_category": "Appliances", "product_name": "Toaster Oven",
+                "deliveries": [{"delivery_date": "2025-09-21", "status": "Pending"}],
+            }],
+        },
+    ];
+    bundle_keys = insert_bundles(bundles, cursor_arg=psql_cursor, conn_arg=conn);
+    if(bundle_keys is None):
+        return;
+    for bundle_key in bundle_keys:
+        print("New customer id:", bundle_key["customer_id"], "orders:", bundle_key["orders"]);
+
+    # Update Liam's delivery status to 'Shipped', and delivery_id = 3 to Delivered, in one transaction.
+    psql_cursor.execute(
+        query="""
+        UPDATE deliveries
+        SET status = %s
+        WHERE delivery_id = %s
+        """,
+        vars=("Shipped", bundle_keys[0]["orders"][0]["delivery_ids"][0])
+    );
+    psql_cursor.execute(
+        query="""
+        UPDATE deliveries
+        SET status = %s
+        WHERE delivery_id = %s
+        """,
+        vars=("Delivered", 3)
+    );
+    conn.commit();
+
+
+def run(endpoint, database, password, mode="load", loader=0, batch_size=CHUNK_SIZE, workers=PARALLEL_WORKERS, dry_run=False, samples=False):
+    '''
+    Runs the load without any prompt, so it can be scheduled, or called from other Python code.
+
+    Args:
+        endpoint (str): Database endpoint, or localhost.
+        database (str): PostgreSQL database name.
+        password (str): Password of the postgres user.
+        mode (str): "truncate" empties the three tables, "load" loads the CSV files (reruns skip the rows already loaded).
+        loader (int): 0 = bulk, 1 = streaming COPY, 2 = chunked, 3 = parallel.
+        batch_size (int): Rows per chunk of the chunked loader.
+        workers (int): Worker threads of the parallel loader.
+        dry_run (bool): Only count what would be deleted / loaded, nothing is written.
+        samples (bool): Also run the single-row inserts of the assignment (run_sample_inserts) after loading.
+
+    Returns:
+        A dict with the mode, the rows deleted or added, the elapsed seconds, the rows/sec and the flag of every table.
+        `error` is set if the connection failed. The pool is left open, the caller closes it (db.close_all()).
+    '''
+    start_time = time.perf_counter();
+    # Pooled connections, the parallel loader borrows one per worker from the same pool.
+    manager = db.get_manager(host=endpoint, database=database, user="postgres", password=password, max_conn=workers + 1);
+    with manager.connection() as conn:
+        # Check if connection succeeded.
+        if(conn.closed != 0):
+            return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error="Connection to database failed");
+        psql_cursor = conn.cursor();
+        before = count_rows(psql_cursor, conn);
+
+        if(mode == "truncate"):
+            flags = {table_name: 0 for table_name in CSV_PATHS};
+            if(not dry_run):
+                # Children first.
+                for table_name in reversed(list(CSV_PATHS)):
+                    flags[table_name] = bulk_delete(cursor_arg=psql_cursor, conn_arg=conn, table_name=table_name, df_arg=None);
+            rows = sum(before.values());
+            psql_cursor.close();
+            return cli.make_result(mode, rows, time.perf_counter() - start_time, dry_run, tables=before, flags=flags);
+
+        if(dry_run):
+            planned = {table_name: count_csv_rows(csv_path) for table_name, csv_path in CSV_PATHS.items()};
+            psql_cursor.close();
+            return cli.make_result(mode, sum(planned.values()), time.perf_counter() - start_time, dry_run,
+                                   loader=loader, tables=planned, existing_rows=before);
+
+        flags = load_tables(loader, manager, conn, psql_cursor, chunk_size=batch_size, workers=workers);
+        after = count_rows(psql_cursor, conn);
+        added = {table_name: after[table_name] - before[table_name] for table_name in CSV_PATHS};
+        if(samples):
+            run_sample_inserts(psql_cursor, conn);
+        psql_cursor.close();
+    return cli.make_result(mode, sum(added.values()), time.perf_counter() - start_time, dry_run,
+                           loader=loader, tables=added, flags=flags);
+
+# ==================================================== [MAIN FUNCTION] =================================================================== #
+def main():
     want_to_delete = int(input("""Bulk Delete values in tables? [1 for Yes, 0 for No]\nNOTE: Recommend to run (1) first to start on fresh tables, then run (0) afterwards: """));
     print("You inputted:", want_to_delete);
     if(want_to_delete != 1 and want_to_delete != 0):
         print("Incorrect Response, please only use 1 or 0 to answer");
         return;
 
+    # The COPY and chunked loaders never read a whole CSV file into pandas, so they work for files of any size.
+    loader = 0;
+    if(want_to_delete == 0):
+        loader = int(input("""Loader to use? [0 for bulk (in-memory DataFrame), 1 for streaming COPY, 2 for chunked (big CSV files), 3 for parallel]: """));
+        if(loader not in (0, 1, 2, 3)):
+            print("Incorrect Response, please only use 0, 1, 2 or 3 to answer");
+            return;
+
     PASSWORD = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD")); # Stores the password safely away.
     ENDPOINT = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT"));
-    # ========================== [STEP 2: DATABASE OPERATIONS] ================================== #
+    # ========================== [DATABASE OPERATIONS] ================================== #
     DATABASE_NAME = str();
     db_server_in = input("Please input the DB Endpoint server you want to connect to (or type localhost): ").strip().lower();
     
@@ -151,172 +955,41 @@ def main():
         print("Endpoint string is NOT VALID, please add your endpoint to your own .env file under the key DB_ENDPOINT.");
         return;
 
-    conn = psql.connect(
-        host= ENDPOINT, # NOTE: Could change to input so I can swap between AWS and my local server.
-        database=DATABASE_NAME,
-        user="postgres",
-        password=PASSWORD
-    );
-
-    # Check if connection succeeded, if not close it.
-    if(conn.closed != 0):
-        print("Connection to database failed, something went wrong...");
-        conn.rollback();
-        conn.close();
-    
-    else:
-        print("Connection to database was successful!\n");
-        # Create a cursor to point to the SQL Database in order to make queries to it.
-        psql_cursor = conn.cursor();
-
-        # Drop the tables (ONLY ALLOWED IF THE TABLES ALREADY EXIST.)
-        if(want_to_delete == 1):
-            print("Using bulk delete...\n");
-            bulk_delete(cursor_arg=psql_cursor, conn_arg=conn, table_name="deliveries", df_arg=del_df);
-            bulk_delete(cursor_arg=psql_cursor, conn_arg=conn, table_name="orders", df_arg=ord_df);
-            bulk_delete(cursor_arg=psql_cursor, conn_arg=conn, table_name="customers", df_arg=cust_df);
-            return;
-        
-        # Insert bulk data into all 3 tables.
-        cust_flag = 0; ord_flag = 0; del_flag = 0;
-        
-        cust_flag = bulk_insert(table_name="customers", df_arg=cust_df, cursor_arg=psql_cursor, conn_arg=conn);
-        
-        # Only insert into Orders, if inserting into Customers was successful.
-        if(cust_flag == 1):
-            ord_flag = bulk_insert(table_name="orders", df_arg=ord_df, cursor_arg=psql_cursor, conn_arg=conn);
-        else:
-            print("Customer Insertion failed, Orders table remains untouched...\n");
-        
-        # Only insert into Deliveries, if inserting into Orders was successful.
-        if(ord_flag == 1):
-            del_flag = bulk_insert(table_name="deliveries", df_arg=del_df, cursor_arg=psql_cursor, conn_arg=conn);
-        else:
-            print("Order Insertion failed, Delivieries table remains untouched...\n");
-        
-        if(del_flag == -1):
-            print("Delivery Insertion failed...\n");
-        else:
-            print("Delivery Insertion SUCCESS!\n");
-        
-
-        # ============================== [STEP 3: ADD UPDATE DATA WITH PYTHON.] =========================
-        # Adding customer Liam, and his order and delivery.
-        psql_cursor.execute(
-            query="""
-            INSERT INTO customers (name, email, phone, address)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (name, email, phone, address)
-            DO NOTHING
-            RETURNING customer_id
-            """,
-            vars=("Liam Nelson", "liam.nelson@example.com", "555-2468", "111 Elm Street")
-        );
-        customer_id = None;
-        conn.commit();
-        if psql_cursor.rowcount > 0:
-            customer_id = psql_cursor.fetchone()[0];
-            print(f"{psql_cursor.rowcount} row(s) updated successfully.");
-        else:
-            print("No customer rows were updated.");
-
-        psql_cursor.execute(
-            query="""
-            INSERT INTO orders (customer_id, order_date, total_amount, product_id, product_category, product_name)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (customer_id, order_date, total_amount, product_id, product_category, product_name)
-            DO NOTHING
-            RETURNING order_id
-            """,
-            vars=(customer_id, "2025-06-01", "180.00", "116", "Electronics", "Bluetooth Speaker")
-        );
-        order_id = None;
-        conn.commit();
-        if psql_cursor.rowcount > 0:
-            order_id = psql_cursor.fetchone()[0];
-            print(f"{psql_cursor.rowcount} row(s) updated successfully.");
-        else:
-            print("No order rows were updated.");
-
-        psql_cursor.execute(
-            query="""
-            INSERT INTO deliveries (order_id, delivery_date, status) 
-            VALUES (%s, %s, %s)
-            ON CONFLICT (order_id, delivery_date, status)
-            DO NOTHING
-            RETURNING delivery_id
-            """,
-            vars=(order_id, "2025-06-03", "Pending")
-        );
-        delivery_id = None;
-        conn.commit();
-        if psql_cursor.rowcount > 0:
-            delivery_id = psql_cursor.fetchone()[0];
-            print(f"{psql_cursor.rowcount} row(s) updated successfully.");
-        else:
-            print("No delivery rows were updated.");
-
-        # Update Liam's delivery status to 'Shipped'
-        psql_cursor.execute(
-            query="""
-            UPDATE deliveries
-            SET status = %s
-            WHERE delivery_id = %s
-            """,
-            vars=("Shipped", delivery_id)
-        );
-        conn.commit();
-
-        # Adding one more customer, order and delivery.
-        new_cust = {
-            "name": "Carlos Morera Pinilla",
-            "email": "carlos.morerapinilla@ucalgary.ca",
-            "phone": "123-4567",
-            "address": "1902 Starlight Blvd"
-        }
-        new_cust_id = single_insert(table_name="customers", row_dict=new_cust, returning_col="customer_id", cursor_arg=psql_cursor, conn_arg=conn);
-        print("New customer id:", new_cust_id);
-
-        new_ord = {
-            "customer_id": new_cust_id,
-            "order_date": "2025-09-17",
-            "total_amount": 110.50,
-            "product_id": 117,
-            "product_category": "Appliances",
-            "product_name": "Toaster Oven"
-        }
-        new_ord_id = single_insert(table_name="orders", row_dict=new_ord, returning_col="order_id", cursor_arg=psql_cursor, conn_arg=conn);
-        print("New order id:", new_ord_id);
-
-        new_del = {
-            "order_id": new_ord_id,
-            "delivery_date": "2025-09-21",
-            "status": "Pending",
-        }
-        new_del_id = single_insert(table_name="deliveries", row_dict=new_del, returning_col="delivery_id", cursor_arg=psql_cursor, conn_arg=conn);
-        print("New delivery id:", new_del_id);
-
-        # Update delivery_id = 3, status to Delivered, on the deliveries table.
-        # Update Liam's delivery status to 'Shipped'
-        psql_cursor.execute(
-            query="""
-            UPDATE deliveries
-            SET status = %s
-            WHERE delivery_id = %s
-            """,
-            vars=("Delivered", 3)
-        );
-        conn.commit();
-
-        
-        # Close the cursor and database connection ALWAYS, when done.
-        psql_cursor.close();
-    
-    conn.close();
+    result = run(ENDPOINT, DATABASE_NAME, PASSWORD, mode="truncate" if want_to_delete == 1 else "load", loader=loader, samples=True);
+    cli.print_result(result);
+    # DB_INSTRUMENT=1 in the .env file.
+    if(instrument.ENABLED):
+        print(instrument.METRICS.summary());
+    db.close_all();
     print("END OF PROGRAM...\n");
     return;
 
 
+def cli_main(argv=None):
+    '''
+    Non-interactive entry point, for example:
+    py "./A1/load.py" --endpoint localhost --mode load --loader 2 --batch-size 100000
+    '''
+    parser = cli.base_parser("Load the A1 CSV files into PostgreSQL.", modes=["truncate", "load"], default_mode="load");
+    parser.add_argument("--loader", type=int, choices=[0, 1, 2, 3], default=0, help="0 bulk, 1 streaming COPY, 2 chunked, 3 parallel.");
+    parser.add_argument("--workers", type=int, default=PARALLEL_WORKERS, help="Worker threads of the parallel loader.");
+    parser.add_argument("--samples", action="store_true", help="Also run the single-row inserts of the assignment.");
+    args = parser.parse_args(argv);
+
+    endpoint = args.endpoint or cli.env_value("DB_ENDPOINT");
+    database = args.database or ("A1_SENG550_LOCAL_FINAL" if endpoint == "localhost" else "A1_SENG550_DBI");
+    with cli.instrumentation(args):
+        result = run(endpoint, database, cli.env_value("DB_PASSWORD"), mode=args.mode, loader=args.loader,
+                     batch_size=args.batch_size or CHUNK_SIZE, workers=args.workers, dry_run=args.dry_run, samples=args.samples);
+    cli.print_result(result, as_json=args.json);
+    db.close_all();
+    return result;
+
+
 # =========================================================================================================================================================
 if __name__ == "__main__":
-    main();
\ No newline at end of file
+    # Without arguments the script asks its questions, with arguments it runs from the command line.
+    if(len(sys.argv) > 1):
+        cli_main();
+    else:
+        main();
@@ -0,0 +1,41 @@
+-- Precomputed results of queries 1 to 3 of Part3.sql, kept up to date by part2.py
+-- (add_customer, update_customer_city, add_order with refresh_aggregates=True), by the SCD batch and by the
+-- batched order loads (fact_loader.load_orders with refresh_aggregates=True).
+-- A NULL city is stored as '' so it can be part of the primary keys.
+CREATE TABLE IF NOT EXISTS agg_customer_cities
+(
+	customer_id INT NOT NULL,
+	name TEXT NOT NULL,
+	city TEXT NOT NULL,
+	PRIMARY KEY (customer_id, name, city)
+);
+
+CREATE TABLE IF NOT EXISTS agg_city_sales
+(
+	customer_id INT NOT NULL,
+	name TEXT NOT NULL,
+	city TEXT NOT NULL,
+	total_amount NUMERIC,
+	PRIMARY KEY (customer_id, name, city)
+);
+
+CREATE TABLE IF NOT EXISTS agg_product_discounts
+(
+	product_id INT NOT NULL,
+	name TEXT NOT NULL,
+	sum_of_discounts NUMERIC,
+	PRIMARY KEY (product_id, name)
+);
+
+-- 1. Count the number of different cities each customer has lived in.
+SELECT name, NULLIF(city, '') AS city, COUNT(NULLIF(city, '')) OVER(PARTITION BY name)
+FROM agg_customer_cities
+GROUP BY name, city;
+
+-- 2. Total Sold Amount per City, based on the city they lived in at the time they placed the order.
+SELECT customer_id, name, NULLIF(city, '') AS city, total_amount
+FROM agg_city_sales;
+
+-- 3. Sum of (price-amount), at the time of the order.
+SELECT product_id, name, sum_of_discounts
+FROM agg_product_discounts;
@@ -12,9 +12,15 @@ CREATE TABLE IF NOT EXISTS dim_customers
 	-- that the row is the MOST RECENT data for this entity. CURRENT_TIMESTAMP extracts the
 	-- current date and time, which will be the defaule
 	valid_start_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
-	valid_end_date TIMESTAMP,
-	UNIQUE(customer_id, name, email, city)
+	valid_end_date TIMESTAMP WITH TIME ZONE
 );
+-- An entity has at most ONE current version (valid_end_date IS NULL), its older versions can have the same attributes,
+-- so a customer that moves back to an earlier city gets a new version (see ./A2/SQL/current-version-indexes.sql).
+CREATE UNIQUE INDEX IF NOT EXISTS dim_customers_current_idx
+ON dim_customers (customer_id)
+WHERE valid_end_date IS NULL;
+-- Tables created with the older UNIQUE constraint on every attribute, which rejected such a version.
+ALTER TABLE dim_customers DROP CONSTRAINT IF EXISTS dim_customers_customer_id_name_email_city_key;
 
 -- PRODUCTS SCD TYPE 2 TABLE.
 CREATE TABLE IF NOT EXISTS dim_products
@@ -25,13 +31,17 @@ CREATE TABLE IF NOT EXISTS dim_products
 	category TEXT,
 	price NUMERIC,
 	valid_start_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
-	valid_end_date TIMESTAMP,
-	UNIQUE(product_id, name, category, price)
+	valid_end_date TIMESTAMP WITH TIME ZONE
 );
+CREATE UNIQUE INDEX IF NOT EXISTS dim_products_current_idx
+ON dim_products (product_id)
+WHERE valid_end_date IS NULL;
+ALTER TABLE dim_products DROP CONSTRAINT IF EXISTS dim_products_product_id_name_category_price_key;
 
 -- ORDERS FACT TABLE
 -- Fact tables ALWAYS LINK TO THE CURRENT most recent data they link to.
 -- The dim tables have FOREIGN KEYS in the fact tables.
+-- ./A2/SQL/partition-fact-orders.sql turns it into monthly partitions of order_date.
 CREATE TABLE IF NOT EXISTS fact_orders
 (
 	order_id SERIAL PRIMARY KEY,
@@ -0,0 +1,21 @@
+-- Partial indexes for the CURRENT version of every entity (valid_end_date IS NULL).
+-- They only contain the current rows, so looking up an entity costs the same no matter how much
+-- history it has, and being UNIQUE they make sure an entity never has two current versions.
+-- create-2d-tables.sql creates them with the tables, part2.py also creates them when it starts (older databases).
+CREATE UNIQUE INDEX IF NOT EXISTS dim_customers_current_idx
+ON dim_customers (customer_id)
+WHERE valid_end_date IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS dim_products_current_idx
+ON dim_products (product_id)
+WHERE valid_end_date IS NULL;
+
+-- Current version of one customer.
+SELECT *
+FROM dim_customers
+WHERE customer_id = 1 AND valid_end_date IS NULL;
+
+-- Current versions of many products in one query.
+SELECT *
+FROM dim_products
+WHERE product_id = ANY(ARRAY[1, 2]) AND valid_end_date IS NULL;
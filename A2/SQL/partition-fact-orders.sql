@@ -0,0 +1,91 @@
+-- Range partitioning of fact_orders by order_date, one partition per month (in UTC) named fact_orders_YYYY_MM,
+-- plus fact_orders_default for the orders outside of every month created.
+-- Queries bounded on order_date only scan the months they need (partition pruning), and an old month is
+-- detached as a whole instead of deleting its rows.
+-- Run ONCE after create-2d-tables.sql, the existing orders are copied to the new table and their order_id are kept.
+-- Afterwards ./A2/scripts/partitions.py creates the upcoming months (part2.py calls it when it starts) and
+-- fact_loader.py creates the months of every batch before loading it.
+BEGIN;
+
+-- Partitions start at midnight UTC, whatever the time zone of the session.
+SET LOCAL TIME ZONE 'UTC';
+
+-- The old table is kept until the copy is checked, its index names are freed for the new table.
+ALTER TABLE fact_orders RENAME TO fact_orders_unpartitioned;
+ALTER TABLE fact_orders_unpartitioned RENAME CONSTRAINT fact_orders_pkey TO fact_orders_unpartitioned_pkey;
+ALTER TABLE fact_orders_unpartitioned RENAME CONSTRAINT fact_orders_product_id_customer_id_amount_key TO fact_orders_unpartitioned_unique_key;
+
+-- Every PRIMARY KEY / UNIQUE constraint of a partitioned table has to include the partition key,
+-- so the same order (product, customer, amount) is now only rejected when it is placed at the same order_date.
+CREATE TABLE fact_orders
+(
+	-- Same sequence as the SERIAL of the old table, the next orders carry on from its last order_id.
+	order_id INT NOT NULL DEFAULT nextval('fact_orders_order_id_seq'),
+	product_id INT NOT NULL,
+	customer_id INT NOT NULL,
+	order_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+	amount NUMERIC,
+	PRIMARY KEY (order_id, order_date),
+	UNIQUE (product_id, customer_id, amount, order_date),
+	FOREIGN KEY (product_id) REFERENCES dim_products(id),
+	FOREIGN KEY (customer_id) REFERENCES dim_customers(id)
+) PARTITION BY RANGE (order_date);
+
+ALTER SEQUENCE fact_orders_order_id_seq OWNED BY fact_orders.order_id;
+
+CREATE TABLE fact_orders_default PARTITION OF fact_orders DEFAULT;
+
+-- One partition per month from the first order to 3 months from now.
+DO $$
+DECLARE
+	month_start TIMESTAMPTZ;
+BEGIN
+	FOR month_start IN
+		SELECT generate_series(
+			date_trunc('month', LEAST(COALESCE((SELECT MIN(order_date) FROM fact_orders_unpartitioned), now()), now())),
+			date_trunc('month', now()) + INTERVAL '3 months',
+			INTERVAL '1 month')
+	LOOP
+		EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF fact_orders FOR VALUES FROM (%L) TO (%L)',
+			'fact_orders_' || to_char(month_start, 'YYYY_MM'), month_start, month_start + INTERVAL '1 month');
+	END LOOP;
+END $$;
+
+INSERT INTO fact_orders (order_id, product_id, customer_id, order_date, amount)
+SELECT order_id, product_id, customer_id, order_date, amount
+FROM fact_orders_unpartitioned;
+
+COMMIT;
+
+-- Once the counts match, the old table can go.
+SELECT (SELECT COUNT(*) FROM fact_orders) AS partitioned, (SELECT COUNT(*) FROM fact_orders_unpartitioned) AS unpartitioned;
+-- DROP TABLE fact_orders_unpartitioned;
+
+-- Orders per partition.
+SELECT tableoid::regclass AS partition, COUNT(*)
+FROM fact_orders
+GROUP BY tableoid
+ORDER BY partition;
+
+-- Report 2 of Part3.sql for one month. The bounds on fo.order_date are constants, so the planner only keeps
+-- fact_orders_2025_01 (EXPLAIN shows no other partition).
+SELECT dc.customer_id, dc.name, dc.city, SUM(fo.amount) AS TOTAL_AMOUNT
+FROM fact_orders AS fo
+INNER JOIN dim_customers AS dc
+	ON fo.customer_id = dc.id
+WHERE fo.order_date >= '2025-01-01 00:00:00+00' AND fo.order_date < '2025-02-01 00:00:00+00'
+GROUP BY dc.customer_id, dc.name, dc.city;
+
+-- Report 3 of Part3.sql for the first quarter.
+SELECT dp.product_id, dp.name, SUM((dp.price - fo.amount)) AS sum_of_discounts
+FROM fact_orders AS fo
+INNER JOIN dim_products AS dp
+	ON fo.product_id = dp.id
+WHERE fo.order_date >= '2025-01-01 00:00:00+00' AND fo.order_date < '2025-04-01 00:00:00+00'
+GROUP BY dp.product_id, dp.name;
+
+-- Archive an old month: detach it and move it to the fact_archive schema, its rows are not copied.
+-- With CONCURRENTLY (outside of a transaction) the loaders are not blocked while it is detached.
+-- CREATE SCHEMA IF NOT EXISTS fact_archive;
+-- ALTER TABLE fact_orders DETACH PARTITION fact_orders_2025_01 CONCURRENTLY;
+-- ALTER TABLE fact_orders_2025_01 SET SCHEMA fact_archive;
@@ -0,0 +1,13 @@
+-- Point-in-time join of every order with the customer and product versions valid at its order_date,
+-- in ONE query (same result as query 4 of Part3.sql, without the temporary tables).
+
+-- fact_orders stores the surrogate ids (dim_customers.id, dim_products.id) of the versions valid at the order_date,
+-- so both joins are on the primary keys of the dimensions, without any date range.
+SELECT fo.order_id, fo.order_date, dc.customer_id, dc.name AS customer_name, dc.city AS customer_city,
+dp.product_id, dp.name AS product_name, dp.price AS product_price, fo.amount
+FROM fact_orders AS fo
+INNER JOIN dim_customers AS dc
+	ON dc.id = fo.customer_id
+INNER JOIN dim_products AS dp
+	ON dp.id = fo.product_id
+WHERE dc.customer_id = 1;
@@ -0,0 +1,50 @@
+-- Validity of every version as a range, for "which version was valid at time T" lookups.
+-- order_date BETWEEN valid_start_date AND COALESCE(valid_end_date, CURRENT_TIMESTAMP) cannot use an index,
+-- a GiST index on (business key, validity) answers validity @> T in O(log versions).
+-- Run after create-2d-tables.sql (asof_index.ensure_validity_ranges() does the same from Python).
+
+-- Needed for the = operator on the INT business key inside a GiST index.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- In tables created before valid_end_date became a TIMESTAMP WITH TIME ZONE (create-2d-tables.sql), it holds the
+-- local time of the session that retired the version. They are converted with the time zone of THIS session, so run it with the
+-- time zone the scripts run with (SHOW TIME ZONE). Skip these two statements if the column already has a time zone.
+ALTER TABLE dim_customers ALTER COLUMN valid_end_date TYPE TIMESTAMP WITH TIME ZONE;
+ALTER TABLE dim_products ALTER COLUMN valid_end_date TYPE TIMESTAMP WITH TIME ZONE;
+
+-- [valid_start_date, valid_end_date), a NULL end date (current version) is an unbounded range.
+-- Both ends are TIMESTAMPTZ, so the range is the same whatever the time zone of the session that computes it.
+-- Half-open, so when a version ends at the exact time the next one starts, T matches only the new one.
+ALTER TABLE dim_customers
+ADD COLUMN IF NOT EXISTS validity TSTZRANGE
+GENERATED ALWAYS AS (tstzrange(valid_start_date, valid_end_date, '[)')) STORED;
+
+ALTER TABLE dim_products
+ADD COLUMN IF NOT EXISTS validity TSTZRANGE
+GENERATED ALWAYS AS (tstzrange(valid_start_date, valid_end_date, '[)')) STORED;
+
+-- The exclusion constraints create the GiST indexes, and make sure the versions of an entity never overlap.
+ALTER TABLE dim_customers
+ADD CONSTRAINT dim_customers_validity_excl
+EXCLUDE USING gist (customer_id WITH =, validity WITH &&);
+
+ALTER TABLE dim_products
+ADD CONSTRAINT dim_products_validity_excl
+EXCLUDE USING gist (product_id WITH =, validity WITH &&);
+
+-- If the history already has overlapping versions the constraints above fail, use plain GiST indexes instead:
+-- CREATE INDEX IF NOT EXISTS dim_customers_validity_idx ON dim_customers USING gist (customer_id, validity);
+-- CREATE INDEX IF NOT EXISTS dim_products_validity_idx ON dim_products USING gist (product_id, validity);
+
+-- Version of customer 1 that was valid on 2025-06-01.
+SELECT *
+FROM dim_customers
+WHERE customer_id = 1 AND validity @> TIMESTAMPTZ '2025-06-01 00:00:00+00';
+
+-- fact_orders.customer_id is the surrogate id of the version valid at the order_date, this lists the orders
+-- where it is not (none, unless orders were loaded with the wrong version).
+SELECT fo.order_id, fo.order_date, dc.customer_id, dc.validity, fo.amount
+FROM fact_orders AS fo
+INNER JOIN dim_customers AS dc
+	ON fo.customer_id = dc.id
+WHERE NOT dc.validity @> fo.order_date;
@@ -95,3 +95,22 @@ db.getCollection("orders_summary").aggregate([
     },
   },
 ]);
+
+/* Same results as queries 1 to 3, read from the rollup collections kept up to date by etl.py,
+    so they do not scan orders_summary. */
+use("sales_db");
+db.getCollection("customer_rollups").aggregate([
+  {
+    $project: {
+      customer_name: "$customer_names",
+      cities: 1,
+      number_of_cities: { $size: "$cities" },
+    },
+  },
+]);
+
+use("sales_db");
+db.getCollection("city_rollups").find({}, { total_amount: 1 });
+
+use("sales_db");
+db.getCollection("product_rollups").find({}, { sum_of_discounts: 1 });
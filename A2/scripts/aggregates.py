@@ -0,0 +1,201 @@
+# Precomputed results of the three Part3 reports (./A2/SQL/Part3.sql, queries 1 to 3), kept up to date as orders and
+# dimension versions are written, so the reports are a plain SELECT instead of range joins over the whole fact table.
+#
+# The reports only change in two ways:
+# - A new customer version (add_customer, update_customer_city, the SCD batch) can add a city to report 1.
+# - A new order (add_order, fact_loader) adds its amount / discount to the customer and product versions it points to.
+# fact_orders.customer_id / product_id are the SURROGATE ids of the versions valid at the order_date (like Part3.sql,
+# the joins are on dim_customers.id / dim_products.id), so a new dimension version never moves an existing order to
+# another group, which is why update_product_price and the product merges have nothing to refresh: a new price only
+# applies to the orders that come after it, and those are added by their own refresh.
+# Cities are stored as '' when NULL, so they can be part of the primary keys.
+
+# Names of the aggregate tables, see ./A2/SQL/aggregates.sql.
+AGGREGATE_TABLES = ["agg_customer_cities", "agg_city_sales", "agg_product_discounts"];
+
+CREATE_AGGREGATES_SQL = """
+    CREATE TABLE IF NOT EXISTS agg_customer_cities
+    (
+        customer_id INT NOT NULL,
+        name TEXT NOT NULL,
+        city TEXT NOT NULL,
+        PRIMARY KEY (customer_id, name, city)
+    );
+
+    CREATE TABLE IF NOT EXISTS agg_city_sales
+    (
+        customer_id INT NOT NULL,
+        name TEXT NOT NULL,
+        city TEXT NOT NULL,
+        total_amount NUMERIC,
+        PRIMARY KEY (customer_id, name, city)
+    );
+
+    CREATE TABLE IF NOT EXISTS agg_product_discounts
+    (
+        product_id INT NOT NULL,
+        name TEXT NOT NULL,
+        sum_of_discounts NUMERIC,
+        PRIMARY KEY (product_id, name)
+    );
+""";
+
+# Version valid at the order_date, the one the order points to, same joins as pit_join.ORDERS_SUMMARY_SQL.
+CUSTOMER_AT_ORDER = """
+    dc.id = fo.customer_id
+""";
+PRODUCT_AT_ORDER = """
+    dp.id = fo.product_id
+""";
+
+# Adds the orders selected by {order_filter} to the sales and discounts. The sums are added with the same NULL rules
+# as SUM(): NULL + x keeps x, and a group stays NULL only while all of its values are NULL.
+APPLY_ORDERS_SQL = f"""
+    INSERT INTO agg_city_sales (customer_id, name, city, total_amount)
+    SELECT dc.customer_id, dc.name, COALESCE(dc.city, ''), SUM(fo.amount)
+    FROM fact_orders AS fo
+    INNER JOIN dim_customers AS dc ON {CUSTOMER_AT_ORDER}
+    WHERE {{order_filter}}
+    GROUP BY dc.customer_id, dc.name, COALESCE(dc.city, '')
+    ON CONFLICT (customer_id, name, city)
+    DO UPDATE SET total_amount = COALESCE(agg_city_sales.total_amount + EXCLUDED.total_amount,
+                                          agg_city_sales.total_amount, EXCLUDED.total_amount);
+
+    INSERT INTO agg_product_discounts (product_id, name, sum_of_discounts)
+    SELECT dp.product_id, dp.name, SUM(dp.price - fo.amount)
+    FROM fact_orders AS fo
+    INNER JOIN dim_products AS dp ON {PRODUCT_AT_ORDER}
+    WHERE {{order_filter}}
+    GROUP BY dp.product_id, dp.name
+    ON CONFLICT (product_id, name)
+    DO UPDATE SET sum_of_discounts = COALESCE(agg_product_discounts.sum_of_discounts + EXCLUDED.sum_of_discounts,
+                                              agg_product_discounts.sum_of_discounts, EXCLUDED.sum_of_discounts);
+""";
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def ensure_aggregate_tables(conn_arg, cursor_arg):
+    '''
+    Creates the aggregate tables if they do not exist yet.
+    ## Returns:
+    - An integer flag, 1 if operation was successful, -1 if operation failed.
+    '''
+    try:
+        cursor_arg.execute(CREATE_AGGREGATES_SQL);
+        conn_arg.commit();
+        return 1;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Creating the aggregate tables failed!\n", e);
+        return -1;
+
+
+def rebuild_aggregates(conn_arg, cursor_arg):
+    '''
+    Recomputes every aggregate table from scratch, in ONE transaction. Only needed once, when the tables are created
+    on top of existing data or after rows were written without the refresh (bulk loads), the helpers keep them up to date afterwards.
+    ## Returns:
+    - An integer flag, 1 if operation was successful, -1 if operation failed.
+    '''
+    try:
+        cursor_arg.execute(f"TRUNCATE TABLE {', '.join(AGGREGATE_TABLES)}");
+        cursor_arg.execute("""
+            INSERT INTO agg_customer_cities (customer_id, name, city)
+            SELECT DISTINCT customer_id, name, COALESCE(city, '')
+            FROM dim_customers
+            """);
+        cursor_arg.execute(APPLY_ORDERS_SQL.format(order_filter="TRUE"));
+        conn_arg.commit();
+        print("Aggregate tables rebuilt.");
+        return 1;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Rebuilding the aggregate tables failed!\n", e);
+        return -1;
+
+
+def apply_orders(order_ids, cursor_arg):
+    '''
+    Adds new orders of fact_orders to the sales and discounts aggregates.
+    Does NOT commit, it is meant to run in the same transaction as the INSERT of the orders.
+    '''
+    cursor_arg.execute(APPLY_ORDERS_SQL.format(order_filter="fo.order_id = ANY(%(order_ids)s)"),
+                       {"order_ids": list(order_ids)});
+
+
+def apply_customer_city(customer_id, name, city, cursor_arg):
+    '''
+    Adds a customer version to the cities aggregate, nothing happens if the customer already lived in that city.
+    Does NOT commit, it is meant to run in the same transaction as the INSERT of the version.
+    '''
+    cursor_arg.execute(
+        query="""
+        INSERT INTO agg_customer_cities (customer_id, name, city)
+        VALUES (%s, %s, COALESCE(%s, ''))
+        ON CONFLICT (customer_id, name, city)
+        DO NOTHING
+        """,
+        vars=(customer_id, name, city)
+    );
+
+
+def apply_staged_customers(source_table, cursor_arg):
+    '''
+    Batch version of apply_customer_city(), adds the customer_id, name and city of every row of a staging table.
+    Does NOT commit.
+    '''
+    cursor_arg.execute(f"""
+        INSERT INTO agg_customer_cities (customer_id, name, city)
+        SELECT DISTINCT customer_id, name, COALESCE(city, '')
+        FROM {source_table}
+        ON CONFLICT (customer_id, name, city)
+        DO NOTHING
+        """);
+
+
+def read_report(query, cursor_arg, conn_arg):
+    '''
+    Runs one of the report queries below, returns its rows. None if it failed.
+    '''
+    try:
+        cursor_arg.execute(query);
+        rows = cursor_arg.fetchall();
+        conn_arg.commit();
+        return rows;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Reading the aggregate report failed!\n", e);
+        return None;
+
+
+def customer_city_counts(cursor_arg, conn_arg):
+    '''
+    Report 1: every customer name and city, with the number of different cities of that name.
+    '''
+    return read_report(
+        """
+        SELECT name, NULLIF(city, '') AS city, COUNT(NULLIF(city, '')) OVER(PARTITION BY name)
+        FROM agg_customer_cities
+        GROUP BY name, city
+        """,
+        cursor_arg, conn_arg
+    );
+
+
+def city_sales(cursor_arg, conn_arg):
+    '''
+    Report 2: total sold amount per customer and the city they lived in when they placed the orders.
+    '''
+    return read_report(
+        "SELECT customer_id, name, NULLIF(city, '') AS city, total_amount FROM agg_city_sales",
+        cursor_arg, conn_arg
+    );
+
+
+def product_discounts(cursor_arg, conn_arg):
+    '''
+    Report 3: sum of (price - amount) per product, with the price at the time of each order.
+    '''
+    return read_report(
+        "SELECT product_id, name, sum_of_discounts FROM agg_product_discounts",
+        cursor_arg, conn_arg
+    );
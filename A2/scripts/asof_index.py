@@ -0,0 +1,247 @@
+import numpy as np;
+import pandas as pd;
+
+# Business key and attributes of each Type 2 SCD table, from ./A2/SQL/create-2d-tables.sql.
+DIMENSIONS = {
+    "dim_customers": {"key": "customer_id", "attributes": ["name", "email", "city"]},
+    "dim_products": {"key": "product_id", "attributes": ["name", "category", "price"]},
+};
+
+# End of the open-ended (current) versions in the sorted arrays, later than any real timestamp.
+OPEN_END = np.iinfo(np.int64).max;
+
+# ======================================================================== [DATABASE] ======================================================================= #
+def ensure_validity_ranges(conn_arg, cursor_arg):
+    '''
+    Adds the generated `validity` TSTZRANGE column, [valid_start_date, valid_end_date), to both dimension tables,
+    with a GiST index on (business key, validity) so `validity @> T` finds the version valid at T in O(log versions).
+    The index comes from an exclusion constraint, which also stops the versions of an entity from overlapping.
+    If the existing history already overlaps, a plain GiST index is created instead. See ./A2/SQL/validity-ranges.sql.
+    A valid_end_date still without time zone is first migrated to TIMESTAMPTZ (migrate_end_dates), so the range does
+    not depend on the time zone of the session.
+    ## Returns:
+    - An integer flag, 1 if operation was successful, -1 if operation failed.
+    '''
+    try:
+        cursor_arg.execute("CREATE EXTENSION IF NOT EXISTS btree_gist");
+        for table_name in DIMENSIONS:
+            migrate_end_dates(table_name, cursor_arg);
+            cursor_arg.execute(f"""
+                ALTER TABLE {table_name}
+                ADD COLUMN IF NOT EXISTS validity TSTZRANGE
+                GENERATED ALWAYS AS (tstzrange(valid_start_date, valid_end_date, '[)')) STORED
+                """);
+        conn_arg.commit();
+    except Exception as e:
+        conn_arg.rollback();
+        print("Adding the validity ranges failed!\n", e);
+        return -1;
+
+    for table_name, spec in DIMENSIONS.items():
+        cursor_arg.execute("SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s",
+                           (table_name, f"{table_name}_validity_excl"));
+        if(cursor_arg.fetchone() is not None):
+            conn_arg.commit();
+            continue;
+        try:
+            cursor_arg.execute(f"""
+                ALTER TABLE {table_name}
+                ADD CONSTRAINT {table_name}_validity_excl
+                EXCLUDE USING gist ({spec["key"]} WITH =, validity WITH &&)
+                """);
+            conn_arg.commit();
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"{table_name} has overlapping versions, using a GiST index without the exclusion constraint.\n", e);
+            try:
+                cursor_arg.execute(f"""
+                    CREATE INDEX IF NOT EXISTS {table_name}_validity_idx
+                    ON {table_name} USING gist ({spec["key"]}, validity)
+                    """);
+                conn_arg.commit();
+            except Exception as e:
+                conn_arg.rollback();
+                print(f"Creating the {table_name} validity index failed!\n", e);
+                return -1;
+    return 1;
+
+
+def migrate_end_dates(table_name, cursor_arg):
+    '''
+    Turns valid_end_date into a TIMESTAMPTZ if it is still a TIMESTAMP without time zone (tables created before
+    create-2d-tables.sql switched to TIMESTAMPTZ). CURRENT_TIMESTAMP was stored in it as the local time of the writing session,
+    so the existing values are read in the time zone of this session: run it with the time zone the helpers run with.
+    A validity column built on the old type is dropped first (with its constraint or index), the caller adds it again.
+    Does NOT commit.
+    '''
+    cursor_arg.execute(
+        query="""
+        SELECT data_type
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'valid_end_date'
+        """,
+        vars=(table_name,)
+    );
+    column = cursor_arg.fetchone();
+    if(column is None or column[0] != "timestamp without time zone"):
+        return;
+    cursor_arg.execute(f"ALTER TABLE {table_name} DROP COLUMN IF EXISTS validity");
+    cursor_arg.execute(f"ALTER TABLE {table_name} ALTER COLUMN valid_end_date TYPE TIMESTAMP WITH TIME ZONE");
+
+
+def get_version_as_of(table_name, business_key, as_of, cursor_arg, conn_arg):
+    '''
+    Returns the tuple of the version of an entity that was valid at `as_of`, found through the validity GiST index,
+    with the columns of create-2d-tables.sql (same shape as part2.get_current_customer()).
+    None if the entity did not exist at that time.
+    '''
+    try:
+        cursor_arg.execute(
+            query=f"""
+            SELECT id, {DIMENSIONS[table_name]["key"]}, {", ".join(DIMENSIONS[table_name]["attributes"])}, valid_start_date, valid_end_date
+            FROM {table_name}
+            WHERE {DIMENSIONS[table_name]["key"]} = %s AND validity @> %s::TIMESTAMPTZ
+            """,
+            vars=(business_key, as_of)
+        );
+        version = cursor_arg.fetchone();
+        conn_arg.commit();
+        return version;
+    except Exception as e:
+        conn_arg.rollback();
+        print(f"get_version_as_of on {table_name} failed!\n", e);
+
+
+def get_customer_as_of(customer_id, as_of, cursor_arg, conn_arg):
+    '''
+    get_version_as_of() for dim_customers.
+    '''
+    return get_version_as_of("dim_customers", customer_id, as_of, cursor_arg, conn_arg);
+
+
+def get_product_as_of(product_id, as_of, cursor_arg, conn_arg):
+    '''
+    get_version_as_of() for dim_products.
+    '''
+    return get_version_as_of("dim_products", product_id, as_of, cursor_arg, conn_arg);
+
+# ======================================================================== [IN MEMORY] ======================================================================= #
+def to_nanoseconds(values):
+    '''
+    Converts timestamps to UTC nanoseconds since the epoch. Timestamps without a time zone are read as UTC.
+    Missing values become OPEN_END.
+    '''
+    timestamps = pd.to_datetime(pd.Series(values), utc=True);
+    nanoseconds = timestamps.to_numpy(dtype="datetime64[ns]").astype(np.int64);
+    nanoseconds[timestamps.isna().to_numpy()] = OPEN_END;
+    return nanoseconds;
+
+
+class AsOfIndex:
+    '''
+    In-memory "version valid at time T" index of one dimension table. For every business key it keeps the start
+    and end of its versions as sorted NumPy arrays, so finding the version valid at T is one binary search
+    (searchsorted) over the versions of that key, O(log versions), with the same [start, end) rule as the
+    validity column in the database.
+    '''
+    def __init__(self, table_name):
+        self.table_name = table_name;
+        self.key = DIMENSIONS[table_name]["key"];
+        self.attributes = DIMENSIONS[table_name]["attributes"];
+        self._ids = np.empty(0, dtype=np.int64);
+        self._records = [];
+        self._versions = {};
+
+    def build(self, versions_df):
+        '''
+        Builds the index from a DataFrame of versions with id, the business key, the attributes,
+        valid_start_date and valid_end_date. Returns the number of versions indexed.
+        '''
+        versions_df = versions_df.assign(
+            start_ns=to_nanoseconds(versions_df["valid_start_date"]),
+            end_ns=to_nanoseconds(versions_df["valid_end_date"])
+        ).sort_values([self.key, "start_ns"], kind="stable").reset_index(drop=True);
+
+        self._ids = versions_df["id"].to_numpy(dtype=np.int64);
+        self._records = versions_df[["id"] + self.attributes].to_dict("records");
+        starts = versions_df["start_ns"].to_numpy(); ends = versions_df["end_ns"].to_numpy();
+        # Rows of every business key are contiguous after the sort, one (starts, ends, first row) entry per key.
+        self._versions = {
+            business_key: (starts[positions], ends[positions], positions[0])
+            for business_key, positions in versions_df.groupby(self.key, sort=False).indices.items()
+        };
+        return len(versions_df);
+
+    def load(self, cursor_arg, conn_arg):
+        '''
+        Builds the index from the whole history of the table, with ONE query.
+        ## Returns:
+        - The number of versions indexed, -1 if the query failed.
+        '''
+        try:
+            cursor_arg.execute(f"""
+                SELECT id, {self.key}, {", ".join(self.attributes)}, valid_start_date, valid_end_date
+                FROM {self.table_name}
+                """);
+            columns = [description[0] for description in cursor_arg.description];
+            versions_df = pd.DataFrame(cursor_arg.fetchall(), columns=columns);
+            conn_arg.commit();
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"Loading the {self.table_name} as-of index failed!\n", e);
+            return -1;
+        return self.build(versions_df);
+
+    def _position(self, business_key, at_ns):
+        '''
+        Row of the version of `business_key` valid at `at_ns`, None if there is none.
+        '''
+        versions = self._versions.get(business_key);
+        if(versions is None):
+            return None;
+        starts, ends, first_row = versions;
+        # Latest version that started at or before T, then check that it had not ended yet.
+        i = int(np.searchsorted(starts, at_ns, side="right")) - 1;
+        if(i < 0 or at_ns >= ends[i]):
+            return None;
+        return first_row + i;
+
+    def lookup(self, business_key, as_of):
+        '''
+        Returns the version of an entity valid at `as_of` as a dict with the surrogate `id` and its attributes
+        (same shape as DimensionCache entries), None if the entity did not exist at that time.
+        '''
+        row = self._position(business_key, int(to_nanoseconds([as_of])[0]));
+        return None if row is None else self._records[row];
+
+    def surrogate_id(self, business_key, as_of):
+        '''
+        Returns the surrogate id of the version valid at `as_of`, None if there is none.
+        '''
+        row = self._position(business_key, int(to_nanoseconds([as_of])[0]));
+        return None if row is None else int(self._ids[row]);
+
+    def surrogate_ids(self, business_keys, as_of):
+        '''
+        Bulk surrogate_id(), for a batch of (business key, timestamp) pairs such as a batch of orders.
+        Pairs of the same key are resolved with one vectorized searchsorted.
+        ## Returns:
+        - NumPy array with the surrogate ids, -1 where no version was valid.
+        '''
+        keys = pd.Series(business_keys).reset_index(drop=True);
+        at_ns = to_nanoseconds(as_of);
+        result = np.full(len(keys), -1, dtype=np.int64);
+        for business_key, positions in keys.groupby(keys, sort=False).indices.items():
+            versions = self._versions.get(business_key);
+            if(versions is None):
+                continue;
+            starts, ends, first_row = versions;
+            times = at_ns[positions];
+            i = np.searchsorted(starts, times, side="right") - 1;
+            clipped = np.maximum(i, 0);
+            valid = (i >= 0) & (times < ends[clipped]);
+            result[positions[valid]] = self._ids[first_row + clipped[valid]];
+        return result;
+
+    def __len__(self):
+        return len(self._records);
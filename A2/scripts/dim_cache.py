@@ -0,0 +1,145 @@
+import threading; # The cache can be shared by worker threads.
+from collections import OrderedDict; # Keeps the entries in least -> most recently used order.
+
+# Business key and attributes of each Type 2 SCD table, from ./A2/SQL/create-2d-tables.sql.
+DIMENSIONS = {
+    "dim_customers": {"key": "customer_id", "attributes": ["name", "email", "city"]},
+    "dim_products": {"key": "product_id", "attributes": ["name", "category", "price"]},
+};
+
+# Default number of entities kept per cache.
+DEFAULT_MAX_SIZE = 100000;
+
+# ======================================================================== [CACHE] ======================================================================= #
+class DimensionCache:
+    '''
+    In-memory copy of the CURRENT version (valid_end_date IS NULL) of the entities of one dimension table,
+    keyed by business key. Every value is a dict with the surrogate `id` and the attributes of that version.
+
+    It is warmed with one query at startup, and kept up to date by the part2.py helpers that write the table
+    (add_customer, add_product, update_customer_city, update_product_price), so lookups of the current version
+    and of its surrogate key do not need a round trip to the database.
+    When it holds more than `max_size` entities, the least recently used ones are dropped.
+    '''
+    def __init__(self, table_name, max_size=DEFAULT_MAX_SIZE):
+        self.table_name = table_name;
+        self.key = DIMENSIONS[table_name]["key"];
+        self.attributes = DIMENSIONS[table_name]["attributes"];
+        self.max_size = max_size;
+        self.hits = 0; self.misses = 0; self.evictions = 0;
+        self._entries = OrderedDict();
+        self._lock = threading.Lock();
+
+    def warm(self, cursor_arg, conn_arg):
+        '''
+        Loads the current version of up to `max_size` entities with ONE query.
+        ## Returns:
+        - The number of entities loaded, -1 if the query failed.
+        '''
+        try:
+            cursor_arg.execute(
+                query=f"""
+                SELECT id, {self.key}, {", ".join(self.attributes)}
+                FROM {self.table_name}
+                WHERE valid_end_date IS NULL
+                ORDER BY id
+                LIMIT %s
+                """,
+                vars=(self.max_size,)
+            );
+            rows = cursor_arg.fetchall();
+            conn_arg.commit();
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"Warming the {self.table_name} cache failed!\n", e);
+            return -1;
+
+        for row in rows:
+            self.put(row[1], dict(zip(self.attributes, row[2:]), id=row[0]));
+        print(f"{self.table_name} cache warmed with {len(rows)} current versions.");
+        return len(rows);
+
+    def get(self, business_key):
+        '''
+        Returns the cached current version of an entity, or None if it is not cached (counted as a miss).
+        '''
+        with self._lock:
+            entry = self._entries.get(business_key);
+            if(entry is None):
+                self.misses += 1;
+                return None;
+            self._entries.move_to_end(business_key);
+            self.hits += 1;
+            return entry;
+
+    def put(self, business_key, entry):
+        '''
+        Stores the current version of an entity (write-through), and drops the least recently used entities
+        if the cache is over its size.
+        '''
+        with self._lock:
+            self._entries[business_key] = entry;
+            self._entries.move_to_end(business_key);
+            while(len(self._entries) > self.max_size):
+                self._entries.popitem(last=False);
+                self.evictions += 1;
+
+    def invalidate(self, business_key):
+        '''
+        Forgets an entity, used when a write failed and the cached version may be wrong.
+        '''
+        with self._lock:
+            self._entries.pop(business_key, None);
+
+    def get_or_load(self, business_key, cursor_arg, conn_arg):
+        '''
+        Returns the current version of an entity from the cache, or loads it from the database on a miss.
+        None if the entity has no current version.
+        '''
+        entry = self.get(business_key);
+        if(entry is not None):
+            return entry;
+        try:
+            cursor_arg.execute(
+                query=f"""
+                SELECT id, {", ".join(self.attributes)}
+                FROM {self.table_name}
+                WHERE {self.key} = %s AND valid_end_date IS NULL
+                """,
+                vars=(business_key,)
+            );
+            row = cursor_arg.fetchone();
+            conn_arg.commit();
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"Loading {self.key} = {business_key} into the {self.table_name} cache failed!\n", e);
+            return None;
+
+        if(row is None):
+            return None;
+        entry = dict(zip(self.attributes, row[1:]), id=row[0]);
+        self.put(business_key, entry);
+        return entry;
+
+    def surrogate_id(self, business_key, cursor_arg, conn_arg):
+        '''
+        Returns the surrogate id of the current version of an entity, None if it has no current version.
+        '''
+        entry = self.get_or_load(business_key, cursor_arg, conn_arg);
+        return None if entry is None else entry["id"];
+
+    def stats(self):
+        '''
+        Returns the size and the hit, miss and eviction counters of the cache.
+        '''
+        with self._lock:
+            lookups = self.hits + self.misses;
+            return {
+                "table": self.table_name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            };
@@ -1,30 +1,421 @@
 import numpy as np; import pandas as pd; import psycopg2 as psql;
 import dotenv; import part2;
+import pit_join; # Single-pass point-in-time join of the orders with their customer and product versions.
+import os; import sys;
+# The shared modules live in ./common, next to the A2 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."));
+from common import db; # Pooled connections shared with A1/load.py and part2.py.
 
 # MongoDB Driver Connectors
 from pymongo.mongo_client import MongoClient;
 from pymongo.server_api import ServerApi;
 
-# Pandas SQL reads a SQLAlchemy connection string. (pip install SQLAlchemy)
-from sqlalchemy import create_engine;
+import time; import json; from decimal import Decimal;
+from pymongo import ReplaceOne; # Upserts of the incremental export.
+from pymongo import UpdateOne; # $inc / $addToSet upserts of the rollups.
+from common import cli; # Shared flags and results of the non-interactive entry points.
+from common import instrument; # Per-operation timing of the database round trips (@instrument.traced).
+try:
+    import snapshot; # Columnar Parquet / Arrow IPC snapshot of orders_summary, needs pyarrow.
+except ImportError:
+    snapshot = None;
 
 # MongoDB Connection string, URI is stored in environment variable.
 uri = str(dotenv.get_key(dotenv_path= "./.env", key_to_get="MONGO_URI"));
 
-def main():
-    # NOTE: YOU MUST HAVE THE POSTGRESQL DATABASE POPULATED UP TO THE PART 3 QUERIES TO USE
-    # THIS SCRIPT, if not, run part2.py FIRST and run the Part3.SQL command
-    # on the Postgres server!
+# Rows fetched from the server-side cursor, and documents sent to MongoDB, per batch of the streaming export.
+EXPORT_BATCH_SIZE = 10000;
+
+# The orders summary as ONE query (see pit_join.py), a server-side cursor can only run a single SELECT.
+ORDERS_SUMMARY_QUERY = pit_join.ORDERS_SUMMARY_SQL;
+
+# Pre-aggregated collections of the playground queries 1 to 3, kept up to date as orders_summary is written.
+ROLLUP_COLLECTIONS = {"customers": "customer_rollups", "cities": "city_rollups", "products": "product_rollups"};
+
+# Fields of orders_summary that are indexed: order_id for the upserts, the others for the playground queries.
+SUMMARY_INDEX_FIELDS = ["order_id", "customer_id", "product_id", "customer_city"];
+
+# High-water mark of the incremental export, relative to the parent directory like the .env file.
+WATERMARK_PATH = "./A2/etl_watermark.json";
+# order_id: every order up to it is committed (or rolled back) and exported.
+# pending_order_id / pending_xmax: the biggest order_id read by the last sync, and the next transaction id once that sync
+# had finished. order_id moves up to pending_order_id once every transaction older than pending_xmax has ended.
+EMPTY_WATERMARK = {"order_id": 0, "pending_order_id": 0, "pending_xmax": 0};
+
+# The biggest visible order_id, and the oldest running / next transaction id of the same snapshot (xid8 as bigint).
+SNAPSHOT_SQL = """
+    SELECT COALESCE(MAX(order_id), 0),
+           pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+           pg_snapshot_xmax(pg_current_snapshot())::text::bigint
+    FROM fact_orders
+""";
+
+# Orders above the confirmed high-water mark, up to the biggest order_id visible when the sync started.
+# An order_id is taken from the sequence when the row is inserted, but the row is only visible once its transaction
+# commits: a batch that was still running at a sync can commit ids below what that sync read. The confirmed mark only
+# moves past those ids once the transactions running at the sync have ended (see next_watermark()), so they are read by
+# a later sync. That re-reads the orders of the last sync, instead of a fixed number of ids below the mark.
+# fact_orders links every order to the surrogate ids of the customer and product versions valid at its order_date,
+# and versions are never edited (a change inserts a new one), so an exported order never changes afterwards.
+# Orders that were already exported are upserted again, which leaves them (and the rollups) unchanged.
+INCREMENTAL_FILTER = """
+    WHERE fo.order_id > %(from_order_id)s AND fo.order_id <= %(max_order_id)s
+""";
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def load_watermark(path=WATERMARK_PATH):
+    '''
+    Returns the high-water mark saved by the last incremental export, or an empty one (export everything) if there is none.
+    '''
+    if(not os.path.exists(path)):
+        return dict(EMPTY_WATERMARK);
+    with open(path, "r") as watermark_file:
+        return {**EMPTY_WATERMARK, **json.load(watermark_file)};
+
+
+def save_watermark(watermark, path=WATERMARK_PATH):
+    '''
+    Saves the high-water mark, only called once an export has finished.
+    '''
+    with open(path, "w") as watermark_file:
+        json.dump(watermark, watermark_file, indent=2);
+
+
+def current_snapshot(pg_conn):
+    '''
+    Reads the biggest order_id, and the oldest running (xmin) and next (xmax) transaction ids, from one snapshot.
+    The export is bounded by the order_id, so rows written while it runs are left for the next sync.
+    '''
+    with pg_conn.cursor() as cursor:
+        cursor.execute(query=SNAPSHOT_SQL);
+        max_order_id, xmin, xmax = cursor.fetchone();
+    pg_conn.commit();
+    return {"max_order_id": max_order_id, "xmin": xmin, "xmax": xmax};
+
+
+def next_watermark(last_watermark, start_snapshot, end_snapshot):
+    '''
+    The high-water mark to save after a sync that exported up to start_snapshot["max_order_id"].
+
+    The order_ids up to the pending mark of the last sync were all taken before that sync read them, by transactions
+    older than its pending_xmax. Once the oldest transaction still running when this sync started is newer, they have
+    all committed or rolled back, and this sync has read them: the confirmed mark moves up to the pending one.
+    The new pending mark is the biggest order_id of this sync, with the next transaction id once it has finished, so
+    even a transaction that took an order_id just before the sync started counts as running.
+    Until the transactions of the pending mark end (a long batch), both marks stay where they are.
+    '''
+    if(start_snapshot["xmin"] < last_watermark["pending_xmax"]):
+        return dict(last_watermark);
+    return {
+        "order_id": max(last_watermark["order_id"], last_watermark["pending_order_id"]),
+        "pending_order_id": start_snapshot["max_order_id"],
+        "pending_xmax": end_snapshot["xmax"],
+    };
+
+
+def to_document(columns, row):
+    '''
+    Turns one row of the orders summary into a dictionary MongoDB can store.
+    NUMERIC columns come back as Decimal, which BSON cannot encode, so they are stored as floats
+    (same as pandas did for the full load). NULLs are already None.
+    '''
+    return {col: (float(value) if isinstance(value, Decimal) else value) for col, value in zip(columns, row)};
+
+
+def get_rollups(sales_db):
+    '''
+    Returns the rollup collections of ROLLUP_COLLECTIONS, keyed the same way.
+    '''
+    return {rollup: sales_db.get_collection(name) for rollup, name in ROLLUP_COLLECTIONS.items()};
+
+
+def ensure_summary_indexes(orders_summary):
+    '''
+    Indexes for the lookups and filters of orders_summary: order_id for the upserts, and the fields the playground queries group and match on.
+    '''
+    for field in SUMMARY_INDEX_FIELDS:
+        orders_summary.create_index(field);
+
+
+def as_number(value):
+    '''
+    NULL amounts and prices add nothing to the rollups, same as $sum ignoring them.
+    '''
+    return 0.0 if value is None else float(value);
+
+
+def rollup_operations(added, removed=()):
+    '''
+    Turns a batch of documents written to orders_summary into bulk upserts of the rollup collections:
+    - customer_rollups, one per customer_id: $addToSet of its names and cities, $inc of order_count and total_amount.
+    - city_rollups, one per (customer_id, customer_name, customer_city), the group of playground query 2: $inc of order_count and total_amount.
+    - product_rollups, one per (product_id, product_name), the group of playground query 3: $inc of order_count and sum_of_discounts.
+    The batch is summed per key first, so every key costs one operation. `removed` are the old versions of documents that are
+    replaced, their amounts are subtracted (cities and names are never removed from the sets).
+
+    ## Returns:
+    - Dictionary of rollup -> list of UpdateOne.
+    '''
+    totals = {"customers": {}, "cities": {}, "products": {}};
+    customer_sets = {};
+    for sign, documents in ((1, added), (-1, removed)):
+        for doc in documents:
+            customer_key = doc["customer_id"];
+            city_key = (doc["customer_id"], doc["customer_name"], doc["customer_city"]);
+            product_key = (doc["product_id"], doc["product_name"]);
+            amount = as_number(doc["amount"]);
+            discount = 0.0 if doc["product_price"] is None or doc["amount"] is None else float(doc["product_price"]) - float(doc["amount"]);
+
+            for rollup, key, field, value in (("customers", customer_key, "total_amount", amount),
+                                              ("cities", city_key, "total_amount", amount),
+                                              ("products", product_key, "sum_of_discounts", discount)):
+                increments = totals[rollup].setdefault(key, {"order_count": 0, field: 0.0});
+                increments["order_count"] += sign;
+                increments[field] += sign * value;
+            if(sign == 1):
+                names, cities = customer_sets.setdefault(customer_key, (set(), set()));
+                names.add(doc["customer_name"]); cities.add(doc["customer_city"]);
+
+    operations = {"customers": [], "cities": [], "products": []};
+    for customer_id, increments in totals["customers"].items():
+        update = {"$inc": increments};
+        if(customer_id in customer_sets):
+            names, cities = customer_sets[customer_id];
+            update["$addToSet"] = {"customer_names": {"$each": list(names)}, "cities": {"$each": list(cities)}};
+        operations["customers"].append(UpdateOne({"_id": customer_id}, update, upsert=True));
+    for (customer_id, customer_name, customer_city), increments in totals["cities"].items():
+        city_id = {"customer_id": customer_id, "customer_name": customer_name, "customer_city": customer_city};
+        operations["cities"].append(UpdateOne({"_id": city_id}, {"$inc": increments}, upsert=True));
+    for (product_id, product_name), increments in totals["products"].items():
+        product_key = {"product_id": product_id, "product_name": product_name};
+        operations["products"].append(UpdateOne({"_id": product_key}, {"$inc": increments}, upsert=True));
+    return operations;
+
+
+def update_rollups(rollups, added, removed=()):
+    '''
+    Applies rollup_operations() with one unordered bulk_write per rollup collection.
+    '''
+    for rollup, operations in rollup_operations(added, removed).items():
+        if(len(operations) > 0):
+            rollups[rollup].bulk_write(operations, ordered=False);
+
+
+@instrument.traced
+def stream_export(pg_conn, orders_summary, batch_size=EXPORT_BATCH_SIZE, query=ORDERS_SUMMARY_QUERY, query_params=None, upsert=False,
+                  rollups=None):
+    '''
+    Streams the orders summary from PostgreSQL to MongoDB, one batch at a time.
+    Rows are read through a named (server-side) cursor, so PostgreSQL only sends `batch_size` rows per round trip,
+    each batch is turned into documents and sent with one unordered insert_many, and then dropped.
+    Memory stays bounded by the batch size, no matter how big fact_orders is.
+    With `upsert`, every batch is sent as one bulk_write of ReplaceOne(upsert=True) keyed on order_id instead,
+    so documents that were already exported are replaced and not duplicated.
+    If `rollups` (see get_rollups) is given, every batch is also added to the rollup collections, and with `upsert`
+    the documents it replaces are subtracted from them first.
+
+    ## Returns:
+    - Dictionary with the documents written, the number of batches, the elapsed seconds and the documents per second.
+    '''
+    start_time = time.perf_counter();
+    total_documents = 0; batch_count = 0;
+    with pg_conn.cursor(name="orders_summary_export") as export_cursor:
+        export_cursor.itersize = batch_size;
+        export_cursor.execute(query, query_params);
+        while(True):
+            rows = export_cursor.fetchmany(batch_size);
+            if(len(rows) == 0):
+                break;
+            columns = [col[0] for col in export_cursor.description];
+            documents = [to_document(columns, row) for row in rows];
+            # Unordered, so MongoDB can write the batch in parallel and one bad document does not stop the rest.
+            if(rollups is not None):
+                replaced = [];
+                if(upsert):
+                    replaced = list(orders_summary.find({"order_id": {"$in": [doc["order_id"] for doc in documents]}}, {"_id": 0}));
+                update_rollups(rollups, documents, replaced);
+            if(upsert):
+                orders_summary.bulk_write([ReplaceOne({"order_id": doc["order_id"]}, doc, upsert=True) for doc in documents], ordered=False);
+            else:
+                orders_summary.insert_many(documents, ordered=False);
+            total_documents += len(documents);
+            batch_count += 1;
+    # A named cursor lives inside a transaction, end it.
+    pg_conn.commit();
+
+    elapsed = time.perf_counter() - start_time;
+    report = {
+        "documents": total_documents,
+        "batches": batch_count,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(total_documents / elapsed, 1) if elapsed > 0 else 0.0,
+    };
+    print(f"Streamed {total_documents} documents into MongoDB in {batch_count} batches, "
+          f"{elapsed:.2f}s ({report['documents_per_second']:,.0f} documents/sec)");
+    return report;
+
+def incremental_params(last_watermark, snapshot):
+    '''
+    Parameters of INCREMENTAL_FILTER: the orders above the confirmed high-water mark, up to the snapshot of the sync.
+    '''
+    return {"from_order_id": last_watermark["order_id"], "max_order_id": snapshot["max_order_id"]};
+
+@instrument.traced
+def incremental_export(pg_conn, orders_summary, batch_size=EXPORT_BATCH_SIZE, watermark_path=WATERMARK_PATH, rollups=None):
+    '''
+    Exports only what changed since the last syncs: orders with an order_id above the confirmed high-water mark,
+    including the batches that committed after the last sync (see INCREMENTAL_FILTER and next_watermark()).
+    They are upserted into MongoDB keyed on order_id, and the new high-water mark is saved once everything is written,
+    so each sync costs as much as the changes, not the whole history. The first two syncs export everything.
 
-    # Attempt to connect to MongoDB Server.
-    mongo_cli = MongoClient(uri, server_api=ServerApi('1'));
+    ## Returns:
+    - The report of stream_export(), plus the old and new high-water marks.
+    '''
+    last_watermark = load_watermark(watermark_path);
+    start_snapshot = current_snapshot(pg_conn);
+
+    # Upserts look documents up by order_id.
+    ensure_summary_indexes(orders_summary);
+    report = stream_export(pg_conn, orders_summary, batch_size,
+                           query=ORDERS_SUMMARY_QUERY + INCREMENTAL_FILTER,
+                           query_params=incremental_params(last_watermark, start_snapshot),
+                           upsert=True, rollups=rollups);
+    new_watermark = next_watermark(last_watermark, start_snapshot, current_snapshot(pg_conn));
+    save_watermark(new_watermark, watermark_path);
+    report["previous_watermark"] = last_watermark;
+    report["watermark"] = new_watermark;
+    return report;
+
+# ======================================================================== [MAIN] ======================================================================= #
+def count_export(pg_conn, mode, watermark_path=WATERMARK_PATH):
+    '''
+    Number of documents an export would write, without writing them. Used by the dry runs.
+    '''
+    query = ORDERS_SUMMARY_QUERY; query_params = None;
+    if(mode == "incremental"):
+        query = ORDERS_SUMMARY_QUERY + INCREMENTAL_FILTER;
+        query_params = incremental_params(load_watermark(watermark_path), current_snapshot(pg_conn));
+    with pg_conn.cursor() as count_cursor:
+        count_cursor.execute(f"SELECT COUNT(*) FROM ({query}) AS export", query_params);
+        rows = count_cursor.fetchone()[0];
+    pg_conn.commit();
+    return rows;
+
+
+def run_snapshot(endpoint, database, password, batch_size=EXPORT_BATCH_SIZE, dry_run=False, snapshot_dir=None, snapshot_format="ipc"):
+    '''
+    Writes the orders summary to the monthly Parquet / Arrow IPC files of snapshot.py instead of MongoDB.
+    '''
+    start_time = time.perf_counter();
+    if(snapshot is None):
+        return cli.make_result("snapshot", 0, 0.0, dry_run, error="The snapshot needs pyarrow, install it first");
+    manager = db.get_manager(host=endpoint, user="postgres", password=password, database=database);
+    with manager.connection() as pg_conn:
+        # SQL Connection to database failed
+        if(pg_conn.closed != 0):
+            return cli.make_result("snapshot", 0, time.perf_counter() - start_time, dry_run, error="Connection to database failed");
+        if(dry_run):
+            return cli.make_result("snapshot", count_export(pg_conn, "snapshot"), time.perf_counter() - start_time, dry_run);
+        report = snapshot.write_snapshot(pg_conn, snapshot_dir or snapshot.SNAPSHOT_DIR, snapshot_format, batch_size);
+    return cli.make_result("snapshot", report["rows"], time.perf_counter() - start_time, dry_run,
+                           months=report["months"], format=snapshot_format);
+
+
+def run(endpoint, database, password, mode="stream", batch_size=EXPORT_BATCH_SIZE, dry_run=False,
+        mongo_uri=None, mongo_database="sales_db", watermark_path=WATERMARK_PATH, snapshot_dir=None, snapshot_format="ipc"):
+    '''
+    Runs the export without any prompt, so it can be scheduled, or called from other Python code.
+
+    ## Args:
+    - endpoint, database, password: PostgreSQL server to read from, as the postgres user.
+    - mode: "truncate" empties orders_summary and the rollups, "full" loads everything with pandas,
+      "stream" streams everything in batches (stream_export), "incremental" only what changed since the last sync,
+      "snapshot" writes the columnar snapshot of snapshot.py (run_snapshot) and does not touch MongoDB.
+    - batch_size: Rows / documents per batch of the streaming and incremental exports.
+    - dry_run: Only count the documents that would be deleted / written.
+    - mongo_uri, mongo_database: MongoDB server and database to write to (default: MONGO_URI of the .env file, sales_db).
+    - watermark_path: High-water mark file of the incremental mode, give every shard its own.
+    - snapshot_dir, snapshot_format: Directory and file format ("ipc" or "parquet") of the snapshot mode.
+
+    ## Returns:
+    - A dict with the mode, the documents deleted or written, the elapsed seconds and the documents/sec, see cli.make_result().
+      The Postgres pool is left open, the caller closes it (db.close_all()).
+    '''
+    if(mode == "snapshot"):
+        return run_snapshot(endpoint, database, password, batch_size, dry_run, snapshot_dir, snapshot_format);
+    start_time = time.perf_counter();
+    mongo_cli = MongoClient(mongo_uri or uri, server_api=ServerApi('1'));
     try:
         # Ping the database server.
         mongo_cli.admin.command('ping');
-        print("Ping successful, MongoDB instance is accessible!");
     except Exception as e:
-        print("Connecting to the Mongo Client failed because:\n", e);
-        return;
+        mongo_cli.close();
+        return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error=f"Connecting to MongoDB failed: {e}");
+
+    sales_db = mongo_cli.get_database(mongo_database);
+    orders_summary = sales_db.get_collection("orders_summary");
+    rollups = get_rollups(sales_db);
+
+    if(mode == "truncate"):
+        documents = orders_summary.count_documents({});
+        if(not dry_run):
+            orders_summary.delete_many({});
+            for rollup in rollups.values():
+                rollup.delete_many({});
+            # The next incremental export has to start from scratch.
+            if(os.path.exists(watermark_path)):
+                os.remove(watermark_path);
+        mongo_cli.close();
+        return cli.make_result(mode, documents, time.perf_counter() - start_time, dry_run);
+
+    manager = db.get_manager(host=endpoint, user="postgres", password=password, database=database);
+    with manager.connection() as pg_conn:
+        # SQL Connection to database failed
+        if(pg_conn.closed != 0):
+            mongo_cli.close();
+            return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error="Connection to database failed");
+
+        if(dry_run):
+            documents = count_export(pg_conn, mode, watermark_path);
+            mongo_cli.close();
+            return cli.make_result(mode, documents, time.perf_counter() - start_time, dry_run,
+                                   existing_documents=orders_summary.count_documents({}));
+
+        ensure_summary_indexes(orders_summary);
+        if(mode == "stream"):
+            report = stream_export(pg_conn, orders_summary, batch_size, rollups=rollups);
+        elif(mode == "incremental"):
+            report = incremental_export(pg_conn, orders_summary, batch_size, watermark_path, rollups=rollups);
+        else:
+            # The orders joined with the customer and product versions valid at their order_date, in one pass,
+            # instead of the temporary table chain of Part3.sql.
+            # Read through a cursor of the pooled psycopg2 connection, instead of a second SQLAlchemy engine to the same database.
+            df = pit_join.read_orders_summary(pg_conn);
+            report = {"batches": 1};
+
+    if(mode == "full"):
+        # Transform the NaT (Not a Time, which can be NULL values), to None Type to insert into the collection.
+        df = df.replace({pd.NaT: None});
+
+        # Convert the dataframe rows to a list of dictionaries so MongoDB can read them.
+        mongo_documents = df.to_dict("records");
+
+        # Insert the documents into mongodb.
+        if(len(mongo_documents) > 0):
+            orders_summary.insert_many(mongo_documents);
+            update_rollups(rollups, mongo_documents);
+        print(f"Inserted {len(mongo_documents)} documents into MongoDB!");
+        report["documents"] = len(mongo_documents);
+    mongo_cli.close();
+
+    details = {key: value for key, value in report.items() if key in ("batches", "previous_watermark", "watermark")};
+    return cli.make_result(mode, report["documents"], time.perf_counter() - start_time, dry_run, **details);
+
+
+def main():
+    # NOTE: YOU MUST HAVE THE POSTGRESQL DATABASE POPULATED UP TO THE PART 3 QUERIES TO USE
+    # THIS SCRIPT, if not, run part2.py FIRST and run the Part3.SQL command
+    # on the Postgres server!
 
     # Bulk delete of MongoDB document.
     bulk_delete = int(input("Bulk delete MongoDB collection?: (0 - No, 1 - Yes): "));
@@ -32,96 +423,54 @@ def main():
         print("Invalid input, please only enter 0 or 1, no spaces!");
         return;
 
-    # Get the column names from the MongoDB client.
-    sales_db = mongo_cli.get_database("sales_db");
-    orders_summary = sales_db.get_collection("orders_summary");
+    # Streaming export keeps memory bounded, for big fact tables.
+    export_mode = 0;
+    if(bulk_delete == 0):
+        export_mode = int(input("Export mode?: (0 - Full load with pandas, 1 - Streaming in batches, 2 - Incremental since last sync, 3 - Columnar snapshot files): "));
+        if(export_mode not in (0, 1, 2, 3)):
+            print("Invalid input, please only enter 0, 1, 2 or 3, no spaces!");
+            return;
 
-    if(bulk_delete == 1):
-        res = orders_summary.delete_many({});
-        print(f"{res.deleted_count} documents deleted from '{orders_summary.name}'.")
-        mongo_cli.close();
-        return;
-
-    # Connect to PostgreSQL.
     # Grab secret values (not shown for security purposes.)
     DB_ENDPOINT = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT"));
     DB_PASSWORD = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD"));
     # Use the PostgresSQL Database name from pgadmin4, not the DB identifier on Amazon RDS.
     DATABASE_NAME = str("seng550_a2_dbi");
-    
-    pg_conn = psql.connect(
-        host=DB_ENDPOINT,
-        user="postgres",
-        password=DB_PASSWORD,
-        database=DATABASE_NAME
-    );
-
-    # SQL Connection to database failed
-    if(pg_conn.closed != 0):
-        print("Connection to database failed, something went wrong...\n");
-        pg_conn.rollback();
-        pg_conn.close();
-        return;
-    # SQL Connection to database succeeded
-    else:
-        print(f"Connection to {DATABASE_NAME} was successful!\n");
-
-    pg_cursor = pg_conn.cursor();
-
-    # All the relevant data was already sorted out from the temp table.
-    # NOTE: Python connection is another session, so it will NOT see the temp table.
-    sql = """
-        DROP TABLE IF EXISTS customer_orders CASCADE;
-        CREATE TEMPORARY TABLE IF NOT EXISTS customer_orders AS
-        SELECT dc.customer_id, dc.name, dc.city, fo.order_id, fo.order_date, fo.amount
-        FROM dim_customers AS dc
-        INNER JOIN fact_orders AS fo
-            ON fo.customer_id = dc.customer_id
-            AND fo.order_date BETWEEN dc.valid_start_date
-            AND COALESCE(dc.valid_end_date, CURRENT_TIMESTAMP);
-        -- Rename the column, because otherwise it will get deleted in the natural join
-        -- and it helps to differentiate it from "name" in dim_products.
-        ALTER TABLE customer_orders
-        RENAME COLUMN name TO customer_name;
-        SELECT *
-        FROM customer_orders;
-
-        -- Join and return the relationship attributes requested from products and orders
-        DROP TABLE IF EXISTS product_orders CASCADE;
-        CREATE TEMPORARY TABLE IF NOT EXISTS product_orders AS
-        SELECT dp.product_id, dp.name, dp.price, fo.order_id, fo.order_date, fo.amount
-        FROM dim_products AS dp
-        INNER JOIN fact_orders AS fo
-            ON dp.product_id = fo.product_id
-            AND fo.order_date BETWEEN dp.valid_start_date
-            AND COALESCE(dp.valid_end_date, CURRENT_TIMESTAMP);
-
-        ALTER TABLE product_orders
-        RENAME COLUMN name TO product_name;
-        SELECT *
-        FROM product_orders;
-
-        -- Join customer_orders and product_orders ON the order columns, since they are the same
-        -- in both temp tables.
-        SELECT order_id, order_date, customer_id, customer_name, city AS customer_city, 
-        product_id, product_name, price AS product_price, amount
-        FROM customer_orders AS co
-        NATURAL JOIN product_orders
-    """;
-    engine = create_engine(f"""postgresql+psycopg2://postgres:{DB_PASSWORD}@{DB_ENDPOINT}:5432/{DATABASE_NAME}""");
-
-    # Use pandas to read the database query, and store them into a dataframe.
-    df = pd.read_sql_query(sql, engine);
-
-    # Transform the NaT (Not a Time, which can be NULL values), to None Type to insert into the collection.
-    df = df.replace({pd.NaT: None});
-
-    # Convert the dataframe rows to a list of dictionaries so MongoDB can read them.
-    mongo_documents = df.to_dict("records");
-    
-    # Insert the documents into mongodb.
-    orders_summary.insert_many(mongo_documents);
-    print(f"Inserted {len(mongo_documents)} documents into MongoDB!");
+
+    mode = "truncate" if bulk_delete == 1 else ["full", "stream", "incremental", "snapshot"][export_mode];
+    result = run(DB_ENDPOINT, DATABASE_NAME, DB_PASSWORD, mode=mode);
+    cli.print_result(result);
+    # DB_INSTRUMENT=1 in the .env file.
+    if(instrument.ENABLED):
+        print(instrument.METRICS.summary());
+    db.close_all();
+
+
+def cli_main(argv=None):
+    '''
+    Non-interactive entry point, for example:
+    py "./A2/scripts/etl.py" --mode incremental --batch-size 20000 --json
+    '''
+    parser = cli.base_parser("Export the A2 orders summary to MongoDB.", modes=["truncate", "full", "stream", "incremental", "snapshot"], default_mode="stream");
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB connection string (default: MONGO_URI of the .env file).");
+    parser.add_argument("--mongo-database", default="sales_db", help="MongoDB database of orders_summary and the rollups.");
+    parser.add_argument("--watermark", default=WATERMARK_PATH, help="High-water mark file of the incremental mode.");
+    parser.add_argument("--snapshot-dir", default=None, help="Directory of the snapshot mode (default: ./A2/snapshot).");
+    parser.add_argument("--snapshot-format", choices=["ipc", "parquet"], default="ipc", help="Arrow IPC (memory-mapped, zero-copy) or Parquet (smaller).");
+    args = parser.parse_args(argv);
+
+    with cli.instrumentation(args):
+        result = run(args.endpoint or cli.env_value("DB_ENDPOINT"), args.database or "seng550_a2_dbi", cli.env_value("DB_PASSWORD"),
+                     mode=args.mode, batch_size=args.batch_size or EXPORT_BATCH_SIZE, dry_run=args.dry_run,
+                     mongo_uri=args.mongo_uri, mongo_database=args.mongo_database, watermark_path=args.watermark,
+                     snapshot_dir=args.snapshot_dir, snapshot_format=args.snapshot_format);
+    cli.print_result(result, as_json=args.json);
+    db.close_all();
+    return result;
 
 if __name__ == "__main__":
-    main();
\ No newline at end of file
+    # Without arguments the script asks its questions, with arguments it runs from the command line.
+    if(len(sys.argv) > 1):
+        cli_main();
+    else:
+        main();
@@ -0,0 +1,267 @@
+import asyncio; import re; import time;
+import os; import sys;
+# The shared modules live in ./common, next to the A2 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."));
+from common import cli; # Shared flags and results of the non-interactive entry points.
+import asyncpg; # Async PostgreSQL driver.
+from motor.motor_asyncio import AsyncIOMotorClient; # Async MongoDB driver.
+from pymongo import ReplaceOne;
+from pymongo.server_api import ServerApi;
+import etl; # Query, watermark, documents and rollups of the export.
+
+# Async version of the streaming / incremental export of etl.py, as a pipeline of concurrent stages:
+#
+#   producer (asyncpg cursor) -> raw queue -> transform (to_document) -> document queue -> N writers (motor)
+#
+# The queues are bounded, so a slow side makes the other one wait instead of buffering the whole table in memory.
+# While the writers send a batch to MongoDB, the producer is already fetching the next ones from Postgres,
+# so an export takes about max(read, write) instead of read + transform + write.
+
+# Concurrent MongoDB writer tasks.
+WRITERS = 4;
+
+# Batches each queue holds before its producer waits.
+QUEUE_SIZE = 4;
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def to_positional(query, query_params=None):
+    '''
+    Turns a psycopg2 query with %(name)s parameters into an asyncpg one with $1, $2 ... and the list of its arguments.
+    Text values are sent as ::text, so casts in the query (::timestamptz) also accept '-infinity'.
+    '''
+    if(query_params is None):
+        return query.replace("%%", "%"), [];
+    names = [];
+    def placeholder(match):
+        name = match.group(1);
+        if(name not in names):
+            names.append(name);
+        position = names.index(name) + 1;
+        return f"${position}::text" if isinstance(query_params[name], str) else f"${position}";
+    query = re.sub(r"%\((\w+)\)s", placeholder, query).replace("%%", "%");
+    return query, [query_params[name] for name in names];
+
+
+async def produce(pg_conn, query, args, batch_size, raw_queue, stats):
+    '''
+    Fetches the query `batch_size` rows at a time through a server-side cursor, and puts every batch on the raw queue.
+    A None marks the end.
+    '''
+    async with pg_conn.transaction():
+        cursor = await pg_conn.cursor(query, *args);
+        while(True):
+            start_time = time.perf_counter();
+            rows = await cursor.fetch(batch_size);
+            stats["read_seconds"] += time.perf_counter() - start_time;
+            if(len(rows) == 0):
+                break;
+            await raw_queue.put(rows);
+    await raw_queue.put(None);
+
+
+def to_documents(rows):
+    '''
+    Same transform as etl.py: one dictionary per row, NUMERIC as float, NULLs as None.
+    '''
+    columns = list(rows[0].keys());
+    return [etl.to_document(columns, row.values()) for row in rows];
+
+
+async def transform(raw_queue, document_queue, writers, stats):
+    '''
+    Turns the batches of rows into documents, on a worker thread so the event loop keeps reading and writing.
+    Passes the end on to every writer.
+    '''
+    loop = asyncio.get_running_loop();
+    while(True):
+        rows = await raw_queue.get();
+        if(rows is None):
+            break;
+        start_time = time.perf_counter();
+        documents = await loop.run_in_executor(None, to_documents, rows);
+        stats["transform_seconds"] += time.perf_counter() - start_time;
+        await document_queue.put(documents);
+    for _ in range(writers):
+        await document_queue.put(None);
+
+
+async def update_rollups(rollups, added, removed=()):
+    '''
+    etl.update_rollups() with motor, the three rollup collections are written at the same time.
+    '''
+    await asyncio.gather(*[rollups[rollup].bulk_write(operations, ordered=False)
+                           for rollup, operations in etl.rollup_operations(added, removed).items() if len(operations) > 0]);
+
+
+async def write_batches(document_queue, orders_summary, upsert, rollups, stats):
+    '''
+    One writer task: sends batches of documents to orders_summary (and the rollups) until it gets a None.
+    Documents are inserted unordered, or upserted on order_id with `upsert`, same as etl.stream_export().
+    '''
+    while(True):
+        documents = await document_queue.get();
+        if(documents is None):
+            break;
+        start_time = time.perf_counter();
+        if(rollups is not None):
+            replaced = [];
+            if(upsert):
+                replaced = await orders_summary.find({"order_id": {"$in": [doc["order_id"] for doc in documents]}}, {"_id": 0}).to_list(None);
+            await update_rollups(rollups, documents, replaced);
+        if(upsert):
+            await orders_summary.bulk_write([ReplaceOne({"order_id": doc["order_id"]}, doc, upsert=True) for doc in documents], ordered=False);
+        else:
+            await orders_summary.insert_many(documents, ordered=False);
+        stats["write_seconds"] += time.perf_counter() - start_time;
+        stats["documents"] += len(documents);
+        stats["batches"] += 1;
+
+
+async def export_pipeline(pg_conn, orders_summary, batch_size=etl.EXPORT_BATCH_SIZE, writers=WRITERS, queue_size=QUEUE_SIZE,
+                          query=etl.ORDERS_SUMMARY_QUERY, query_params=None, upsert=False, rollups=None):
+    '''
+    Streams the orders summary from PostgreSQL to MongoDB through the producer, transform and writer tasks.
+    `pg_conn` is an asyncpg connection, `orders_summary` and `rollups` are motor collections
+    (or any collection with awaitable insert_many / bulk_write / find().to_list(), such as mongomock_motor's for tests).
+    If a stage fails, the others are cancelled and the error is raised.
+
+    ## Returns:
+    - Dictionary with the documents written, the batches, the elapsed seconds, the documents per second, and the seconds
+      spent reading, transforming and writing (summed over the writers), to compare with the elapsed time.
+    '''
+    raw_queue = asyncio.Queue(maxsize=queue_size);
+    document_queue = asyncio.Queue(maxsize=queue_size);
+    stats = {"documents": 0, "batches": 0, "read_seconds": 0.0, "transform_seconds": 0.0, "write_seconds": 0.0};
+    query, args = to_positional(query, query_params);
+
+    start_time = time.perf_counter();
+    tasks = [
+        asyncio.create_task(produce(pg_conn, query, args, batch_size, raw_queue, stats)),
+        asyncio.create_task(transform(raw_queue, document_queue, writers, stats)),
+        *[asyncio.create_task(write_batches(document_queue, orders_summary, upsert, rollups, stats)) for _ in range(writers)],
+    ];
+    try:
+        await asyncio.gather(*tasks);
+    except Exception:
+        for task in tasks:
+            task.cancel();
+        await asyncio.gather(*tasks, return_exceptions=True);
+        raise;
+
+    elapsed = time.perf_counter() - start_time;
+    report = {
+        **{key: (round(value, 3) if isinstance(value, float) else value) for key, value in stats.items()},
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(stats["documents"] / elapsed, 1) if elapsed > 0 else 0.0,
+    };
+    print(f"Streamed {stats['documents']} documents into MongoDB in {stats['batches']} batches with {writers} writers, "
+          f"{elapsed:.2f}s (read {stats['read_seconds']:.2f}s, transform {stats['transform_seconds']:.2f}s, write {stats['write_seconds']:.2f}s)");
+    return report;
+
+
+async def current_snapshot(pg_conn):
+    '''
+    etl.current_snapshot() with asyncpg.
+    '''
+    max_order_id, xmin, xmax = await pg_conn.fetchrow(etl.SNAPSHOT_SQL);
+    return {"max_order_id": max_order_id, "xmin": xmin, "xmax": xmax};
+
+
+async def ensure_summary_indexes(orders_summary):
+    for field in etl.SUMMARY_INDEX_FIELDS:
+        await orders_summary.create_index(field);
+
+
+async def incremental_pipeline(pg_conn, orders_summary, batch_size=etl.EXPORT_BATCH_SIZE, writers=WRITERS, queue_size=QUEUE_SIZE,
+                               watermark_path=etl.WATERMARK_PATH, rollups=None):
+    '''
+    etl.incremental_export() through export_pipeline(): upserts what changed since the saved high-water mark,
+    and saves the new one once everything is written. Shares the watermark file with etl.py.
+    '''
+    last_watermark = etl.load_watermark(watermark_path);
+    start_snapshot = await current_snapshot(pg_conn);
+    await ensure_summary_indexes(orders_summary);
+    report = await export_pipeline(pg_conn, orders_summary, batch_size, writers, queue_size,
+                                   query=etl.ORDERS_SUMMARY_QUERY + etl.INCREMENTAL_FILTER,
+                                   query_params=etl.incremental_params(last_watermark, start_snapshot),
+                                   upsert=True, rollups=rollups);
+    new_watermark = etl.next_watermark(last_watermark, start_snapshot, await current_snapshot(pg_conn));
+    etl.save_watermark(new_watermark, watermark_path);
+    report["previous_watermark"] = last_watermark;
+    report["watermark"] = new_watermark;
+    return report;
+
+# ======================================================================== [MAIN] ======================================================================= #
+async def run_async(endpoint, database, password, mode="stream", batch_size=etl.EXPORT_BATCH_SIZE, writers=WRITERS, queue_size=QUEUE_SIZE,
+                    dry_run=False, mongo_uri=None, mongo_database="sales_db", watermark_path=etl.WATERMARK_PATH):
+    '''
+    Connects to both databases and runs the export, see run().
+    '''
+    start_time = time.perf_counter();
+    mongo_cli = AsyncIOMotorClient(mongo_uri or etl.uri, server_api=ServerApi('1'));
+    try:
+        # Ping the database server.
+        await mongo_cli.admin.command('ping');
+    except Exception as e:
+        mongo_cli.close();
+        return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error=f"Connecting to MongoDB failed: {e}");
+
+    sales_db = mongo_cli.get_database(mongo_database);
+    orders_summary = sales_db.get_collection("orders_summary");
+    rollups = etl.get_rollups(sales_db);
+    pg_conn = await asyncpg.connect(host=endpoint, database=database, user="postgres", password=password);
+    try:
+        if(dry_run):
+            query = etl.ORDERS_SUMMARY_QUERY; query_params = None;
+            if(mode == "incremental"):
+                query = etl.ORDERS_SUMMARY_QUERY + etl.INCREMENTAL_FILTER;
+                query_params = etl.incremental_params(etl.load_watermark(watermark_path), await current_snapshot(pg_conn));
+            query, args = to_positional(query, query_params);
+            documents = await pg_conn.fetchval(f"SELECT COUNT(*) FROM ({query}) AS export", *args);
+            return cli.make_result(mode, documents, time.perf_counter() - start_time, dry_run);
+
+        if(mode == "incremental"):
+            report = await incremental_pipeline(pg_conn, orders_summary, batch_size, writers, queue_size, watermark_path, rollups);
+        else:
+            await ensure_summary_indexes(orders_summary);
+            report = await export_pipeline(pg_conn, orders_summary, batch_size, writers, queue_size, rollups=rollups);
+    finally:
+        await pg_conn.close();
+        mongo_cli.close();
+
+    details = {key: value for key, value in report.items() if key not in ("documents", "elapsed_seconds", "documents_per_second")};
+    return cli.make_result(mode, report["documents"], time.perf_counter() - start_time, dry_run, writers=writers, **details);
+
+
+def run(endpoint, database, password, mode="stream", batch_size=etl.EXPORT_BATCH_SIZE, writers=WRITERS, queue_size=QUEUE_SIZE,
+        dry_run=False, mongo_uri=None, mongo_database="sales_db", watermark_path=etl.WATERMARK_PATH):
+    '''
+    Runs the async export, same modes and result as etl.run() ("stream" or "incremental"),
+    with `writers` concurrent MongoDB writers and queues of `queue_size` batches.
+    '''
+    return asyncio.run(run_async(endpoint, database, password, mode, batch_size, writers, queue_size,
+                                 dry_run, mongo_uri, mongo_database, watermark_path));
+
+
+def cli_main(argv=None):
+    '''
+    Command line entry point, for example:
+    py "./A2/scripts/etl_async.py" --mode incremental --writers 8 --batch-size 20000
+    '''
+    parser = cli.base_parser("Export the A2 orders summary to MongoDB with an async pipeline.", modes=["stream", "incremental"], default_mode="stream");
+    parser.add_argument("--writers", type=int, default=WRITERS, help="Concurrent MongoDB writer tasks.");
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Batches buffered between two stages.");
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB connection string (default: MONGO_URI of the .env file).");
+    parser.add_argument("--mongo-database", default="sales_db", help="MongoDB database of orders_summary and the rollups.");
+    parser.add_argument("--watermark", default=etl.WATERMARK_PATH, help="High-water mark file of the incremental mode.");
+    args = parser.parse_args(argv);
+
+    with cli.instrumentation(args):
+        result = run(args.endpoint or cli.env_value("DB_ENDPOINT"), args.database or "seng550_a2_dbi", cli.env_value("DB_PASSWORD"),
+                     mode=args.mode, batch_size=args.batch_size or etl.EXPORT_BATCH_SIZE, writers=args.writers, queue_size=args.queue_size,
+                     dry_run=args.dry_run, mongo_uri=args.mongo_uri, mongo_database=args.mongo_database, watermark_path=args.watermark);
+    cli.print_result(result, as_json=args.json);
+    return result;
+
+if __name__ == "__main__":
+    cli_main();
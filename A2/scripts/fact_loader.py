@@ -0,0 +1,199 @@
+import os; import sys; import time;
+import pandas as pd;
+# The shared modules live in ./common, next to the A2 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."));
+from common import copy_binary; # Sends the batch with binary COPY.
+from common import instrument; # Per-operation timing of the database round trips (@instrument.traced).
+import scd_batch; # iter_batches() splits DataFrames / iterators of rows into batches.
+import partitions; # Monthly partitions of fact_orders, created before every batch.
+import aggregates; # Precomputed Part3 reports.
+
+# Columns of an incoming order, customer_id and product_id are BUSINESS keys.
+ORDER_COLUMNS = ["customer_id", "product_id", "amount", "order_date"];
+
+# Postgres type of every staged column, for the binary COPY.
+ORDER_COLUMN_TYPES = {"customer_id": "int4", "product_id": "int4", "amount": "numeric", "order_date": "timestamptz"};
+
+# Orders inserted per transaction.
+BATCH_SIZE = 50000;
+
+# Surrogate ids of every staged order, found by the database: for each business key, the latest version that started
+# at or before the order_date, through the (business key, valid_start_date) indexes of ensure_asof_indexes(),
+# if it had not ended yet at the order_date (the half-open [valid_start_date, valid_end_date) rule).
+RESOLVE_IN_DATABASE_SQL = """
+    SELECT s.stage_row, dp.id AS product_id, dc.id AS customer_id,
+        COALESCE(s.order_date, CURRENT_TIMESTAMP) AS order_date, s.amount
+    FROM fact_stage AS s
+    JOIN LATERAL (
+        SELECT d.id, d.valid_end_date
+        FROM dim_customers AS d
+        WHERE d.customer_id = s.customer_id
+        AND d.valid_start_date <= COALESCE(s.order_date, CURRENT_TIMESTAMP)
+        ORDER BY d.valid_start_date DESC
+        LIMIT 1
+    ) AS dc ON dc.valid_end_date IS NULL OR COALESCE(s.order_date, CURRENT_TIMESTAMP) < dc.valid_end_date
+    JOIN LATERAL (
+        SELECT d.id, d.valid_end_date
+        FROM dim_products AS d
+        WHERE d.product_id = s.product_id
+        AND d.valid_start_date <= COALESCE(s.order_date, CURRENT_TIMESTAMP)
+        ORDER BY d.valid_start_date DESC
+        LIMIT 1
+    ) AS dp ON dp.valid_end_date IS NULL OR COALESCE(s.order_date, CURRENT_TIMESTAMP) < dp.valid_end_date
+""";
+
+# The staged orders already carry their surrogate ids (resolved with asof_index.AsOfIndex).
+RESOLVED_STAGE_SQL = """
+    SELECT stage_row, product_id, customer_id, order_date, amount
+    FROM fact_stage
+""";
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def ensure_asof_indexes(conn_arg, cursor_arg):
+    '''
+    Creates the (business key, valid_start_date) indexes used to find the version of a customer or product
+    that was valid when an order was placed, without scanning its whole history.
+    ## Returns:
+    - An integer flag, 1 if operation was successful, -1 if operation failed.
+    '''
+    try:
+        cursor_arg.execute(
+            query="""
+            CREATE INDEX IF NOT EXISTS dim_customers_asof_idx
+            ON dim_customers (customer_id, valid_start_date);
+
+            CREATE INDEX IF NOT EXISTS dim_products_asof_idx
+            ON dim_products (product_id, valid_start_date);
+            """
+        );
+        conn_arg.commit();
+        return 1;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Creating the as-of indexes failed!\n", e);
+        return -1;
+
+
+def resolve_in_memory(batch_df, customer_index, product_index):
+    '''
+    Replaces the business keys of a batch by the surrogate ids of the versions valid at each order_date, with
+    the binary searches of two asof_index.AsOfIndex (same [valid_start_date, valid_end_date) rule as the database).
+    Orders without an order_date are placed now. Orders with no valid customer or product version are dropped.
+    '''
+    order_dates = batch_df["order_date"].fillna(pd.Timestamp.now(tz="UTC"));
+    resolved_df = batch_df.assign(
+        customer_id=customer_index.surrogate_ids(batch_df["customer_id"], order_dates),
+        product_id=product_index.surrogate_ids(batch_df["product_id"], order_dates),
+        order_date=order_dates
+    );
+    return resolved_df[(resolved_df["customer_id"] >= 0).to_numpy() & (resolved_df["product_id"] >= 0).to_numpy()];
+
+
+@instrument.traced
+def load_order_batch(batch_df, conn_arg, cursor_arg, refresh_aggregates=False, customer_index=None, product_index=None):
+    '''
+    Inserts one batch of orders into fact_orders, in ONE transaction:
+    the batch is sent with binary COPY to a temporary table, and a single INSERT ... SELECT resolves every order
+    to the surrogate ids of the customer and product versions that were valid at its order_date
+    (the latest version that started at or before it, if it had not ended yet).
+    With a `customer_index` and a `product_index` (asof_index.AsOfIndex, loaded after the last dimension change),
+    the surrogate ids are resolved in memory before the COPY instead, and the database only inserts.
+    When fact_orders is partitioned, the partitions of the months of the batch are created first, and a batch of one month
+    is inserted straight into its partition (see partitions.batch_target).
+    If refresh_aggregates is True, the inserted orders are added to the aggregate tables in the same transaction.
+
+    ## Returns:
+    - A dict with the counts of the batch: `rows` received, `inserted`, `duplicates` (already in fact_orders,
+      skipped by ON CONFLICT) and `unresolved` (no customer or product version existed at the order_date).
+    '''
+    batch_df = batch_df[ORDER_COLUMNS].copy();
+    row_count = len(batch_df);
+    # Timestamps are sent in UTC. Orders without one are placed now (COALESCE below), same as the DEFAULT of fact_orders.
+    batch_df["order_date"] = pd.to_datetime(batch_df["order_date"], utc=True);
+    target_table = partitions.batch_target(batch_df["order_date"], conn_arg, cursor_arg);
+    if(target_table is None):
+        raise RuntimeError("The partitions of the batch could not be created.");
+    resolve_sql = RESOLVE_IN_DATABASE_SQL;
+    if(customer_index is not None and product_index is not None):
+        batch_df = resolve_in_memory(batch_df, customer_index, product_index);
+        resolve_sql = RESOLVED_STAGE_SQL;
+
+    cursor_arg.execute("DROP TABLE IF EXISTS fact_stage");
+    cursor_arg.execute(
+        query="""
+        CREATE TEMPORARY TABLE fact_stage
+        (
+            stage_row SERIAL,
+            customer_id INT,
+            product_id INT,
+            amount NUMERIC,
+            order_date TIMESTAMP WITH TIME ZONE
+        ) ON COMMIT DROP
+        """
+    );
+    # Encoded column by column with the types of fact_stage, missing values are NULLs.
+    copy_binary.copy_dataframe(batch_df, "fact_stage", ORDER_COLUMN_TYPES, cursor_arg);
+
+    cursor_arg.execute(
+        query=f"""
+        WITH resolved AS ({resolve_sql}),
+        inserted AS (
+            INSERT INTO {target_table} (product_id, customer_id, order_date, amount)
+            SELECT product_id, customer_id, order_date, amount
+            FROM resolved
+            ORDER BY stage_row
+            ON CONFLICT
+            DO NOTHING
+            RETURNING order_id
+        )
+        SELECT (SELECT COUNT(*) FROM resolved), COUNT(*), {"array_agg(order_id)" if refresh_aggregates else "NULL"}
+        FROM inserted
+        """
+    );
+    resolved_count, inserted_count, inserted_ids = cursor_arg.fetchone();
+    if(refresh_aggregates and inserted_ids is not None):
+        aggregates.apply_orders(inserted_ids, cursor_arg);
+    conn_arg.commit();
+    return {
+        "rows": row_count,
+        "inserted": inserted_count,
+        "duplicates": resolved_count - inserted_count,
+        "unresolved": row_count - resolved_count,
+    };
+
+
+def load_orders(orders, conn_arg, cursor_arg, batch_size=BATCH_SIZE, refresh_aggregates=False, customer_index=None, product_index=None):
+    '''
+    Bulk version of add_order() in part2.py, for streams of orders keyed by BUSINESS ids.
+    Every batch costs one COPY and one INSERT ... SELECT with one commit, instead of one INSERT and one commit per order,
+    and the surrogate ids are resolved by the database in the same statement (see load_order_batch).
+
+    ## Args:
+    - orders: DataFrame, or iterator of DataFrames / dicts / tuples, with customer_id, product_id, amount and order_date.
+    - conn_arg, cursor_arg: psycopg2 connection and cursor.
+    - batch_size: Orders per transaction.
+    - refresh_aggregates: Keep the aggregate tables of aggregates.py up to date (see load_order_batch).
+    - customer_index, product_index: Loaded asof_index.AsOfIndex of both dimensions, to resolve the surrogate ids in memory.
+
+    ## Returns:
+    - List with the counts of every batch (see load_order_batch). None if a batch failed, that batch is rolled back
+      but the batches before it stay committed.
+    '''
+    batch_results = [];
+    start_time = time.perf_counter();
+    for batch_number, batch_df in enumerate(scd_batch.iter_batches(orders, ORDER_COLUMNS, batch_size), start=1):
+        try:
+            counts = load_order_batch(batch_df, conn_arg, cursor_arg, refresh_aggregates, customer_index, product_index);
+            counts["batch"] = batch_number;
+            batch_results.append(counts);
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"Fact batch {batch_number} failed!\n", e);
+            return None;
+
+    elapsed = time.perf_counter() - start_time;
+    total_rows = sum(counts["rows"] for counts in batch_results);
+    rows_per_sec = total_rows / elapsed if elapsed > 0 else 0.0;
+    print(f"Loaded {sum(counts['inserted'] for counts in batch_results)} of {total_rows} orders into fact_orders "
+          f"in {len(batch_results)} batches, {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec)");
+    return batch_results;
@@ -2,8 +2,86 @@ import numpy as np;
 import pandas as pd;
 import psycopg2 as psql;
 import dotenv;
+import os; import sys;
+# The shared modules live in ./common, next to the A2 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."));
+from common import db; # Pooled connections shared with A1/load.py and etl.py.
+import dim_cache; # In-memory current versions of the dimension tables.
+import aggregates; # Precomputed Part3 reports.
+import scd_batch; import fact_loader; # Batch merges of the dimension feeds and bulk order loads.
+import partitions; # Monthly partitions of fact_orders.
+import asof_index; # In-memory versions of the dimensions, for the order feed.
+from common import cli; # Shared flags and results of the non-interactive entry points.
+from common import instrument; # Per-operation timing of the database round trips (@instrument.traced).
+from common import prepared; # Server-side prepared statements of the single-row helpers.
+import time;
+
+# Maximum number of entities kept in each dimension cache.
+DIM_CACHE_SIZE = 100000;
+
+# Columns of the tuples returned by the lookups, in the order of ./A2/SQL/create-2d-tables.sql.
+# Listed instead of SELECT *: a prepared SELECT * fails with "cached plan must not change result type" once a column
+# is added to the table (for example the validity column of asof_index.py), and the tuples keep the same shape.
+CUSTOMER_COLUMNS = "id, customer_id, name, email, city, valid_start_date, valid_end_date";
+PRODUCT_COLUMNS = "id, product_id, name, category, price, valid_start_date, valid_end_date";
+
+# Statements of the single-row helpers. Each one is PREPAREd once per connection, then every call only sends
+# EXECUTE with its values ($1, $2, ...), so Postgres does not parse and plan it again (see ./common/prepared.py).
+CUSTOMER_HISTORY_SQL = f"""
+    SELECT {CUSTOMER_COLUMNS}
+    FROM dim_customers
+    WHERE customer_id = $1
+""";
+PRODUCT_HISTORY_SQL = f"""
+    SELECT {PRODUCT_COLUMNS}
+    FROM dim_products
+    WHERE product_id = $1
+""";
+CURRENT_CUSTOMER_SQL = f"""
+    SELECT {CUSTOMER_COLUMNS}
+    FROM dim_customers
+    WHERE customer_id = $1 AND valid_end_date IS NULL
+""";
+CURRENT_PRODUCT_SQL = f"""
+    SELECT {PRODUCT_COLUMNS}
+    FROM dim_products
+    WHERE product_id = $1 AND valid_end_date IS NULL
+""";
+INSERT_CUSTOMER_SQL = """
+    INSERT INTO dim_customers (customer_id, name, email, city)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT
+    DO NOTHING
+    RETURNING id
+""";
+INSERT_PRODUCT_SQL = """
+    INSERT INTO dim_products (product_id, name, category, price)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT
+    DO NOTHING
+    RETURNING id
+""";
+# No conflict target, so it also works on the partitioned fact_orders, whose unique constraint includes order_date.
+INSERT_ORDER_SQL = """
+    INSERT INTO fact_orders (product_id, customer_id, amount)
+    VALUES ($1, $2, $3)
+    ON CONFLICT
+    DO NOTHING
+    RETURNING order_id
+""";
+RETIRE_CUSTOMER_SQL = """
+    UPDATE dim_customers
+    SET valid_end_date = CURRENT_TIMESTAMP
+    WHERE id = $1
+""";
+RETIRE_PRODUCT_SQL = """
+    UPDATE dim_products
+    SET valid_end_date = CURRENT_TIMESTAMP
+    WHERE id = $1
+""";
 
 # ======================================================================== [FUNCTION] ======================================================================= #
+@instrument.traced
 def bulk_delete(table_name, conn_arg, cursor_arg):
     '''
     Deletes every entry from each table, but DOES NOT delete the table itself.
@@ -24,16 +102,11 @@ def bulk_delete(table_name, conn_arg, cursor_arg):
         print(f"Error bulk deleting {table_name}: {e}");
         return -1;
 
+@instrument.traced
 def get_most_recent_customer(customer_id, cursor_arg, conn_arg):
     # Store the entire tuple of the data, this is what is returned.
     try:
-        cursor_arg.execute(
-            query=f"""
-            SELECT *
-            FROM dim_customers
-            WHERE customer_id = {customer_id}    
-            """
-        );
+        prepared.execute(CUSTOMER_HISTORY_SQL, (customer_id,), cursor_arg);
         all_customers = cursor_arg.fetchall();
         conn_arg.commit();
         return all_customers[len(all_customers) - 1];
@@ -41,45 +114,169 @@ def get_most_recent_customer(customer_id, cursor_arg, conn_arg):
         conn_arg.rollback();
         print("get_most_recent_customer failed!\n", e);
 
+@instrument.traced
 def get_most_recent_product(product_id, cursor_arg, conn_arg):
+    try:
+        prepared.execute(PRODUCT_HISTORY_SQL, (product_id,), cursor_arg);
+        all_products = cursor_arg.fetchall();
+        conn_arg.commit();
+        return all_products[len(all_products) - 1];
+    except Exception as e:
+        conn_arg.rollback();
+        print("get_most_recent_product failed!\n", e);
+
+def ensure_current_version_indexes(conn_arg, cursor_arg):
+    '''
+    Creates the partial indexes behind get_current_customer() and get_current_product() (same as ./A2/SQL/current-version-indexes.sql).
+    They only hold the rows where valid_end_date IS NULL, so they stay as small as the number of entities no matter
+    how much history there is, and being UNIQUE they also make sure every entity has at most ONE current version.
+    add_customer() and add_product() skip a row that would break it (ON CONFLICT DO NOTHING) instead of raising.
+    The older UNIQUE constraints on every attribute are dropped, they rejected a version equal to an OLD one (a revert).
+    ## Returns:
+    - An integer flag, 1 if operation was successful, -1 if operation failed.
+    '''
+    try:
+        cursor_arg.execute(
+            query="""
+            CREATE UNIQUE INDEX IF NOT EXISTS dim_customers_current_idx
+            ON dim_customers (customer_id)
+            WHERE valid_end_date IS NULL;
+
+            CREATE UNIQUE INDEX IF NOT EXISTS dim_products_current_idx
+            ON dim_products (product_id)
+            WHERE valid_end_date IS NULL;
+
+            ALTER TABLE dim_customers DROP CONSTRAINT IF EXISTS dim_customers_customer_id_name_email_city_key;
+            ALTER TABLE dim_products DROP CONSTRAINT IF EXISTS dim_products_product_id_name_category_price_key;
+            """
+        );
+        conn_arg.commit();
+        return 1;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Creating the current version indexes failed!\n", e);
+        return -1;
+
+@instrument.traced
+def get_current_customer(customer_id, cursor_arg, conn_arg):
+    '''
+    Returns the tuple of the CURRENT version of a customer (the one with valid_end_date IS NULL),
+    found through the dim_customers_current_idx partial index, so it costs the same no matter how much history there is.
+    None if the customer has no current version.
+    '''
+    try:
+        prepared.execute(CURRENT_CUSTOMER_SQL, (customer_id,), cursor_arg);
+        current_customer = cursor_arg.fetchone();
+        conn_arg.commit();
+        return current_customer;
+    except Exception as e:
+        conn_arg.rollback();
+        print("get_current_customer failed!\n", e);
+
+@instrument.traced
+def get_current_customers(customer_ids, cursor_arg, conn_arg):
+    '''
+    Bulk version of get_current_customer(), looks up a whole list of customers in ONE round trip.
+    ## Returns:
+    - Dictionary of customer_id -> tuple of its current version. Customers without a current version are left out.
+    '''
     try:
         cursor_arg.execute(
             query=f"""
-            SELECT *
+            SELECT {CUSTOMER_COLUMNS}
+            FROM dim_customers
+            WHERE customer_id = ANY(%s) AND valid_end_date IS NULL
+            """,
+            vars=(list(customer_ids),)
+        );
+        current_customers = {row[1]: row for row in cursor_arg.fetchall()};
+        conn_arg.commit();
+        return current_customers;
+    except Exception as e:
+        conn_arg.rollback();
+        print("get_current_customers failed!\n", e);
+
+@instrument.traced
+def get_current_product(product_id, cursor_arg, conn_arg):
+    '''
+    Returns the tuple of the CURRENT version of a product, same as get_current_customer().
+    '''
+    try:
+        prepared.execute(CURRENT_PRODUCT_SQL, (product_id,), cursor_arg);
+        current_product = cursor_arg.fetchone();
+        conn_arg.commit();
+        return current_product;
+    except Exception as e:
+        conn_arg.rollback();
+        print("get_current_product failed!\n", e);
+
+@instrument.traced
+def get_current_products(product_ids, cursor_arg, conn_arg):
+    '''
+    Bulk version of get_current_product(), looks up a whole list of products in ONE round trip.
+    ## Returns:
+    - Dictionary of product_id -> tuple of its current version. Products without a current version are left out.
+    '''
+    try:
+        cursor_arg.execute(
+            query=f"""
+            SELECT {PRODUCT_COLUMNS}
             FROM dim_products
-            WHERE product_id = {product_id}    
-            """
+            WHERE product_id = ANY(%s) AND valid_end_date IS NULL
+            """,
+            vars=(list(product_ids),)
         );
-        all_products = cursor_arg.fetchall();
+        current_products = {row[1]: row for row in cursor_arg.fetchall()};
         conn_arg.commit();
-        return all_products[len(all_products) - 1];
+        return current_products;
     except Exception as e:
         conn_arg.rollback();
-        print("get_most_recent_product failed!\n", e);
+        print("get_current_products failed!\n", e);
+
+def insert_customer(customer_id, name, email, city, cursor_arg, refresh_aggregates=False):
+    '''
+    Inserts a customer version (and adds its city to the aggregate tables if refresh_aggregates is True), without
+    committing, so add_customer() and update_customer_city() decide where the transaction ends.
 
-def add_customer(customer_id, name, email, city, conn_arg, cursor_arg):
+    ## Returns:
+        Tuple representation of the added data, None if ON CONFLICT skipped it.
+    '''
+    prepared.execute(INSERT_CUSTOMER_SQL, (customer_id, name, email, city), cursor_arg);
+    customer_result = cursor_arg.fetchone();
+    if(refresh_aggregates and customer_result is not None):
+        aggregates.apply_customer_city(customer_id, name, city, cursor_arg);
+    return customer_result;
+
+def insert_product(product_id, name, category, price, cursor_arg):
+    '''
+    Inserts a product version without committing, see insert_customer().
+
+    ## Returns:
+        Tuple representation of the added data, None if ON CONFLICT skipped it.
+    '''
+    prepared.execute(INSERT_PRODUCT_SQL, (product_id, name, category, price), cursor_arg);
+    return cursor_arg.fetchone();
+
+@instrument.traced
+def add_customer(customer_id, name, email, city, conn_arg, cursor_arg, cache_arg=None, refresh_aggregates=False):
     '''
     Inserts a new customer into the dim_customers table given the non-dimensional values.
-    ON CONFLICT Checks mean that the exact same non-dimensional data cannot be inserted.
+    ON CONFLICT Checks mean that a second current version of the same customer_id cannot be inserted
+    (see ensure_current_version_indexes()): nothing is written and None is returned.
+    A concurrent add_customer() of the same customer_id waits for the other transaction and then returns None as well.
+    If a dim_customers DimensionCache is given, the new version is written through to it.
+    If refresh_aggregates is True, the city is added to the aggregate tables in the same transaction.
 
     ## Returns:
         Tuple representation of the added data.
     '''
     try:
-        cursor_arg.execute(
-        query=f"""
-                INSERT INTO dim_customers (customer_id, name, email, city)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (customer_id, name, email, city) 
-                DO NOTHING
-                RETURNING id
-                """,
-                vars=(customer_id, name, email, city)
-        );
-        customer_result = cursor_arg.fetchone();
+        customer_result = insert_customer(customer_id, name, email, city, cursor_arg, refresh_aggregates);
 
         # Required to commit and show the updated data in the pgadmin GUI.
         conn_arg.commit();
+        if(cache_arg is not None and customer_result is not None):
+            cache_arg.put(customer_id, {"id": customer_result[0], "name": name, "email": email, "city": city});
         print(f"Dim_customer insertion of {customer_id}, {name} was successful!\n");
         return customer_result;
 
@@ -89,29 +286,24 @@ def add_customer(customer_id, name, email, city, conn_arg, cursor_arg):
         print(f"Dim_customer insertion of {customer_id}, {name} failed!\n", e);
         return None;
 
-def add_product(product_id, name, category, price, conn_arg, cursor_arg):
+@instrument.traced
+def add_product(product_id, name, category, price, conn_arg, cursor_arg, cache_arg=None):
     '''
     Inserts a new product into the dim_products table given the non-dimensional values.
-    ON CONFLICT Checks mean that the exact same non-dimensional data cannot be inserted.
+    ON CONFLICT Checks mean that a second current version of the same product_id cannot be inserted
+    (see ensure_current_version_indexes()): nothing is written and None is returned.
+    If a dim_products DimensionCache is given, the new version is written through to it.
 
     ## Returns:
         Tuple representation of the newly inserted data.
     '''
     try:
-        cursor_arg.execute(
-            query=f"""
-                INSERT INTO dim_products (product_id, name, category, price)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (product_id, name, category, price) 
-                DO NOTHING
-                RETURNING id
-                """,
-                vars=(product_id, name, category, price)
-        );
-        product_result = cursor_arg.fetchone();
+        product_result = insert_product(product_id, name, category, price, cursor_arg);
 
         # Required to commit and show the updated data in the pgadmin GUI.
         conn_arg.commit();
+        if(cache_arg is not None and product_result is not None):
+            cache_arg.put(product_id, {"id": product_result[0], "name": name, "category": category, "price": price});
         print(f"Dim_product insertion of {product_id}, {name} was successful!\n");
         return product_result;
 
@@ -120,26 +312,23 @@ def add_product(product_id, name, category, price, conn_arg, cursor_arg):
         print(f"Dim_product insertion of {product_id}, {name} failed!\n", e);
         return None;
 
-def add_order(product_id, customer_id, amount, conn_arg, cursor_arg):
+@instrument.traced
+def add_order(product_id, customer_id, amount, conn_arg, cursor_arg, refresh_aggregates=False):
     '''
     Inserts a new product into the fact_orders table given the non-dimensional values.
+    product_id and customer_id are the SURROGATE ids (dim_products.id, dim_customers.id) of the versions the order
+    belongs to, use add_order_by_key() to place an order by business keys.
     ON CONFLICT ensures the exact same order of data does not appear in the table.
+    If refresh_aggregates is True, the order is added to the aggregate tables in the same transaction.
 
     ## Returns:
         Tuple representation of the newly added data.
     '''
     try:
-        cursor_arg.execute(
-            query=f"""
-                INSERT INTO fact_orders (product_id, customer_id, amount)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (product_id, customer_id, amount) 
-                DO NOTHING
-                RETURNING order_id
-                """,
-                vars=(product_id, customer_id, amount)
-        );
+        prepared.execute(INSERT_ORDER_SQL, (product_id, customer_id, amount), cursor_arg);
         order_result = cursor_arg.fetchone();
+        if(refresh_aggregates and order_result is not None):
+            aggregates.apply_orders([order_result[0]], cursor_arg);
 
         # Required to commit and show the updated data in the pgadmin GUI.
         conn_arg.commit();
@@ -151,163 +340,338 @@ def add_order(product_id, customer_id, amount, conn_arg, cursor_arg):
         print(f"Order insertion failed!\n", e);
         return None;
 
-def update_customer_city(customer_id, name, email, new_city, conn_arg, cursor_arg):
+@instrument.traced
+def update_customer_city(customer_id, name, email, new_city, conn_arg, cursor_arg, cache_arg=None, refresh_aggregates=False):
     '''
     Updates the city field of the customer dimensional table, by adding a new column where the City column is changed,
     identified by the new surrogate key. The end date of the old column will be filled, and this new entry will have a NULL
     for end_date.
+    The retire and the insert are one transaction: if the insert is skipped (ON CONFLICT), both are rolled back.
+    If a dim_customers DimensionCache is given, the current version is read from it, and the new one written through to it.
+    If refresh_aggregates is True, the new city is added to the aggregate tables in the same transaction.
 
     ## Returns:
     - Tuple representation of the new data. Or None if failed.
     '''
-    most_recent_customer = get_most_recent_customer(customer_id, cursor_arg, conn_arg);
+    if(cache_arg is not None):
+        most_recent_customer = cache_arg.get_or_load(customer_id, cursor_arg, conn_arg);
+    else:
+        most_recent_customer = get_current_customer(customer_id, cursor_arg, conn_arg);
     try:
-        # Retire the old column with the old city. The id would be stored in 0th index of the tuple from the above function.
-        cursor_arg.execute(
-            query=f"""
-            UPDATE dim_customers
-            SET valid_end_date = CURRENT_TIMESTAMP
-            WHERE id = {most_recent_customer[0]}
-            """
-        )
+        # Retire the old column with the old city. The id is the 0th index of the tuple from get_current_customer(),
+        # or the "id" of the cached version.
+        current_id = most_recent_customer["id"] if cache_arg is not None else most_recent_customer[0];
+        prepared.execute(RETIRE_CUSTOMER_SQL, (current_id,), cursor_arg);
         
-        # Insert the new column, as a new entry into the dim_customer table.
-        new_customer_result = add_customer(customer_id, name, email, new_city, conn_arg, cursor_arg);
+        # Insert the new column, as a new entry into the dim_customer table, in the same transaction as the retire.
+        new_customer_result = insert_customer(customer_id, name, email, new_city, cursor_arg, refresh_aggregates);
+        # Nothing was inserted (ON CONFLICT): undo the retire, so the customer keeps its current version.
+        if(new_customer_result is None):
+            conn_arg.rollback();
+            # The version it retired may not have been the current one (a stale cache entry), look it up again next time.
+            if(cache_arg is not None):
+                cache_arg.invalidate(customer_id);
+            print(f"Updating customer city of {customer_id} inserted nothing, the current version was kept!\n");
+            return None;
         conn_arg.commit();
+        if(cache_arg is not None):
+            cache_arg.put(customer_id, {"id": new_customer_result[0], "name": name, "email": email, "city": new_city});
         print(f"Updating Customer city succeeded, new row added with new dates and city!\n");
         return new_customer_result;
     except Exception as e:
         conn_arg.rollback();
+        if(cache_arg is not None):
+            cache_arg.invalidate(customer_id);
         print(f"Updating customer city failed!\n", e);
         return None;
 
-def update_product_price(product_id, name, category, new_price, conn_arg, cursor_arg):
+@instrument.traced
+def update_product_price(product_id, name, category, new_price, conn_arg, cursor_arg, cache_arg=None):
     '''
-    Updates the product price of the dim_products table, using the same method as the update_customer_city() method.
+    Updates the product price of the dim_products table, using the same method as the update_customer_city() method,
+    retire and insert in one transaction.
+    The aggregate tables need no refresh here, the new price only counts for the orders added after it.
 
     ## Returns:
     - Tuple representation of the new data. None if failed.
     '''
-    most_recent_product = get_most_recent_product(product_id, cursor_arg, conn_arg);
+    if(cache_arg is not None):
+        most_recent_product = cache_arg.get_or_load(product_id, cursor_arg, conn_arg);
+    else:
+        most_recent_product = get_current_product(product_id, cursor_arg, conn_arg);
     try:
         # Retire the old product price.
-        cursor_arg.execute(
-            query=f"""
-            UPDATE dim_products
-            SET valid_end_date = CURRENT_TIMESTAMP
-            WHERE id = {most_recent_product[0]}
-            """
-        );
-        new_product_result = add_product(product_id, name, category, new_price, conn_arg, cursor_arg);
+        current_id = most_recent_product["id"] if cache_arg is not None else most_recent_product[0];
+        prepared.execute(RETIRE_PRODUCT_SQL, (current_id,), cursor_arg);
+        new_product_result = insert_product(product_id, name, category, new_price, cursor_arg);
+        if(new_product_result is None):
+            conn_arg.rollback();
+            if(cache_arg is not None):
+                cache_arg.invalidate(product_id);
+            print(f"Updating product price of {product_id} inserted nothing, the current version was kept!\n");
+            return None;
         conn_arg.commit();
+        if(cache_arg is not None):
+            cache_arg.put(product_id, {"id": new_product_result[0], "name": name, "category": category, "price": new_price});
         print(f"Updating product price succeeded, new row added with new dates and price!\n");
         return new_product_result;
 
     except Exception as e:
         conn_arg.rollback();
+        if(cache_arg is not None):
+            cache_arg.invalidate(product_id);
         print(f"Updating product price failed!\n", e);
         return None;
-        
 
-# ======================================================================== [MAIN] ======================================================================= #
-def main():
-    # User input to start on fresh tables when starting the program.
-    want_to_delete = int(input("""Do you want to delete the data for the tables and start on fresh empty tables? (Recommended to run 1 - Yes first)\n
-1 - Yes\n2 - No\nType the corresponding number (only the number, no spaces!):"""));
-    
-    while(want_to_delete != 1 and want_to_delete != 2):
-        print("Invalid input...\n");
-        want_to_delete = int(input("""Do you want to delete the data for the tables and start on fresh empty tables? (Recommended to run 1 - Yes first)\n
-1 - Yes\n2 - No\nType the corresponding number (only the number, no spaces!):"""));
-    
-    # Grab secret values (not shown for security purposes.)
-    DB_ENDPOINT = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT"));
-    DB_PASSWORD = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD"));
+@instrument.traced
+def add_order_by_key(product_id, customer_id, amount, conn_arg, cursor_arg, customer_cache, product_cache,
+                     refresh_aggregates=False):
+    '''
+    Same as add_order(), but takes the BUSINESS keys of the customer and product, and resolves them to the surrogate ids
+    of their current versions through the dimension caches, so no extra round trip is needed when they are cached.
 
-    # Use the PostgresSQL Database name from pgadmin4, not the DB identifier on Amazon RDS.
-    DATABASE_NAME = str("seng550_a2_dbi");
+    ## Returns:
+    - Tuple representation of the newly added data. None if failed, or if the customer or product has no current version.
+    '''
+    customer_surrogate = customer_cache.surrogate_id(customer_id, cursor_arg, conn_arg);
+    product_surrogate = product_cache.surrogate_id(product_id, cursor_arg, conn_arg);
+    if(customer_surrogate is None or product_surrogate is None):
+        print(f"Order insertion failed, customer {customer_id} or product {product_id} has no current version!\n");
+        return None;
+    return add_order(product_surrogate, customer_surrogate, amount, conn_arg, cursor_arg, refresh_aggregates);
+        
 
-    # Use credentials and endpoint to connect to the database server.
-    conn = psql.connect(
-        host=DB_ENDPOINT,
-        user="postgres",
-        password=DB_PASSWORD,
-        database=DATABASE_NAME
-    );
-    cursor = conn.cursor();
-
-    # Bulk deletion of tables to start fresh.
-    if(want_to_delete == 1):
-        print("Using bulk delete...\n");
-        bulk_delete(table_name="dim_customers", conn_arg=conn, cursor_arg=cursor);
-        bulk_delete(table_name="dim_products", conn_arg=conn, cursor_arg=cursor);
-        bulk_delete(table_name="fact_orders", conn_arg=conn, cursor_arg=cursor);
-        print("Bulk delete completed, program finished...");
-        return;
-
-    # SQL Connection to database failed
-    if(conn.closed != 0):
-        print("Connection to database failed, something went wrong...\n");
-        conn.rollback();
-        conn.close();
-        return -1;
-    
-    # SQL Connection to database succeeded
-    else:
-        print(f"Connection to {DATABASE_NAME} was successful!\n");
+# ======================================================================== [MAIN] ======================================================================= #
+# Tables emptied by the delete / truncate mode, the aggregate tables last.
+TRUNCATE_TABLES = ["dim_customers", "dim_products", "fact_orders"] + aggregates.AGGREGATE_TABLES;
 
-    # This portion of the program, only executes if connection to database was successful.
-    # Create a cursor to interact with the database.
-    customer = tuple(); product = tuple(); order = tuple();
+def count_rows(table_names, cursor_arg, conn_arg):
+    '''
+    Returns the number of rows of each table, keyed by table name.
+    A table that does not exist yet (the aggregate tables before the first run) has 0 rows, so a dry run creates nothing.
+    '''
+    counts = {};
+    for table_name in table_names:
+        cursor_arg.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,));
+        if(not cursor_arg.fetchone()[0]):
+            counts[table_name] = 0;
+            continue;
+        cursor_arg.execute(f"SELECT COUNT(*) FROM {table_name}");
+        counts[table_name] = cursor_arg.fetchone()[0];
+    conn_arg.commit();
+    return counts;
+
+
+def run_queries(conn, cursor):
+    '''
+    The 14 operations of the assignment, through the caches and with the aggregate tables kept up to date.
+    '''
+    # Current versions of the dimensions, kept in memory and written through by the helpers below.
+    customer_cache = dim_cache.DimensionCache("dim_customers", max_size=DIM_CACHE_SIZE);
+    product_cache = dim_cache.DimensionCache("dim_products", max_size=DIM_CACHE_SIZE);
+    customer_cache.warm(cursor_arg=cursor, conn_arg=conn);
+    product_cache.warm(cursor_arg=cursor, conn_arg=conn);
 
     # ============================== BEGIN QUERIES ======================================== :
     # 1. Add product P1 (Laptop, Electronics, $1000)
-    add_product(product_id=1, name="Laptop", category="Electronics", price="1000", conn_arg=conn, cursor_arg=cursor);
+    add_product(product_id=1, name="Laptop", category="Electronics", price="1000", conn_arg=conn, cursor_arg=cursor, cache_arg=product_cache);
 
     # 2. Add product P2 (Phone, Electronics, $500)
-    add_product(product_id=2, name="Phone", category="Electronics", price="500", conn_arg=conn, cursor_arg=cursor);
+    add_product(product_id=2, name="Phone", category="Electronics", price="500", conn_arg=conn, cursor_arg=cursor, cache_arg=product_cache);
 
     # 3. Add customer C1 (Alice, New York)
-    add_customer(customer_id=1, name="Alice", email="", city="New York", conn_arg=conn, cursor_arg=cursor);
+    add_customer(customer_id=1, name="Alice", email="", city="New York", conn_arg=conn, cursor_arg=cursor, cache_arg=customer_cache, refresh_aggregates=True);
 
     # 4. Add customer C2 (Bob, Boston)
-    add_customer(customer_id=2, name="Bob", email="", city="Boston", conn_arg=conn, cursor_arg=cursor);
+    add_customer(customer_id=2, name="Bob", email="", city="Boston", conn_arg=conn, cursor_arg=cursor, cache_arg=customer_cache, refresh_aggregates=True);
 
     # 5. Add order O1: C1 buys P1 for $1000
-    add_order(product_id=1, customer_id=1, amount="1000", conn_arg=conn, cursor_arg=cursor);
+    add_order_by_key(product_id=1, customer_id=1, amount="1000", conn_arg=conn, cursor_arg=cursor,
+                     customer_cache=customer_cache, product_cache=product_cache, refresh_aggregates=True);
 
     # 6. Update C1’s city to Chicago
-    update_customer_city(customer_id=1, name=get_most_recent_customer(1, cursor, conn)[2], 
-                         email="", new_city="Chicago", conn_arg=conn, cursor_arg=cursor);
+    update_customer_city(customer_id=1, name=customer_cache.get_or_load(1, cursor, conn)["name"], 
+                         email="", new_city="Chicago", conn_arg=conn, cursor_arg=cursor, cache_arg=customer_cache,
+                         refresh_aggregates=True);
     
     # 7. Update P1’s price to $900
-    update_product_price(product_id=1, name=get_most_recent_product(1, cursor, conn)[2], category=get_most_recent_product(1, cursor, conn)[3], 
-                         new_price="900", conn_arg=conn, cursor_arg=cursor);
+    update_product_price(product_id=1, name=product_cache.get_or_load(1, cursor, conn)["name"], category=product_cache.get_or_load(1, cursor, conn)["category"], 
+                         new_price="900", conn_arg=conn, cursor_arg=cursor, cache_arg=product_cache);
     
     # 8. Add order O2: C1 buys P1 for $850
-    add_order(product_id=1, customer_id=1, amount="850", conn_arg=conn, cursor_arg=cursor);
+    add_order_by_key(product_id=1, customer_id=1, amount="850", conn_arg=conn, cursor_arg=cursor,
+                     customer_cache=customer_cache, product_cache=product_cache, refresh_aggregates=True);
 
     # 9. Update C2’s city to Calgary
-    update_customer_city(customer_id=2, name=get_most_recent_customer(2, cursor, conn)[2], 
-                         email="", new_city="Calgary", conn_arg=conn, cursor_arg=cursor);
+    update_customer_city(customer_id=2, name=customer_cache.get_or_load(2, cursor, conn)["name"], 
+                         email="", new_city="Calgary", conn_arg=conn, cursor_arg=cursor, cache_arg=customer_cache,
+                         refresh_aggregates=True);
     
     # 10. Add order O3: C2 buys P2 for $500
-    add_order(product_id=2, customer_id=2, amount="500", conn_arg=conn, cursor_arg=cursor);
+    add_order_by_key(product_id=2, customer_id=2, amount="500", conn_arg=conn, cursor_arg=cursor,
+                     customer_cache=customer_cache, product_cache=product_cache, refresh_aggregates=True);
 
     # 11. Add order O4: C1 buys P1 for $900
-    add_order(product_id=1, customer_id=1, amount="900", conn_arg=conn, cursor_arg=cursor);
+    add_order_by_key(product_id=1, customer_id=1, amount="900", conn_arg=conn, cursor_arg=cursor,
+                     customer_cache=customer_cache, product_cache=product_cache, refresh_aggregates=True);
 
     # 12. Update C1’s city to San Francisco
-    update_customer_city(customer_id=1, name=get_most_recent_customer(1, cursor, conn)[2], 
-                         email="", new_city="San Francisco", conn_arg=conn, cursor_arg=cursor);
+    update_customer_city(customer_id=1, name=customer_cache.get_or_load(1, cursor, conn)["name"], 
+                         email="", new_city="San Francisco", conn_arg=conn, cursor_arg=cursor, cache_arg=customer_cache,
+                         refresh_aggregates=True);
 
     # 13. Add order O5: C1 buys P2 for $450
-    add_order(product_id=2, customer_id=1, amount="450", conn_arg=conn, cursor_arg=cursor);
+    add_order_by_key(product_id=2, customer_id=1, amount="450", conn_arg=conn, cursor_arg=cursor,
+                     customer_cache=customer_cache, product_cache=product_cache, refresh_aggregates=True);
 
     # 14. Add order O6: C2 buys P1 for $900
-    add_order(product_id=1, customer_id=2, amount="900", conn_arg=conn, cursor_arg=cursor);
+    add_order_by_key(product_id=1, customer_id=2, amount="900", conn_arg=conn, cursor_arg=cursor,
+                     customer_cache=customer_cache, product_cache=product_cache, refresh_aggregates=True);
+
+    print("Dimension caches:", customer_cache.stats(), product_cache.stats());
+
+
+def load_feeds(conn, cursor, customers_csv=None, products_csv=None, orders_csv=None, batch_size=scd_batch.BATCH_SIZE):
+    '''
+    Merges daily CSV feeds with the batch loaders: customers and products through the SCD2 merge (scd_batch.py),
+    then the orders (fact_loader.py), in that order so the orders find their versions.
+    Once the dimensions are merged, both are read once into an asof_index.AsOfIndex, and the orders are resolved to
+    their versions in memory (in the database if an index could not be loaded).
+    The aggregate tables are refreshed in the transaction of every batch.
+    ## Returns:
+    - A dict with the batch counts of every feed, None for a feed that failed.
+    '''
+    results = {};
+    if(customers_csv is not None):
+        results["dim_customers"] = scd_batch.merge_customers(pd.read_csv(customers_csv, chunksize=batch_size), conn, cursor,
+                                                             batch_size=batch_size, refresh_aggregates=True);
+    if(products_csv is not None):
+        results["dim_products"] = scd_batch.merge_products(pd.read_csv(products_csv, chunksize=batch_size), conn, cursor,
+                                                           batch_size=batch_size, refresh_aggregates=True);
+    if(orders_csv is not None):
+        customer_index = asof_index.AsOfIndex("dim_customers"); product_index = asof_index.AsOfIndex("dim_products");
+        if(customer_index.load(cursor, conn) < 0 or product_index.load(cursor, conn) < 0):
+            customer_index = None; product_index = None;
+        results["fact_orders"] = fact_loader.load_orders(pd.read_csv(orders_csv, chunksize=batch_size), conn, cursor,
+                                                         batch_size=batch_size, refresh_aggregates=True,
+                                                         customer_index=customer_index, product_index=product_index);
+    return results;
+
+
+def run(endpoint, database, password, mode="demo", batch_size=scd_batch.BATCH_SIZE, dry_run=False,
+        customers_csv=None, products_csv=None, orders_csv=None):
+    '''
+    Runs part2 without any prompt, so it can be scheduled, or called from other Python code.
+
+    ## Args:
+    - endpoint, database, password: Where to connect, as the postgres user.
+    - mode: "truncate" empties the tables, "demo" runs the 14 operations of the assignment,
+      "load" merges the given CSV feeds (load_feeds).
+    - batch_size: Rows per transaction of the feeds.
+    - dry_run: Only count the rows that would be deleted / read, nothing is written.
+
+    ## Returns:
+    - A dict with the mode, the rows deleted or added, the elapsed seconds and the rows/sec, see cli.make_result().
+      The pool is left open, the caller closes it (db.close_all()).
+    '''
+    start_time = time.perf_counter();
+    manager = db.get_manager(host=endpoint, user="postgres", password=password, database=database);
+    with manager.connection() as conn:
+        # SQL Connection to database failed
+        if(conn.closed != 0):
+            return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error="Connection to database failed");
+        cursor = conn.cursor();
+        before = count_rows(TRUNCATE_TABLES, cursor, conn);
+
+        # Bulk deletion of tables to start fresh.
+        if(mode == "truncate"):
+            if(not dry_run):
+                aggregates.ensure_aggregate_tables(conn_arg=conn, cursor_arg=cursor);
+                for table_name in TRUNCATE_TABLES:
+                    bulk_delete(table_name=table_name, conn_arg=conn, cursor_arg=cursor);
+            cursor.close();
+            return cli.make_result(mode, sum(before.values()), time.perf_counter() - start_time, dry_run, tables=before);
+
+        if(dry_run):
+            feeds = {"dim_customers": customers_csv, "dim_products": products_csv, "fact_orders": orders_csv};
+            planned = {table_name: sum(len(chunk) for chunk in pd.read_csv(path, chunksize=batch_size))
+                       for table_name, path in feeds.items() if path is not None} if mode == "load" else {};
+            cursor.close();
+            return cli.make_result(mode, sum(planned.values()), time.perf_counter() - start_time, dry_run,
+                                   tables=planned, existing_rows=before);
+
+        # Aggregate tables of the precomputed reports, created after the dry run check since it is DDL.
+        aggregates.ensure_aggregate_tables(conn_arg=conn, cursor_arg=cursor);
+        # Partial indexes for the current version lookups.
+        ensure_current_version_indexes(conn_arg=conn, cursor_arg=cursor);
+        # Partitions of this month and the next ones, nothing to do if fact_orders is not partitioned.
+        partitions.ensure_upcoming_partitions(conn_arg=conn, cursor_arg=cursor);
+        details = {};
+        if(mode == "load"):
+            fact_loader.ensure_asof_indexes(conn_arg=conn, cursor_arg=cursor);
+            feeds = load_feeds(conn, cursor, customers_csv, products_csv, orders_csv, batch_size);
+            details["failed_feeds"] = [table_name for table_name, batches in feeds.items() if batches is None];
+        else:
+            # Precomputed Part3 reports, rebuilt once for the rows already in the tables, and refreshed by the helpers.
+            aggregates.rebuild_aggregates(conn_arg=conn, cursor_arg=cursor);
+            run_queries(conn, cursor);
+            print("Cities per customer:", aggregates.customer_city_counts(cursor, conn));
+            print("Total sold per city:", aggregates.city_sales(cursor, conn));
+            print("Discounts per product:", aggregates.product_discounts(cursor, conn));
+
+        after = count_rows(TRUNCATE_TABLES, cursor, conn);
+        cursor.close();
+    added = {table_name: after[table_name] - before[table_name] for table_name in TRUNCATE_TABLES[:3]};
+    return cli.make_result(mode, sum(added.values()), time.perf_counter() - start_time, dry_run, tables=added, **details);
+
+
+def main():
+    # User input to start on fresh tables when starting the program.
+    want_to_delete = int(input("""Do you want to delete the data for the tables and start on fresh empty tables? (Recommended to run 1 - Yes first)\n
+1 - Yes\n2 - No\nType the corresponding number (only the number, no spaces!):"""));
+    
+    while(want_to_delete != 1 and want_to_delete != 2):
+        print("Invalid input...\n");
+        want_to_delete = int(input("""Do you want to delete the data for the tables and start on fresh empty tables? (Recommended to run 1 - Yes first)\n
+1 - Yes\n2 - No\nType the corresponding number (only the number, no spaces!):"""));
+    
+    # Grab secret values (not shown for security purposes.)
+    DB_ENDPOINT = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT"));
+    DB_PASSWORD = str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD"));
+
+    # Use the PostgresSQL Database name from pgadmin4, not the DB identifier on Amazon RDS.
+    DATABASE_NAME = str("seng550_a2_dbi");
+
+    result = run(DB_ENDPOINT, DATABASE_NAME, DB_PASSWORD, mode="truncate" if want_to_delete == 1 else "demo");
+    cli.print_result(result);
+    # DB_INSTRUMENT=1 in the .env file.
+    if(instrument.ENABLED):
+        print(instrument.METRICS.summary());
+    db.close_all();
 
-    conn.close();
+
+def cli_main(argv=None):
+    '''
+    Non-interactive entry point, for example:
+    py "./A2/scripts/part2.py" --mode load --customers ./feeds/customers.csv --orders ./feeds/orders.csv --json
+    '''
+    parser = cli.base_parser("Type 2 SCD operations of A2.", modes=["truncate", "demo", "load"], default_mode="demo");
+    parser.add_argument("--customers", default=None, help="CSV feed of customer_id, name, email, city (load mode).");
+    parser.add_argument("--products", default=None, help="CSV feed of product_id, name, category, price (load mode).");
+    parser.add_argument("--orders", default=None, help="CSV feed of customer_id, product_id, amount, order_date (load mode).");
+    args = parser.parse_args(argv);
+
+    with cli.instrumentation(args):
+        result = run(args.endpoint or cli.env_value("DB_ENDPOINT"), args.database or "seng550_a2_dbi", cli.env_value("DB_PASSWORD"),
+                     mode=args.mode, batch_size=args.batch_size or scd_batch.BATCH_SIZE, dry_run=args.dry_run,
+                     customers_csv=args.customers, products_csv=args.products, orders_csv=args.orders);
+    cli.print_result(result, as_json=args.json);
+    db.close_all();
+    return result;
 
 if __name__ == "__main__":
-    main();
\ No newline at end of file
+    # Without arguments the script asks its questions, with arguments it runs from the command line.
+    if(len(sys.argv) > 1):
+        cli_main();
+    else:
+        main();
@@ -0,0 +1,325 @@
+import os; import re; import sys; import time;
+import pandas as pd;
+# The shared modules live in ./common, next to the A2 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."));
+from common import db; # Pooled connections shared with part2.py and etl.py.
+from common import cli; # Shared flags and results of the non-interactive entry points.
+from common import instrument; # Per-operation timing of the database round trips (@instrument.traced).
+import aggregates; # CUSTOMER_AT_ORDER / PRODUCT_AT_ORDER, the versions valid at the order_date.
+
+# fact_orders range partitioned by order_date (./A2/SQL/partition-fact-orders.sql): one partition per month in UTC,
+# named fact_orders_YYYY_MM, and fact_orders_default for the orders outside of every month created.
+# On the plain fact_orders of create-2d-tables.sql nothing is created and the loads go to fact_orders as before.
+
+FACT_TABLE = "fact_orders";
+DEFAULT_PARTITION = "fact_orders_default";
+PARTITION_NAME = re.compile(r"^fact_orders_(\d{4})_(\d{2})$");
+
+# Months created after the current one by ensure_upcoming_partitions().
+MONTHS_AHEAD = 3;
+
+# Schema the detached partitions are moved to.
+ARCHIVE_SCHEMA = "fact_archive";
+
+# ======================================================================== [MONTHS] ======================================================================= #
+def as_utc(moment):
+    '''
+    Timestamp in UTC, naive timestamps are taken as UTC.
+    '''
+    moment = pd.Timestamp(moment);
+    return moment.tz_localize("UTC") if moment.tzinfo is None else moment.tz_convert("UTC");
+
+
+def month_start(moment):
+    '''
+    First instant of the month of a timestamp, in UTC.
+    '''
+    return as_utc(moment).normalize().replace(day=1);
+
+
+def partition_name(month):
+    return f"{FACT_TABLE}_{month:%Y_%m}";
+
+
+def partition_month(name):
+    '''
+    Month of a fact_orders_YYYY_MM partition, None for any other table (the default partition).
+    '''
+    match = PARTITION_NAME.match(name);
+    return None if match is None else pd.Timestamp(year=int(match.group(1)), month=int(match.group(2)), day=1, tz="UTC");
+
+
+def month_bound(month):
+    # Bounds are sent as text with an explicit offset, so they do not depend on the time zone of the session.
+    return f"{month:%Y-%m-%d} 00:00:00+00";
+
+# ======================================================================== [PARTITIONS] ======================================================================= #
+def existing_partitions(cursor_arg):
+    '''
+    Returns the set of names of the partitions of fact_orders, None if fact_orders is not partitioned.
+    '''
+    cursor_arg.execute(
+        query="""
+        SELECT c.relname
+        FROM pg_partitioned_table AS pt
+        LEFT JOIN pg_inherits AS i ON i.inhparent = pt.partrelid
+        LEFT JOIN pg_class AS c ON c.oid = i.inhrelid
+        WHERE pt.partrelid = to_regclass(%s)
+        """,
+        vars=(FACT_TABLE,)
+    );
+    rows = cursor_arg.fetchall();
+    if(len(rows) == 0):
+        return None;
+    return {row[0] for row in rows if row[0] is not None};
+
+
+def create_partition(month, partitions, cursor_arg):
+    '''
+    Creates the partition of one month, without committing.
+    Postgres refuses to create a partition for rows that are already in the default partition, so when the default
+    partition has orders of that month, the partition is filled with them as a plain table first and attached afterwards.
+    '''
+    name = partition_name(month);
+    bounds = {"start": month_bound(month), "end": month_bound(month + pd.DateOffset(months=1))};
+    if(DEFAULT_PARTITION in partitions):
+        cursor_arg.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE order_date >= %(start)s AND order_date < %(end)s)", bounds);
+        if(cursor_arg.fetchone()[0]):
+            cursor_arg.execute(f"CREATE TABLE {name} (LIKE {FACT_TABLE} INCLUDING DEFAULTS)");
+            cursor_arg.execute(
+                query=f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE order_date >= %(start)s AND order_date < %(end)s
+                    RETURNING order_id, product_id, customer_id, order_date, amount
+                )
+                INSERT INTO {name} (order_id, product_id, customer_id, order_date, amount)
+                SELECT order_id, product_id, customer_id, order_date, amount
+                FROM moved
+                """,
+                vars=bounds
+            );
+            cursor_arg.execute(f"ALTER TABLE {FACT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%(start)s) TO (%(end)s)", bounds);
+            return;
+    # Without IF NOT EXISTS: a detached month left in place must not be mistaken for a partition.
+    cursor_arg.execute(f"CREATE TABLE {name} PARTITION OF {FACT_TABLE} FOR VALUES FROM (%(start)s) TO (%(end)s)", bounds);
+
+
+def create_missing_partitions(first, last, cursor_arg):
+    '''
+    Creates the partitions missing from the month of `first` to the month of `last`, without committing.
+    ## Returns:
+    - Tuple of the partitions that existed before (None if fact_orders is not partitioned) and the list of names created.
+    '''
+    partitions = existing_partitions(cursor_arg);
+    created = [];
+    if(partitions is None):
+        return None, created;
+    for month in pd.date_range(month_start(first), month_start(last), freq="MS"):
+        if(partition_name(month) not in partitions):
+            create_partition(month, partitions, cursor_arg);
+            created.append(partition_name(month));
+    if(len(created) > 0):
+        print(f"Created the fact_orders partitions {', '.join(created)}");
+    return partitions, created;
+
+
+@instrument.traced
+def ensure_partitions(first, last, conn_arg, cursor_arg):
+    '''
+    Creates the missing monthly partitions of fact_orders from the month of `first` to the month of `last`, in one transaction.
+
+    ## Returns:
+    - List with the names of the partitions created, empty if they all existed or fact_orders is not partitioned. None if it failed.
+    '''
+    try:
+        _, created = create_missing_partitions(first, last, cursor_arg);
+        conn_arg.commit();
+        return created;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Creating the fact_orders partitions failed!\n", e);
+        return None;
+
+
+def ensure_upcoming_partitions(conn_arg, cursor_arg, months_ahead=MONTHS_AHEAD):
+    '''
+    Creates the partitions of the current month and of the `months_ahead` months after it, so the orders placed
+    by add_order() never land in the default partition. Run it when a script starts, or from a daily job.
+    '''
+    now = pd.Timestamp.now(tz="UTC");
+    return ensure_partitions(now, now + pd.DateOffset(months=months_ahead), conn_arg, cursor_arg);
+
+
+def batch_target(order_dates, conn_arg, cursor_arg):
+    '''
+    Picks the table a batch of orders is inserted into, after creating the partitions of its months (in their own
+    transaction), so none of its orders land in the default partition.
+    A batch whose orders are all in one month goes straight to the partition of that month, and Postgres does not
+    route its rows one by one. Any other batch, or a plain fact_orders, gets fact_orders.
+
+    ## Returns:
+    - The table name, None if the partitions could not be created.
+    '''
+    dates = order_dates.dropna();
+    if(len(dates) < len(order_dates)):
+        # Orders without an order_date are placed now by the loader.
+        dates = pd.concat([dates, pd.Series([pd.Timestamp.now(tz="UTC")])], ignore_index=True);
+    if(len(dates) == 0):
+        return FACT_TABLE;
+    first = month_start(dates.min()); last = month_start(dates.max());
+    try:
+        partitions, _ = create_missing_partitions(first, last, cursor_arg);
+        conn_arg.commit();
+    except Exception as e:
+        conn_arg.rollback();
+        print("Creating the fact_orders partitions of the batch failed!\n", e);
+        return None;
+    # The month of CURRENT_TIMESTAMP could change before the insert, orders without a date always go through fact_orders.
+    if(partitions is not None and first == last and len(dates) == len(order_dates)):
+        return partition_name(first);
+    return FACT_TABLE;
+
+
+@instrument.traced
+def detach_partitions(before, conn_arg, cursor_arg, archive_schema=ARCHIVE_SCHEMA, concurrently=False):
+    '''
+    Detaches the monthly partitions of the months before the month of `before` and moves them to `archive_schema`
+    (or leaves them where they are if None). No row is copied or deleted, the archived months stay plain tables that
+    can be dumped, queried or dropped. With concurrently=True (Postgres 14+) every partition is detached in its own
+    transaction, without blocking the loaders.
+    The precomputed reports still count the detached orders, run aggregates.rebuild_aggregates() to leave them out.
+
+    ## Returns:
+    - List with the names of the detached partitions, None if it failed (the partitions detached before the failure stay detached).
+    '''
+    cutoff = month_start(before);
+    detached = [];
+    autocommit = conn_arg.autocommit;
+    try:
+        partitions = existing_partitions(cursor_arg) or set();
+        old_partitions = sorted(name for name in partitions if partition_month(name) is not None and partition_month(name) < cutoff);
+        conn_arg.commit();
+        # DETACH ... CONCURRENTLY cannot run inside a transaction block.
+        conn_arg.autocommit = concurrently;
+        if(archive_schema is not None and len(old_partitions) > 0):
+            cursor_arg.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}");
+        for name in old_partitions:
+            cursor_arg.execute(f"ALTER TABLE {FACT_TABLE} DETACH PARTITION {name}{' CONCURRENTLY' if concurrently else ''}");
+            if(archive_schema is not None):
+                cursor_arg.execute(f"ALTER TABLE {name} SET SCHEMA {archive_schema}");
+            detached.append(name);
+        if(not concurrently):
+            conn_arg.commit();
+    except Exception as e:
+        conn_arg.rollback();
+        print(f"Detaching the fact_orders partitions failed after {detached}!\n", e);
+        return None;
+    finally:
+        conn_arg.autocommit = autocommit;
+    print(f"Detached {len(detached)} fact_orders partitions" + (f" to {archive_schema}" if archive_schema is not None else ""));
+    return detached;
+
+# ======================================================================== [REPORTS] ======================================================================= #
+# Reports 2 and 3 of Part3.sql for the orders placed in [start, end). The bounds reach the planner as constants,
+# so only the partitions of those months are scanned.
+CITY_SALES_BETWEEN_SQL = f"""
+    SELECT dc.customer_id, dc.name, dc.city, SUM(fo.amount) AS total_amount
+    FROM fact_orders AS fo
+    INNER JOIN dim_customers AS dc ON {aggregates.CUSTOMER_AT_ORDER}
+    WHERE fo.order_date >= %(start)s AND fo.order_date < %(end)s
+    GROUP BY dc.customer_id, dc.name, dc.city
+""";
+
+PRODUCT_DISCOUNTS_BETWEEN_SQL = f"""
+    SELECT dp.product_id, dp.name, SUM(dp.price - fo.amount) AS sum_of_discounts
+    FROM fact_orders AS fo
+    INNER JOIN dim_products AS dp ON {aggregates.PRODUCT_AT_ORDER}
+    WHERE fo.order_date >= %(start)s AND fo.order_date < %(end)s
+    GROUP BY dp.product_id, dp.name
+""";
+
+def read_report_between(query, start, end, cursor_arg, conn_arg):
+    '''
+    Runs one of the bounded report queries for [start, end), returns its rows. None if it failed.
+    '''
+    try:
+        cursor_arg.execute(query, {"start": as_utc(start).to_pydatetime(), "end": as_utc(end).to_pydatetime()});
+        rows = cursor_arg.fetchall();
+        conn_arg.commit();
+        return rows;
+    except Exception as e:
+        conn_arg.rollback();
+        print("Reading the bounded report failed!\n", e);
+        return None;
+
+
+def city_sales_between(start, end, cursor_arg, conn_arg):
+    '''
+    Report 2: total sold amount per customer and the city they lived in, for the orders placed in [start, end).
+    '''
+    return read_report_between(CITY_SALES_BETWEEN_SQL, start, end, cursor_arg, conn_arg);
+
+
+def product_discounts_between(start, end, cursor_arg, conn_arg):
+    '''
+    Report 3: sum of (price - amount) per product, for the orders placed in [start, end).
+    '''
+    return read_report_between(PRODUCT_DISCOUNTS_BETWEEN_SQL, start, end, cursor_arg, conn_arg);
+
+# ======================================================================== [MAIN] ======================================================================= #
+def run(endpoint, database, password, mode="ensure", months_ahead=MONTHS_AHEAD, before=None,
+        archive_schema=ARCHIVE_SCHEMA, concurrently=False, dry_run=False):
+    '''
+    Partition maintenance without any prompt, for a daily job.
+    "ensure" creates the partitions of the upcoming months, "detach" archives the months before `before` (YYYY-MM).
+    With dry_run, only lists the partitions.
+    '''
+    start_time = time.perf_counter();
+    manager = db.get_manager(host=endpoint, user="postgres", password=password, database=database);
+    with manager.connection() as conn:
+        # SQL Connection to database failed
+        if(conn.closed != 0):
+            return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error="Connection to database failed");
+        cursor = conn.cursor();
+        if(dry_run):
+            partitions = existing_partitions(cursor);
+            conn.commit();
+            cursor.close();
+            return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run,
+                                   partitioned=partitions is not None, partitions=sorted(partitions or []));
+        if(mode == "detach"):
+            tables = detach_partitions(before, conn, cursor, archive_schema=archive_schema, concurrently=concurrently);
+        else:
+            tables = ensure_upcoming_partitions(conn, cursor, months_ahead=months_ahead);
+        cursor.close();
+    if(tables is None):
+        return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, error=f"Partition {mode} failed");
+    return cli.make_result(mode, 0, time.perf_counter() - start_time, dry_run, partitions=tables);
+
+
+def cli_main(argv=None):
+    '''
+    For example, from a daily job:
+    py "./A2/scripts/partitions.py" --mode ensure --months-ahead 3
+    py "./A2/scripts/partitions.py" --mode detach --before 2025-01 --concurrently
+    '''
+    parser = cli.base_parser("Monthly partitions of fact_orders.", modes=["ensure", "detach"], default_mode="ensure");
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD, help="Months created after the current one (ensure mode).");
+    parser.add_argument("--before", default=None, help="YYYY-MM, the months before it are detached (detach mode).");
+    parser.add_argument("--archive-schema", default=ARCHIVE_SCHEMA, help="Schema the detached partitions are moved to, '' to leave them in place.");
+    parser.add_argument("--concurrently", action="store_true", help="DETACH PARTITION ... CONCURRENTLY (Postgres 14+).");
+    args = parser.parse_args(argv);
+    if(args.mode == "detach" and args.before is None):
+        parser.error("--mode detach needs --before YYYY-MM");
+
+    with cli.instrumentation(args):
+        result = run(args.endpoint or cli.env_value("DB_ENDPOINT"), args.database or "seng550_a2_dbi", cli.env_value("DB_PASSWORD"),
+                     mode=args.mode, months_ahead=args.months_ahead, before=None if args.before is None else f"{args.before}-01",
+                     archive_schema=args.archive_schema or None, concurrently=args.concurrently, dry_run=args.dry_run);
+    cli.print_result(result, as_json=args.json);
+    db.close_all();
+    return result;
+
+if __name__ == "__main__":
+    cli_main();
@@ -0,0 +1,141 @@
+import numpy as np;
+import pandas as pd;
+import fact_loader; # ensure_asof_indexes(), the (business key, valid_start_date) indexes of the order loads.
+
+# Columns of the orders_summary documents, in order.
+SUMMARY_COLUMNS = ["order_id", "order_date", "customer_id", "customer_name", "customer_city",
+                   "product_id", "product_name", "product_price", "amount"];
+
+# The orders summary as ONE query: every order joined with the customer and product versions valid at its order_date.
+# fact_orders stores the surrogate ids of those versions (resolved when the order is written, with the half-open
+# [valid_start_date, valid_end_date) rule), so each join is an equi-join on the primary key of the dimension:
+# no date comparison, and an order placed exactly when a version ends matches only the version it was written with.
+ORDERS_SUMMARY_SQL = """
+    SELECT fo.order_id, fo.order_date, dc.customer_id, dc.name AS customer_name, dc.city AS customer_city,
+    dp.product_id, dp.name AS product_name, dp.price AS product_price, fo.amount
+    FROM fact_orders AS fo
+    INNER JOIN dim_customers AS dc
+        ON dc.id = fo.customer_id
+    INNER JOIN dim_products AS dp
+        ON dp.id = fo.product_id
+""";
+
+# The orders summary of the orders placed in [%(start)s, %(end)s). On a partitioned fact_orders the bounds reach the
+# planner as constants, so only the partitions of those months are scanned.
+ORDERS_SUMMARY_BETWEEN_SQL = ORDERS_SUMMARY_SQL + """
+    WHERE fo.order_date >= %(start)s AND fo.order_date < %(end)s
+""";
+
+# The chain of query 4 of ./A2/SQL/Part3.sql (without the customer filter), kept as the baseline of the benchmark.
+# It materializes fact_orders twice in temporary tables and runs two SELECT * that are thrown away.
+TEMP_TABLE_CHAIN_SQL = """
+    DROP TABLE IF EXISTS customer_orders CASCADE;
+    CREATE TEMPORARY TABLE IF NOT EXISTS customer_orders AS
+    SELECT dc.customer_id, dc.name, dc.city, fo.order_id, fo.order_date, fo.amount
+    FROM dim_customers AS dc
+    INNER JOIN fact_orders AS fo
+        ON fo.customer_id = dc.id;
+    ALTER TABLE customer_orders
+    RENAME COLUMN name TO customer_name;
+    SELECT *
+    FROM customer_orders;
+
+    DROP TABLE IF EXISTS product_orders CASCADE;
+    CREATE TEMPORARY TABLE IF NOT EXISTS product_orders AS
+    SELECT dp.product_id, dp.name, dp.price, fo.order_id, fo.order_date, fo.amount
+    FROM dim_products AS dp
+    INNER JOIN fact_orders AS fo
+        ON dp.id = fo.product_id;
+    ALTER TABLE product_orders
+    RENAME COLUMN name TO product_name;
+    SELECT *
+    FROM product_orders;
+
+    SELECT order_id, order_date, customer_id, customer_name, city AS customer_city,
+    product_id, product_name, price AS product_price, amount
+    FROM customer_orders AS co
+    NATURAL JOIN product_orders
+""";
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def ensure_pit_indexes(conn_arg, cursor_arg):
+    '''
+    Creates the (business key, valid_start_date) indexes of both dimensions, which resolve the orders to their versions
+    when they are loaded (fact_loader.py). ORDERS_SUMMARY_SQL itself joins on the primary keys.
+    ## Returns:
+    - An integer flag, 1 if operation was successful, -1 if operation failed.
+    '''
+    return fact_loader.ensure_asof_indexes(conn_arg, cursor_arg);
+
+
+def read_frame(query, pg_conn, params=None, parse_dates=()):
+    '''
+    Runs a query on a psycopg2 connection and returns its rows as a DataFrame, like pd.read_sql_query()
+    (NUMERIC values become floats, the `parse_dates` columns UTC timestamps), and commits, so the pooled connection
+    does not stay idle in the read transaction. pd.read_sql_query() warns on a psycopg2 connection and leaves it open.
+    '''
+    with pg_conn.cursor() as cursor:
+        cursor.execute(query, params);
+        columns = [column[0] for column in cursor.description];
+        rows = cursor.fetchall();
+    pg_conn.commit();
+    frame_df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True);
+    for column in parse_dates:
+        frame_df[column] = pd.to_datetime(frame_df[column], utc=True);
+    return frame_df;
+
+
+def read_orders_summary(pg_conn):
+    '''
+    SQL variant: runs ORDERS_SUMMARY_SQL and returns the orders summary as a DataFrame.
+    '''
+    return read_frame(ORDERS_SUMMARY_SQL, pg_conn, parse_dates=["order_date"]);
+
+
+def read_orders_summary_between(pg_conn, start, end):
+    '''
+    Runs ORDERS_SUMMARY_BETWEEN_SQL, the orders summary of the orders placed in [start, end), as a DataFrame.
+    '''
+    return read_frame(ORDERS_SUMMARY_BETWEEN_SQL, pg_conn, params={"start": start, "end": end}, parse_dates=["order_date"]);
+
+
+def read_pit_frames(pg_conn):
+    '''
+    Reads fact_orders, dim_customers and dim_products into DataFrames, for pit_join_frames().
+    '''
+    orders_df = read_frame("SELECT order_id, order_date, customer_id, product_id, amount FROM fact_orders", pg_conn,
+                           parse_dates=["order_date"]);
+    customers_df = read_frame("SELECT id, customer_id, name, city FROM dim_customers", pg_conn);
+    products_df = read_frame("SELECT id, product_id, name, price FROM dim_products", pg_conn);
+    return orders_df, customers_df, products_df;
+
+
+def attach_versions(orders_df, dim_df, surrogate_col, columns):
+    '''
+    Attaches to every order the version of `dim_df` its `surrogate_col` points to (dim_df.id), with one hash join.
+    Orders whose version does not exist are dropped, like the INNER JOIN of ORDERS_SUMMARY_SQL.
+    '''
+    versions = dim_df.rename(columns=columns)[["id"] + list(columns.values())];
+    versions = versions.rename(columns={"id": surrogate_col}).astype({surrogate_col: np.int64});
+    return orders_df.merge(versions, on=surrogate_col, how="inner", validate="many_to_one");
+
+
+def pit_join_frames(orders_df, customers_df, products_df):
+    '''
+    In-memory variant, for when the tables are already loaded (see read_pit_frames()):
+    builds the orders summary with two vectorized joins on the surrogate ids instead of a query, same rows as ORDERS_SUMMARY_SQL.
+
+    ## Returns:
+    - DataFrame with SUMMARY_COLUMNS, sorted by order_id.
+    '''
+    orders = orders_df[["order_id", "order_date", "customer_id", "product_id", "amount"]].rename(
+        columns={"customer_id": "customer_version", "product_id": "product_version"});
+    orders["order_date"] = pd.to_datetime(orders["order_date"], utc=True);
+    orders = orders.astype({"customer_version": np.int64, "product_version": np.int64});
+
+    # customer_id / product_id of the summary are the business keys of the versions, as in the SQL variant.
+    joined = attach_versions(orders, customers_df, "customer_version",
+                             {"customer_id": "customer_id", "name": "customer_name", "city": "customer_city"});
+    joined = attach_versions(joined, products_df, "product_version",
+                             {"product_id": "product_id", "name": "product_name", "price": "product_price"});
+    return joined[SUMMARY_COLUMNS].sort_values("order_id", kind="stable").reset_index(drop=True);
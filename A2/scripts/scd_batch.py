@@ -0,0 +1,185 @@
+import os; import sys;
+import pandas as pd;
+# The shared modules live in ./common, next to the A2 directory.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."));
+from common import copy_binary; # Stages the batch with binary COPY.
+from common import instrument; # Per-operation timing of the database round trips (@instrument.traced).
+import aggregates; # Precomputed Part3 reports.
+
+# Business key and tracked attributes of each Type 2 SCD table, from ./A2/SQL/create-2d-tables.sql.
+DIMENSIONS = {
+    "dim_customers": {
+        "key": "customer_id",
+        "attributes": ["name", "email", "city"],
+        "types": {"customer_id": "INT", "name": "TEXT", "email": "TEXT", "city": "TEXT"},
+    },
+    "dim_products": {
+        "key": "product_id",
+        "attributes": ["name", "category", "price"],
+        "types": {"product_id": "INT", "name": "TEXT", "category": "TEXT", "price": "NUMERIC"},
+    },
+};
+
+# Changed rows merged per transaction.
+BATCH_SIZE = 50000;
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def iter_batches(rows, columns, batch_size=BATCH_SIZE):
+    '''
+    Splits the changed rows into DataFrames of at most `batch_size` rows, with only the given columns.
+    `rows` can be a DataFrame, or an iterator of DataFrames, dicts or tuples (in the order of `columns`).
+    '''
+    if(isinstance(rows, pd.DataFrame)):
+        rows = [rows];
+
+    pending = [];
+    for item in rows:
+        if(isinstance(item, pd.DataFrame)):
+            for start in range(0, len(item), batch_size):
+                yield item.iloc[start:start + batch_size][columns];
+            continue;
+
+        # Single rows are collected until there are enough for a batch.
+        pending.append(item if isinstance(item, dict) else dict(zip(columns, item)));
+        if(len(pending) == batch_size):
+            yield pd.DataFrame(pending, columns=columns);
+            pending = [];
+
+    if(len(pending) > 0):
+        yield pd.DataFrame(pending, columns=columns);
+
+
+@instrument.traced
+def merge_batch(table_name, batch_df, conn_arg, cursor_arg, refresh_aggregates=False):
+    '''
+    Applies one batch of changed dimension rows to a Type 2 SCD table, with a few set-based statements in ONE transaction:
+    the batch is staged in a temporary table, compared with the current version of every business key,
+    the versions that changed are retired (valid_end_date is filled), and the new versions are inserted.
+    If refresh_aggregates is True, the new cities of dim_customers are added to the aggregate tables in the same transaction.
+    New dim_products versions change no aggregate until an order points to them, and that order refreshes them itself.
+
+    ## Returns:
+    - A dict with the counts of the batch:
+        - `inserted`: new versions written, for keys that were not in the table yet and for keys whose current version was retired.
+        - `retired`: current versions that were retired because their attributes changed.
+        - `unchanged`: keys whose current version already has the same attributes, nothing is written for them.
+    A change back to the attributes of an OLD version (a revert) is a change like any other, it gets a new version.
+    '''
+    spec = DIMENSIONS[table_name];
+    key = spec["key"]; attributes = spec["attributes"];
+    columns = [key] + attributes;
+    cols = ", ".join(columns);
+    stage_cols = ", ".join(f"{col} {spec['types'][col]}" for col in columns);
+    new_attrs = ", ".join(f"s.{col}" for col in attributes);
+    cur_attrs = ", ".join(f"cur.{col}" for col in attributes);
+
+    # 1. Stage the batch (already encoded with the column types, see ./common/copy_binary.py),
+    # and keep only the last row of each business key.
+    cursor_arg.execute("DROP TABLE IF EXISTS scd_stage, scd_changes");
+    cursor_arg.execute(f"CREATE TEMPORARY TABLE scd_stage ({stage_cols}, stage_row SERIAL) ON COMMIT DROP");
+    copy_binary.copy_dataframe(batch_df, "scd_stage", spec["types"], cursor_arg);
+    cursor_arg.execute(f"""
+        DELETE FROM scd_stage AS s
+        USING scd_stage AS later
+        WHERE later.{key} = s.{key} AND later.stage_row > s.stage_row
+        """);
+
+    # 2. Compare every staged row with the current version of its business key.
+    cursor_arg.execute(f"""
+        CREATE TEMPORARY TABLE scd_changes ON COMMIT DROP AS
+        SELECT s.{key}, {new_attrs}, cur.id AS current_id,
+            CASE
+                WHEN cur.id IS NOT NULL AND ROW({cur_attrs}) IS NOT DISTINCT FROM ROW({new_attrs}) THEN 'unchanged'
+                WHEN cur.id IS NULL THEN 'new'
+                ELSE 'changed'
+            END AS action
+        FROM scd_stage AS s
+        LEFT JOIN LATERAL (
+            SELECT d.id, {", ".join(f"d.{col}" for col in attributes)}
+            FROM {table_name} AS d
+            WHERE d.{key} = s.{key} AND d.valid_end_date IS NULL
+            ORDER BY d.id DESC
+            LIMIT 1
+        ) AS cur ON TRUE
+        """);
+
+    # 3. Retire the current versions that changed.
+    cursor_arg.execute(f"""
+        UPDATE {table_name} AS d
+        SET valid_end_date = CURRENT_TIMESTAMP
+        FROM scd_changes AS c
+        WHERE d.id = c.current_id AND c.action = 'changed'
+        """);
+    retired = cursor_arg.rowcount;
+
+    # 4. Insert the new versions, valid from the same timestamp the old ones were retired at.
+    cursor_arg.execute(f"""
+        INSERT INTO {table_name} ({cols}, valid_start_date)
+        SELECT {cols}, CURRENT_TIMESTAMP
+        FROM scd_changes
+        WHERE action IN ('new', 'changed')
+        ORDER BY {key}
+        """);
+    inserted = cursor_arg.rowcount;
+    # Unchanged rows are versions that are already current, adding them again is a no-op.
+    if(refresh_aggregates and table_name == "dim_customers"):
+        aggregates.apply_staged_customers("scd_changes", cursor_arg);
+
+    cursor_arg.execute("SELECT action, COUNT(*) FROM scd_changes GROUP BY action");
+    action_counts = dict(cursor_arg.fetchall());
+
+    conn_arg.commit();
+    return {
+        "rows": len(batch_df),
+        "inserted": inserted,
+        "retired": retired,
+        "unchanged": action_counts.get("unchanged", 0),
+    };
+
+
+def scd2_merge(table_name, rows, conn_arg, cursor_arg, batch_size=BATCH_SIZE, refresh_aggregates=False):
+    '''
+    Batch version of update_customer_city() / update_product_price() in part2.py, for daily dimension feeds.
+    Instead of a SELECT, an UPDATE and an INSERT with their own commits for every entity, each batch of
+    changed rows costs a few set-based statements and one commit (see merge_batch).
+
+    ## Args:
+    - table_name: "dim_customers" or "dim_products".
+    - rows: DataFrame, or iterator of DataFrames / dicts / tuples, with the business key and all the tracked attributes.
+    - conn_arg, cursor_arg: psycopg2 connection and cursor.
+    - batch_size: Rows per transaction.
+    - refresh_aggregates: Keep the aggregate tables of aggregates.py up to date (see merge_batch).
+
+    ## Returns:
+    - List with the counts of every batch (see merge_batch). None if a batch failed, that batch is rolled back
+      but the batches before it stay committed.
+    '''
+    spec = DIMENSIONS[table_name];
+    columns = [spec["key"]] + spec["attributes"];
+    batch_results = [];
+    for batch_number, batch_df in enumerate(iter_batches(rows, columns, batch_size), start=1):
+        try:
+            counts = merge_batch(table_name, batch_df, conn_arg, cursor_arg, refresh_aggregates);
+            counts["batch"] = batch_number;
+            batch_results.append(counts);
+            print(f"SCD2 batch {batch_number} into {table_name}: {counts['inserted']} inserted, "
+                  f"{counts['retired']} retired, {counts['unchanged']} unchanged.");
+        except Exception as e:
+            conn_arg.rollback();
+            print(f"SCD2 batch {batch_number} into {table_name} failed!\n", e);
+            return None;
+    return batch_results;
+
+
+def merge_customers(rows, conn_arg, cursor_arg, batch_size=BATCH_SIZE, refresh_aggregates=False):
+    '''
+    scd2_merge() for dim_customers, rows need customer_id, name, email and city.
+    '''
+    return scd2_merge("dim_customers", rows, conn_arg, cursor_arg, batch_size, refresh_aggregates);
+
+
+def merge_products(rows, conn_arg, cursor_arg, batch_size=BATCH_SIZE, refresh_aggregates=False):
+    '''
+    scd2_merge() for dim_products, rows need product_id, name, category and price.
+    '''
+    return scd2_merge("dim_products", rows, conn_arg, cursor_arg, batch_size, refresh_aggregates);
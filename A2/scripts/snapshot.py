@@ -0,0 +1,200 @@
+import argparse; import json; import os; import shutil; import time;
+from datetime import datetime, timezone;
+from decimal import Decimal;
+import pyarrow as pa;
+import pyarrow.compute as pc;
+import pyarrow.parquet as pq;
+import pit_join; # The orders summary query.
+
+# Columnar snapshot of the orders summary (the documents etl.py exports to MongoDB), written as one directory per
+# order month (order_month=YYYY-MM, hive style) of Arrow IPC or Parquet files, so analysts can run the Part3 reports
+# locally instead of querying Postgres or MongoDB.
+# Arrow IPC files are uncompressed and memory-mapped by the reader, so reading them is zero-copy: only the pages of
+# the columns a report touches are ever read from disk. Parquet files are smaller, but are decoded when read.
+
+# Where the snapshot is written, relative to the parent directory like the .env file.
+SNAPSHOT_DIR = "./A2/snapshot";
+
+# Rows fetched from the server-side cursor per batch.
+SNAPSHOT_BATCH_SIZE = 50000;
+
+# Same columns and names as the orders_summary documents. NUMERIC columns are float64, like in MongoDB.
+SCHEMA = pa.schema([
+    ("order_id", pa.int64()),
+    ("order_date", pa.timestamp("us", tz="UTC")),
+    ("customer_id", pa.int32()),
+    ("customer_name", pa.string()),
+    ("customer_city", pa.string()),
+    ("product_id", pa.int32()),
+    ("product_name", pa.string()),
+    ("product_price", pa.float64()),
+    ("amount", pa.float64()),
+]);
+
+FILE_EXTENSIONS = {"ipc": ".arrow", "parquet": ".parquet"};
+METADATA_FILE = "_snapshot.json";
+
+# ======================================================================== [WRITER] ======================================================================= #
+def to_record_batch(rows):
+    '''
+    Turns rows of the orders summary query into one RecordBatch of SCHEMA, column by column.
+    '''
+    columns = list(zip(*rows));
+    arrays = [];
+    for field, values in zip(SCHEMA, columns):
+        if(pa.types.is_floating(field.type)):
+            values = [float(value) if isinstance(value, Decimal) else value for value in values];
+        arrays.append(pa.array(values, type=field.type));
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA);
+
+
+def open_writer(file_path, file_format):
+    if(file_format == "parquet"):
+        return pq.ParquetWriter(file_path, SCHEMA, compression="zstd");
+    return pa.ipc.new_file(file_path, SCHEMA);
+
+
+def write_snapshot(pg_conn, path=SNAPSHOT_DIR, file_format="ipc", batch_size=SNAPSHOT_BATCH_SIZE, query=pit_join.ORDERS_SUMMARY_SQL):
+    '''
+    Streams the orders summary from PostgreSQL into a snapshot partitioned by order month (in UTC).
+    Rows are read through a named (server-side) cursor `batch_size` at a time, every batch is split by month and
+    appended to the file of its month, so memory stays bounded. The snapshot is written next to `path` and swapped in
+    at the end, readers never see a half-written one.
+
+    ## Returns:
+    - Dictionary with the rows written, the months, the elapsed seconds and the rows per second.
+    '''
+    start_time = time.perf_counter();
+    staging_path = path + ".tmp";
+    shutil.rmtree(staging_path, ignore_errors=True);
+    os.makedirs(staging_path);
+
+    writers = {}; total_rows = 0;
+    try:
+        with pg_conn.cursor(name="orders_summary_snapshot") as snapshot_cursor:
+            snapshot_cursor.itersize = batch_size;
+            snapshot_cursor.execute(query);
+            while(True):
+                rows = snapshot_cursor.fetchmany(batch_size);
+                if(len(rows) == 0):
+                    break;
+                batch = to_record_batch(rows);
+                months = pc.strftime(batch.column("order_date"), format="%Y-%m");
+                for month in pc.unique(months).to_pylist():
+                    if(month not in writers):
+                        month_dir = os.path.join(staging_path, f"order_month={month}");
+                        os.makedirs(month_dir);
+                        writers[month] = open_writer(os.path.join(month_dir, "part-0" + FILE_EXTENSIONS[file_format]), file_format);
+                    writers[month].write_batch(batch.filter(pc.equal(months, month)));
+                total_rows += len(rows);
+        # A named cursor lives inside a transaction, end it.
+        pg_conn.commit();
+    finally:
+        for writer in writers.values():
+            writer.close();
+
+    elapsed = time.perf_counter() - start_time;
+    report = {
+        "rows": total_rows,
+        "months": sorted(writers),
+        "format": file_format,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(total_rows / elapsed, 1) if elapsed > 0 else 0.0,
+    };
+    with open(os.path.join(staging_path, METADATA_FILE), "w") as metadata_file:
+        json.dump(report, metadata_file, indent=2);
+
+    # Swap the new snapshot in.
+    old_path = path + ".old";
+    shutil.rmtree(old_path, ignore_errors=True);
+    if(os.path.exists(path)):
+        os.rename(path, old_path);
+    os.rename(staging_path, path);
+    shutil.rmtree(old_path, ignore_errors=True);
+    print(f"Wrote {total_rows} rows in {len(writers)} monthly {file_format} files to {path}, {elapsed:.2f}s");
+    return report;
+
+# ======================================================================== [READER] ======================================================================= #
+def snapshot_files(path=SNAPSHOT_DIR, months=None):
+    '''
+    Yields the (month, file path) of every file of the snapshot, only for `months` ("YYYY-MM") if given,
+    so the other partitions are never opened.
+    '''
+    for entry in sorted(os.listdir(path)):
+        if(not entry.startswith("order_month=")):
+            continue;
+        month = entry.split("=", 1)[1];
+        if(months is not None and month not in months):
+            continue;
+        for file_name in sorted(os.listdir(os.path.join(path, entry))):
+            yield month, os.path.join(path, entry, file_name);
+
+
+def read_snapshot(path=SNAPSHOT_DIR, months=None, columns=None):
+    '''
+    Returns the snapshot (or the `months` partitions of it) as ONE pyarrow Table with the given `columns`.
+    Arrow IPC files are memory-mapped and read without copying, the Table points straight at the mapped pages.
+    Parquet files are read with memory mapping too, but have to be decoded.
+    '''
+    tables = [];
+    for _, file_path in snapshot_files(path, months):
+        if(file_path.endswith(FILE_EXTENSIONS["ipc"])):
+            table = pa.ipc.open_file(pa.memory_map(file_path, "r")).read_all();
+            tables.append(table if columns is None else table.select(columns));
+        elif(file_path.endswith(FILE_EXTENSIONS["parquet"])):
+            tables.append(pq.read_table(file_path, columns=columns, memory_map=True));
+    if(len(tables) == 0):
+        empty = SCHEMA.empty_table();
+        return empty if columns is None else empty.select(columns);
+    return pa.concat_tables(tables);
+
+
+# Aggregated columns are selected by name, pyarrow versions do not agree on whether group_by() puts the keys first.
+def customer_city_counts(table):
+    '''
+    Report 1 over the orders: every customer name and city it ordered from, with the number of different cities of that name
+    (the grouping of playground query 1, the SQL version counts every customer version instead).
+    '''
+    pairs = table.select(["customer_name", "customer_city"]).group_by(["customer_name", "customer_city"]).aggregate([]);
+    # count skips NULL cities, like COUNT(city).
+    counts = pairs.group_by("customer_name").aggregate([("customer_city", "count")]);
+    report = pairs.join(counts, "customer_name");
+    return report.select(["customer_name", "customer_city", "customer_city_count"]).rename_columns(["customer_name", "customer_city", "city_count"]);
+
+
+def city_sales(table):
+    '''
+    Report 2: total amount per customer and the city they lived in when they placed the orders.
+    '''
+    sales = table.group_by(["customer_id", "customer_name", "customer_city"]).aggregate([("amount", "sum")]);
+    return sales.select(["customer_id", "customer_name", "customer_city", "amount_sum"]).rename_columns(
+        ["customer_id", "customer_name", "customer_city", "total_amount"]);
+
+
+def product_discounts(table):
+    '''
+    Report 3: sum of (price - amount) per product, with the price at the time of each order.
+    '''
+    discounts = table.select(["product_id", "product_name"]).append_column(
+        "discount", pc.subtract(table.column("product_price"), table.column("amount")));
+    discounts = discounts.group_by(["product_id", "product_name"]).aggregate([("discount", "sum")]);
+    return discounts.select(["product_id", "product_name", "discount_sum"]).rename_columns(["product_id", "product_name", "sum_of_discounts"]);
+
+# ======================================================================== [MAIN] ======================================================================= #
+def main():
+    parser = argparse.ArgumentParser(description="Run the Part3 reports on the columnar orders_summary snapshot (written by etl.py --mode snapshot).");
+    parser.add_argument("--path", default=SNAPSHOT_DIR);
+    parser.add_argument("--months", default=None, help="Comma separated YYYY-MM partitions to read (default: all).");
+    args = parser.parse_args();
+
+    months = None if args.months is None else set(args.months.split(","));
+    table = read_snapshot(args.path, months);
+    print(f"{table.num_rows} orders");
+    for name, report in (("Cities per customer", customer_city_counts), ("Total sold per city", city_sales), ("Discounts per product", product_discounts)):
+        start_time = time.perf_counter();
+        result = report(table);
+        print(f"{name} ({(time.perf_counter() - start_time) * 1000:.1f} ms):\n{result.to_pandas()}\n");
+
+if __name__ == "__main__":
+    main();
@@ -0,0 +1,86 @@
+import argparse; import json; import os; import sys; import time; import tracemalloc;
+
+# Run from the parent directory: py "./benchmarks/bench_copy_serialization.py"
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..");
+sys.path.append(ROOT_DIR);
+from common import copy_text;
+from common import copy_binary;
+import numpy as np;
+import pandas as pd;
+
+# Column types of the orders table, same as TABLE_COLUMN_TYPES["orders"] of ./A1/load.py (the binary encoding needs them).
+ORDER_COLUMN_TYPES = {"customer_id": "int4", "order_date": "date", "total_amount": "numeric",
+                      "product_id": "int4", "product_category": "text", "product_name": "text"};
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def make_orders(rows, seed):
+    '''
+    DataFrame shaped like ./A1/CSV/orders.csv as pandas reads it: ints, a date string, a float and two text columns.
+    '''
+    rng = np.random.default_rng(seed);
+    categories = np.array(["Electronics", "Books", "Home", "Toys", "Sports"], dtype=object);
+    dates = np.datetime64("2024-01-01") + rng.integers(0, 730, rows).astype("timedelta64[D]");
+    return pd.DataFrame({
+        "customer_id": rng.integers(1, 100000, rows),
+        "order_date": dates.astype(str).astype(object),
+        "total_amount": np.round(rng.uniform(5, 500, rows), 2),
+        "product_id": rng.integers(1, 1000, rows),
+        "product_category": categories[rng.integers(0, len(categories), rows)],
+        "product_name": pd.Series(rng.integers(1, 1000, rows)).map(lambda n: f"Product {n}").to_numpy(dtype=object),
+    });
+
+
+def measure(function):
+    '''
+    Runs `function` once, returns its elapsed seconds and the peak memory it allocated in MB (tracemalloc also
+    tracks the NumPy buffers).
+    '''
+    tracemalloc.start();
+    start_time = time.perf_counter();
+    result = function();
+    elapsed = time.perf_counter() - start_time;
+    _, peak = tracemalloc.get_traced_memory();
+    tracemalloc.stop();
+    del result;
+    return elapsed, peak / (1024 * 1024);
+
+
+def tuples(df_arg):
+    # The conversion bulk_insert and bulk_delete used to do.
+    return [tuple(x) for x in df_arg.to_numpy()];
+
+
+def copy_text_bytes(df_arg):
+    # Everything COPY would read from the stream.
+    return b"".join(copy_text.iter_copy_text(df_arg, column_types=ORDER_COLUMN_TYPES));
+
+
+def copy_binary_bytes(df_arg):
+    # What bulk_insert sends with the default BULK_COPY_FORMAT = "binary".
+    return b"".join(copy_binary.iter_copy_binary(df_arg, ORDER_COLUMN_TYPES));
+
+# ======================================================================== [MAIN] ======================================================================= #
+def main():
+    parser = argparse.ArgumentParser(description="List of tuples vs column-wise COPY text and binary COPY serialization of a DataFrame.");
+    parser.add_argument("--rows", type=int, default=1000000);
+    parser.add_argument("--seed", type=int, default=42);
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.");
+    args = parser.parse_args();
+
+    df = make_orders(args.rows, args.seed);
+    results = {"rows": args.rows};
+    for name, function in (("list_of_tuples", tuples), ("copy_text", copy_text_bytes), ("copy_binary", copy_binary_bytes)):
+        elapsed, peak_mb = measure(lambda: function(df));
+        results[name] = {
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(args.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "peak_memory_mb": round(peak_mb, 1),
+        };
+        print(f"{name:>15}: {elapsed:8.3f}s  {results[name]['rows_per_second']:>14,.0f} rows/sec  peak {peak_mb:8.1f} MB");
+
+    if(args.output is not None):
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2);
+
+if __name__ == "__main__":
+    main();
@@ -0,0 +1,150 @@
+import argparse; import json; import os; import sys; import time;
+from datetime import datetime, timedelta, timezone;
+import dotenv;
+
+# Run from the parent directory: py "./benchmarks/bench_current_lookup.py"
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..");
+sys.path.append(ROOT_DIR);
+sys.path.append(os.path.join(ROOT_DIR, "A2", "scripts"));
+from common import db;
+import part2;
+import asof_index; # Version valid at a time: validity GiST index and in-memory AsOfIndex.
+
+# Everything is created in this schema, and dropped at the end, the real tables are never touched.
+BENCH_SCHEMA = "bench_current_lookup";
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def build_history(keys, depth, conn_arg, cursor_arg):
+    '''
+    Fills the benchmark dim_customers with `keys` customers that have `depth` versions each.
+    Versions are inserted oldest first, which is the heap order get_most_recent_customer() relies on.
+    '''
+    cursor_arg.execute("TRUNCATE TABLE dim_customers");
+    cursor_arg.execute(
+        query="""
+        INSERT INTO dim_customers (customer_id, name, email, city, valid_start_date, valid_end_date)
+        SELECT k, 'Customer ' || k, '', 'City ' || v,
+            CURRENT_TIMESTAMP - (%(depth)s - v + 1) * INTERVAL '1 day',
+            CASE WHEN v < %(depth)s THEN CURRENT_TIMESTAMP - (%(depth)s - v) * INTERVAL '1 day' END
+        FROM generate_series(1, %(depth)s) AS v, generate_series(1, %(keys)s) AS k
+        ORDER BY v, k
+        """,
+        vars={"keys": keys, "depth": depth}
+    );
+    cursor_arg.execute("ANALYZE dim_customers");
+    conn_arg.commit();
+
+
+def time_lookups(lookup, customer_ids):
+    '''
+    Calls `lookup` for every customer id, returns the mean latency in milliseconds.
+    '''
+    start_time = time.perf_counter();
+    for customer_id in customer_ids:
+        lookup(customer_id);
+    return (time.perf_counter() - start_time) * 1000 / len(customer_ids);
+
+
+def run(depths, keys, lookups, conn_arg, cursor_arg):
+    '''
+    Times get_most_recent_customer() against get_current_customer() and get_current_customers()
+    for every history depth, and the lookups of the version valid halfway through the history:
+    get_customer_as_of() through the validity index, and AsOfIndex in memory (loaded once per depth).
+    Returns one result dict per depth.
+    '''
+    results = [];
+    customer_ids = [(i % keys) + 1 for i in range(lookups)];
+    for depth in depths:
+        build_history(keys, depth, conn_arg, cursor_arg);
+
+        most_recent_ms = time_lookups(lambda c: part2.get_most_recent_customer(c, cursor_arg, conn_arg), customer_ids);
+        current_ms = time_lookups(lambda c: part2.get_current_customer(c, cursor_arg, conn_arg), customer_ids);
+
+        start_time = time.perf_counter();
+        part2.get_current_customers(customer_ids, cursor_arg, conn_arg);
+        bulk_ms = (time.perf_counter() - start_time) * 1000;
+
+        as_of = datetime.now(timezone.utc) - timedelta(days=depth / 2);
+        as_of_ms = time_lookups(lambda c: asof_index.get_customer_as_of(c, as_of, cursor_arg, conn_arg), customer_ids);
+        start_time = time.perf_counter();
+        customer_index = asof_index.AsOfIndex("dim_customers");
+        customer_index.load(cursor_arg, conn_arg);
+        index_load_ms = (time.perf_counter() - start_time) * 1000;
+        in_memory_ms = time_lookups(lambda c: customer_index.surrogate_id(c, as_of), customer_ids);
+
+        results.append({
+            "history_depth": depth,
+            "get_most_recent_customer_ms": round(most_recent_ms, 4),
+            "get_current_customer_ms": round(current_ms, 4),
+            "get_current_customers_total_ms": round(bulk_ms, 4),
+            "get_customer_as_of_ms": round(as_of_ms, 4),
+            "asof_index_lookup_ms": round(in_memory_ms, 4),
+            "asof_index_load_ms": round(index_load_ms, 4),
+            "lookups": lookups,
+        });
+        print(f"depth {depth:>6}: most_recent {most_recent_ms:8.3f} ms/call | current {current_ms:8.3f} ms/call | "
+              f"bulk {bulk_ms:8.3f} ms for {lookups} keys | as-of {as_of_ms:8.3f} ms/call | "
+              f"in memory {in_memory_ms:8.4f} ms/call (+{index_load_ms:.1f} ms to load)");
+    return results;
+
+# ======================================================================== [MAIN] ======================================================================= #
+def main():
+    parser = argparse.ArgumentParser(description="Current version lookup benchmark, as history depth grows.");
+    parser.add_argument("--database", default="seng550_a2_dbi");
+    parser.add_argument("--depths", default="1,10,100,1000", help="Comma separated history depths.");
+    parser.add_argument("--keys", type=int, default=200, help="Customers in the benchmark table.");
+    parser.add_argument("--lookups", type=int, default=500, help="Lookups timed per depth.");
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.");
+    args = parser.parse_args();
+
+    manager = db.get_manager(
+        host=str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT")),
+        password=str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD")),
+        database=args.database
+    );
+    with manager.connection() as conn:
+        cursor = conn.cursor();
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}");
+        # Same columns as ./A2/SQL/create-2d-tables.sql, with its own SERIAL so the real sequence is not used up.
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {BENCH_SCHEMA}.dim_customers
+            (
+                id SERIAL PRIMARY KEY,
+                customer_id INT NOT NULL,
+                name TEXT NOT NULL,
+                email TEXT,
+                city TEXT,
+                valid_start_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                valid_end_date TIMESTAMP WITH TIME ZONE
+            );
+            CREATE TABLE IF NOT EXISTS {BENCH_SCHEMA}.dim_products
+            (
+                id SERIAL PRIMARY KEY,
+                product_id INT NOT NULL,
+                name TEXT NOT NULL,
+                category TEXT,
+                price NUMERIC,
+                valid_start_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                valid_end_date TIMESTAMP WITH TIME ZONE
+            )
+            """);
+        # Unqualified table names used by part2.py now point to the benchmark schema.
+        cursor.execute(f"SET search_path TO {BENCH_SCHEMA}");
+        conn.commit();
+        part2.ensure_current_version_indexes(conn, cursor);
+        asof_index.ensure_validity_ranges(conn, cursor);
+
+        try:
+            results = run([int(d) for d in args.depths.split(",")], args.keys, args.lookups, conn, cursor);
+        finally:
+            cursor.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE");
+            cursor.execute("SET search_path TO DEFAULT");
+            conn.commit();
+
+    if(args.output is not None):
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2);
+    db.close_all();
+
+if __name__ == "__main__":
+    main();
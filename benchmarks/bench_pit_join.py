@@ -0,0 +1,132 @@
+import argparse; import json; import os; import sys; import time;
+import dotenv;
+
+# Run from the parent directory: py "./benchmarks/bench_pit_join.py"
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..");
+sys.path.append(ROOT_DIR);
+sys.path.append(os.path.join(ROOT_DIR, "A2", "scripts"));
+from common import db;
+import pandas as pd;
+import pit_join;
+
+# Everything is created in this schema, and dropped at the end, the real tables are never touched.
+BENCH_SCHEMA = "bench_pit_join";
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def build_tables(customers, products, depth, orders, seed, conn_arg, cursor_arg):
+    '''
+    Creates the three A2 tables in the benchmark schema, with `depth` consecutive versions per customer and product
+    over the last year, and `orders` orders spread over the same year.
+    '''
+    cursor_arg.execute(f"""
+        DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;
+        CREATE SCHEMA {BENCH_SCHEMA};
+        SET search_path TO {BENCH_SCHEMA};
+        CREATE TABLE dim_customers (id SERIAL PRIMARY KEY, customer_id INT NOT NULL, name TEXT NOT NULL, email TEXT, city TEXT,
+            valid_start_date TIMESTAMP WITH TIME ZONE NOT NULL, valid_end_date TIMESTAMP WITH TIME ZONE);
+        CREATE TABLE dim_products (id SERIAL PRIMARY KEY, product_id INT NOT NULL, name TEXT NOT NULL, category TEXT, price NUMERIC,
+            valid_start_date TIMESTAMP WITH TIME ZONE NOT NULL, valid_end_date TIMESTAMP WITH TIME ZONE);
+        CREATE TABLE fact_orders (order_id SERIAL PRIMARY KEY, product_id INT NOT NULL, customer_id INT NOT NULL,
+            order_date TIMESTAMP WITH TIME ZONE NOT NULL, amount NUMERIC);
+        SELECT setseed({seed});
+        """);
+    cursor_arg.execute(
+        query="""
+        INSERT INTO dim_customers (customer_id, name, email, city, valid_start_date, valid_end_date)
+        SELECT k, 'Customer ' || k, '', 'City ' || v,
+            TIMESTAMPTZ '2025-01-01 00:00:00+00' + (v - 1) * (INTERVAL '365 days' / %(depth)s),
+            CASE WHEN v < %(depth)s THEN TIMESTAMPTZ '2025-01-01 00:00:00+00' + v * (INTERVAL '365 days' / %(depth)s) END
+        FROM generate_series(1, %(depth)s) AS v, generate_series(1, %(customers)s) AS k;
+
+        INSERT INTO dim_products (product_id, name, category, price, valid_start_date, valid_end_date)
+        SELECT k, 'Product ' || k, 'Category ' || (k %% 10), 100 + v,
+            TIMESTAMPTZ '2025-01-01 00:00:00+00' + (v - 1) * (INTERVAL '365 days' / %(depth)s),
+            CASE WHEN v < %(depth)s THEN TIMESTAMPTZ '2025-01-01 00:00:00+00' + v * (INTERVAL '365 days' / %(depth)s) END
+        FROM generate_series(1, %(depth)s) AS v, generate_series(1, %(products)s) AS k;
+
+        -- Random business keys and dates, stored as the surrogate ids of the versions valid at the order_date,
+        -- like fact_loader.py does.
+        INSERT INTO fact_orders (customer_id, product_id, order_date, amount)
+        SELECT dc.id, dp.id, o.order_date, o.amount
+        FROM (
+            SELECT 1 + floor(random() * %(customers)s)::INT AS customer_key, 1 + floor(random() * %(products)s)::INT AS product_key,
+                TIMESTAMPTZ '2025-01-01 00:00:00+00' + random() * INTERVAL '364 days' AS order_date,
+                round((50 + random() * 100)::NUMERIC, 2) AS amount
+            FROM generate_series(1, %(orders)s)
+        ) AS o
+        INNER JOIN dim_customers AS dc
+            ON dc.customer_id = o.customer_key
+            AND dc.valid_start_date <= o.order_date AND (dc.valid_end_date IS NULL OR o.order_date < dc.valid_end_date)
+        INNER JOIN dim_products AS dp
+            ON dp.product_id = o.product_key
+            AND dp.valid_start_date <= o.order_date AND (dp.valid_end_date IS NULL OR o.order_date < dp.valid_end_date);
+        """,
+        vars={"customers": customers, "products": products, "depth": depth, "orders": orders}
+    );
+    cursor_arg.execute("ANALYZE dim_customers; ANALYZE dim_products; ANALYZE fact_orders;");
+    conn_arg.commit();
+    pit_join.ensure_pit_indexes(conn_arg, cursor_arg);
+
+
+def timed(function, repeat):
+    '''
+    Runs `function` `repeat` times, returns the best time in seconds and the last result.
+    '''
+    best = None; result = None;
+    for _ in range(repeat):
+        start_time = time.perf_counter();
+        result = function();
+        elapsed = time.perf_counter() - start_time;
+        best = elapsed if best is None else min(best, elapsed);
+    return best, result;
+
+# ======================================================================== [MAIN] ======================================================================= #
+def main():
+    parser = argparse.ArgumentParser(description="Temporary table chain vs single-pass SQL vs pandas join.");
+    parser.add_argument("--database", default="seng550_a2_dbi");
+    parser.add_argument("--customers", type=int, default=10000);
+    parser.add_argument("--products", type=int, default=1000);
+    parser.add_argument("--depth", type=int, default=5, help="Versions per customer and product.");
+    parser.add_argument("--orders", type=int, default=200000);
+    parser.add_argument("--repeat", type=int, default=3);
+    parser.add_argument("--seed", type=float, default=0.42);
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.");
+    args = parser.parse_args();
+
+    manager = db.get_manager(
+        host=str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT")),
+        password=str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD")),
+        database=args.database
+    );
+    with manager.connection() as conn:
+        cursor = conn.cursor();
+        try:
+            build_tables(args.customers, args.products, args.depth, args.orders, args.seed, conn, cursor);
+
+            chain_s, chain_df = timed(lambda: pit_join.read_frame(pit_join.TEMP_TABLE_CHAIN_SQL, conn), args.repeat);
+            single_s, single_df = timed(lambda: pit_join.read_orders_summary(conn), args.repeat);
+            load_s, frames = timed(lambda: pit_join.read_pit_frames(conn), args.repeat);
+            pandas_s, pandas_df = timed(lambda: pit_join.pit_join_frames(*frames), args.repeat);
+        finally:
+            conn.rollback();
+            cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; SET search_path TO DEFAULT;");
+            conn.commit();
+
+    results = {
+        "orders": args.orders, "customers": args.customers, "products": args.products, "history_depth": args.depth,
+        "temp_table_chain_seconds": round(chain_s, 4), "temp_table_chain_rows": len(chain_df),
+        "single_pass_sql_seconds": round(single_s, 4), "single_pass_sql_rows": len(single_df),
+        "pandas_join_seconds": round(pandas_s, 4), "pandas_join_rows": len(pandas_df),
+        "pandas_frame_load_seconds": round(load_s, 4),
+    };
+    print(f"temp table chain : {chain_s:8.3f}s  ({len(chain_df)} rows)");
+    print(f"single-pass SQL  : {single_s:8.3f}s  ({len(single_df)} rows)");
+    print(f"pandas join      : {pandas_s:8.3f}s  ({len(pandas_df)} rows, +{load_s:.3f}s to load the frames)");
+
+    if(args.output is not None):
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2);
+    db.close_all();
+
+if __name__ == "__main__":
+    main();
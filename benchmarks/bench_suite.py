@@ -0,0 +1,328 @@
+import argparse; import json; import os; import sys; import time; import subprocess;
+from datetime import datetime, timezone;
+import dotenv;
+
+# Run from the parent directory: py "./benchmarks/bench_suite.py" --scale 100000
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..");
+sys.path.append(ROOT_DIR);
+sys.path.append(os.path.join(ROOT_DIR, "A1"));
+sys.path.append(os.path.join(ROOT_DIR, "A2", "scripts"));
+from common import db;
+import numpy as np;
+import load; # A1 loaders.
+import part2; import scd_batch; import fact_loader; import pit_join; import etl; import asof_index; # A2 pipeline.
+import synthetic;
+
+# Peak RSS of the process, not available on Windows.
+try:
+    import resource;
+except ImportError:
+    resource = None;
+
+# MongoDB stand-in for the export, used when no --mongo-uri is given.
+try:
+    import mongomock;
+except ImportError:
+    mongomock = None;
+
+# Everything is created in this schema (and MongoDB database), and dropped at the end, the real tables are never touched.
+BENCH_SCHEMA = "bench_suite";
+
+STEPS = ["bulk_insert", "scd_batch", "scd_single", "fact_load", "fact_load_asof", "etl_export"];
+
+# ======================================================================== [MEASURES] ======================================================================= #
+def peak_rss_mb():
+    '''
+    Highest resident memory of the process so far in MB, None where the resource module does not exist.
+    '''
+    if(resource is None):
+        return None;
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss;
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1);
+
+
+def step_result(rows, latencies, **details):
+    '''
+    Rows/sec over the time spent in the timed calls, p50 / p99 latency of one call (one batch, or one row for the
+    single-row paths), and the peak RSS of the process once the step is over.
+    '''
+    seconds = float(sum(latencies));
+    latencies_ms = np.array(latencies) * 1000 if len(latencies) > 0 else np.zeros(1);
+    return {
+        "rows": rows,
+        "calls": len(latencies),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "peak_rss_mb": peak_rss_mb(),
+        **details,
+    };
+
+
+def timed_calls(items, function):
+    '''
+    Calls `function` on every item, timing each call on its own (generating the items is not timed).
+    Returns the latencies in seconds and the total number of rows of the items.
+    '''
+    latencies = []; rows = 0;
+    for item in items:
+        start_time = time.perf_counter();
+        function(item);
+        latencies.append(time.perf_counter() - start_time);
+        rows += len(item);
+    return latencies, rows;
+
+
+def git_commit():
+    '''
+    Commit the benchmark ran on, so reports can be compared between commits. None outside of a git checkout.
+    '''
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip();
+    except Exception:
+        return None;
+
+
+class BatchClock:
+    '''
+    Wraps the orders_summary collection given to etl.stream_export(): everything is forwarded to the collection,
+    and the time between two insert_many() calls (fetch, transform and write of one batch) is recorded.
+    '''
+    def __init__(self, collection):
+        self._collection = collection;
+        self.latencies = [];
+        self._last = time.perf_counter();
+
+    def start(self):
+        self._last = time.perf_counter();
+
+    def insert_many(self, documents, **kwargs):
+        result = self._collection.insert_many(documents, **kwargs);
+        now = time.perf_counter();
+        self.latencies.append(now - self._last);
+        self._last = now;
+        return result;
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name);
+
+# ======================================================================== [STEPS] ======================================================================= #
+def create_tables(conn_arg, cursor_arg):
+    '''
+    Creates the A1 and A2 tables in the benchmark schema, from the same SQL files as the real ones.
+    '''
+    cursor_arg.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; CREATE SCHEMA {BENCH_SCHEMA};");
+    # Unqualified table names used by the scripts now point to the benchmark schema.
+    cursor_arg.execute(f"SET search_path TO {BENCH_SCHEMA}");
+    for sql_path in ("A1/SQL-Queries/create-tables.sql", "A2/SQL/create-2d-tables.sql"):
+        with open(os.path.join(ROOT_DIR, sql_path)) as sql_file:
+            cursor_arg.execute(sql_file.read());
+    conn_arg.commit();
+
+
+def bench_bulk_insert(counts, args, conn_arg, cursor_arg):
+    '''
+    A1 bulk_insert() of every table, one call per generated chunk.
+    '''
+    sources = {
+        "customers": synthetic.iter_customers(counts["customers"], args.seed, args.chunk_rows),
+        "orders": synthetic.iter_orders(counts["orders"], counts["customers"], counts["products"], args.seed, args.chunk_rows),
+        "deliveries": synthetic.iter_deliveries(counts["deliveries"], counts["orders"], args.seed, args.chunk_rows),
+    };
+    results = {};
+    for table_name, chunks in sources.items():
+        def insert(chunk_df):
+            if(load.bulk_insert(table_name, chunk_df, cursor_arg, conn_arg) != 1):
+                raise RuntimeError(f"bulk_insert into {table_name} failed.");
+        latencies, rows = timed_calls(chunks, insert);
+        results[table_name] = step_result(rows, latencies);
+    return results;
+
+
+def build_history(counts, args, conn_arg, cursor_arg):
+    '''
+    Fills the dimension tables with `depth` versions per key, returns the seconds it took (setup, not a benchmark).
+    '''
+    start_time = time.perf_counter();
+    cursor_arg.execute(synthetic.HISTORY_SQL, {"customers": counts["customers"], "products": counts["products"], "depth": args.depth});
+    cursor_arg.execute("ANALYZE dim_customers; ANALYZE dim_products;");
+    conn_arg.commit();
+    part2.ensure_current_version_indexes(conn_arg, cursor_arg);
+    fact_loader.ensure_asof_indexes(conn_arg, cursor_arg);
+    return round(time.perf_counter() - start_time, 3);
+
+
+def bench_scd_batch(counts, args, conn_arg, cursor_arg):
+    '''
+    scd_batch.merge_batch() over the customer change stream, one call per chunk of every round.
+    '''
+    changes = synthetic.iter_customer_changes(counts["customers"], args.rounds, args.change_fraction, args.seed, args.chunk_rows);
+    totals = {"inserted": 0, "retired": 0};
+    def merge(chunk_df):
+        batch_counts = scd_batch.merge_batch("dim_customers", chunk_df, conn_arg, cursor_arg);
+        totals["inserted"] += batch_counts["inserted"]; totals["retired"] += batch_counts["retired"];
+    latencies, rows = timed_calls((chunk_df for _, chunk_df in changes), merge);
+    return step_result(rows, latencies, rounds=args.rounds, **totals);
+
+
+def bench_scd_single(counts, args, conn_arg, cursor_arg):
+    '''
+    part2.update_customer_city(), the row-at-a-time SCD path, for `single_calls` customers.
+    '''
+    rng = np.random.default_rng(args.seed);
+    customer_ids = rng.integers(1, counts["customers"] + 1, args.single_calls);
+    latencies = [];
+    for call, customer_id in enumerate(customer_ids.tolist()):
+        start_time = time.perf_counter();
+        part2.update_customer_city(customer_id, f"Customer {customer_id}", "", f"Single {call}", conn_arg, cursor_arg);
+        latencies.append(time.perf_counter() - start_time);
+    return step_result(len(latencies), latencies);
+
+
+def bench_fact_load(counts, args, conn_arg, cursor_arg, customer_index=None, product_index=None, **details):
+    '''
+    fact_loader.load_order_batch() for the generated orders, one call per chunk.
+    '''
+    orders = synthetic.iter_fact_orders(counts["orders"], counts["customers"], counts["products"], args.seed, chunk_rows=args.chunk_rows);
+    totals = {"inserted": 0, "duplicates": 0, "unresolved": 0};
+    def load_batch(chunk_df):
+        batch_counts = fact_loader.load_order_batch(chunk_df, conn_arg, cursor_arg,
+                                                    customer_index=customer_index, product_index=product_index);
+        for key in totals:
+            totals[key] += batch_counts[key];
+    latencies, rows = timed_calls(orders, load_batch);
+    return step_result(rows, latencies, **totals, **details);
+
+
+def bench_fact_load_asof(counts, args, conn_arg, cursor_arg):
+    '''
+    Same load as bench_fact_load(), with the surrogate ids resolved in memory by asof_index.AsOfIndex instead of the
+    LATERAL lookups of the database. fact_orders is emptied first, so both steps insert the same rows.
+    Loading the two indexes is timed on its own (index_load_seconds).
+    '''
+    cursor_arg.execute("TRUNCATE TABLE fact_orders");
+    conn_arg.commit();
+    start_time = time.perf_counter();
+    customer_index = asof_index.AsOfIndex("dim_customers"); product_index = asof_index.AsOfIndex("dim_products");
+    if(customer_index.load(cursor_arg, conn_arg) < 0 or product_index.load(cursor_arg, conn_arg) < 0):
+        raise RuntimeError("Loading the as-of indexes failed.");
+    index_load_seconds = round(time.perf_counter() - start_time, 3);
+    return bench_fact_load(counts, args, conn_arg, cursor_arg, customer_index, product_index, index_load_seconds=index_load_seconds);
+
+
+def bench_etl_export(args, conn_arg, cursor_arg):
+    '''
+    etl.stream_export() of the fact table into MongoDB (mongomock, or the server of --mongo-uri), with the rollups.
+    None if there is no MongoDB to write to.
+    '''
+    if(args.mongo_uri is not None):
+        mongo_cli = etl.MongoClient(args.mongo_uri);
+    elif(mongomock is not None):
+        mongo_cli = mongomock.MongoClient();
+    else:
+        print("Skipping the etl export, install mongomock or give --mongo-uri.");
+        return None;
+    try:
+        pit_join.ensure_pit_indexes(conn_arg, cursor_arg);
+        bench_db = mongo_cli.get_database(BENCH_SCHEMA);
+        orders_summary = bench_db.get_collection("orders_summary");
+        etl.ensure_summary_indexes(orders_summary);
+        clock = BatchClock(orders_summary);
+        clock.start();
+        report = etl.stream_export(conn_arg, clock, args.export_batch, rollups=etl.get_rollups(bench_db));
+        return step_result(report["documents"], clock.latencies, stand_in=args.mongo_uri is None);
+    finally:
+        mongo_cli.drop_database(BENCH_SCHEMA);
+        mongo_cli.close();
+
+
+def run(args, conn_arg, cursor_arg):
+    '''
+    Runs the selected steps on fresh tables, in pipeline order, returns the results of every step.
+    '''
+    counts = synthetic.scale_counts(args.scale);
+    steps = args.steps.split(",");
+    create_tables(conn_arg, cursor_arg);
+    results = {"rows": counts};
+    if("bulk_insert" in steps):
+        results["bulk_insert"] = bench_bulk_insert(counts, args, conn_arg, cursor_arg);
+    results["history_setup_seconds"] = build_history(counts, args, conn_arg, cursor_arg);
+    if("scd_batch" in steps):
+        results["scd_batch"] = bench_scd_batch(counts, args, conn_arg, cursor_arg);
+    if("scd_single" in steps):
+        results["scd_single"] = bench_scd_single(counts, args, conn_arg, cursor_arg);
+    if("fact_load" in steps or "etl_export" in steps):
+        results["fact_load"] = bench_fact_load(counts, args, conn_arg, cursor_arg);
+    if("fact_load_asof" in steps):
+        results["fact_load_asof"] = bench_fact_load_asof(counts, args, conn_arg, cursor_arg);
+    if("etl_export" in steps):
+        results["etl_export"] = bench_etl_export(args, conn_arg, cursor_arg);
+    return results;
+
+
+def compare(results, baseline):
+    '''
+    Prints the rows/sec of every step next to the baseline report, and the ratio.
+    '''
+    def flatten(steps, prefix=""):
+        for name, value in steps.items():
+            if(isinstance(value, dict) and "rows_per_second" in value):
+                yield prefix + name, value["rows_per_second"];
+            elif(isinstance(value, dict)):
+                yield from flatten(value, f"{prefix}{name}.");
+    old = dict(flatten(baseline["steps"]));
+    for name, rows_per_second in flatten(results):
+        if(name in old and old[name] > 0):
+            print(f"{name:>22}: {old[name]:>14,.0f} -> {rows_per_second:>14,.0f} rows/sec  ({rows_per_second / old[name]:.2f}x)");
+
+# ======================================================================== [MAIN] ======================================================================= #
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the A1 and A2 pipelines on seeded synthetic data.");
+    parser.add_argument("--database", default="seng550_a2_dbi");
+    parser.add_argument("--scale", type=int, default=10000, help="Orders, the other tables are sized from it (see synthetic.scale_counts).");
+    parser.add_argument("--depth", type=int, default=5, help="Versions per customer and product before the change stream.");
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds of the customer change stream.");
+    parser.add_argument("--change-fraction", type=float, default=0.01, help="Share of the customers changed per round.");
+    parser.add_argument("--single-calls", type=int, default=200, help="Calls of the row-at-a-time SCD update.");
+    parser.add_argument("--chunk-rows", type=int, default=synthetic.CHUNK_ROWS, help="Rows per generated chunk / batch.");
+    parser.add_argument("--export-batch", type=int, default=etl.EXPORT_BATCH_SIZE, help="Batch size of the etl export.");
+    parser.add_argument("--steps", default=",".join(STEPS), help="Comma separated steps to run.");
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB server for the export (default: mongomock).");
+    parser.add_argument("--seed", type=int, default=42);
+    parser.add_argument("--output", default=None, help="Optional JSON file for the report.");
+    parser.add_argument("--baseline", default=None, help="JSON report of an earlier run to compare with.");
+    args = parser.parse_args();
+
+    manager = db.get_manager(
+        host=str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_ENDPOINT")),
+        password=str(dotenv.get_key(dotenv_path="./.env", key_to_get="DB_PASSWORD")),
+        database=args.database
+    );
+    with manager.connection() as conn:
+        cursor = conn.cursor();
+        try:
+            results = run(args, conn, cursor);
+        finally:
+            conn.rollback();
+            cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE; SET search_path TO DEFAULT;");
+            conn.commit();
+    db.close_all();
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "parameters": vars(args),
+        "steps": results,
+    };
+    print(json.dumps(report, indent=2));
+    if(args.baseline is not None):
+        with open(args.baseline) as baseline_file:
+            compare(results, json.load(baseline_file));
+    if(args.output is not None):
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2);
+
+if __name__ == "__main__":
+    main();
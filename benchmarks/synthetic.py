@@ -0,0 +1,151 @@
+import zlib;
+import numpy as np;
+import pandas as pd;
+
+# Seeded synthetic data shaped like the CSV files of A1 and the feeds of A2, generated CHUNK_ROWS rows at a time
+# so any scale (10k to 100M rows) fits in memory. The same seed always gives the same rows.
+
+# Rows generated per chunk.
+CHUNK_ROWS = 100000;
+
+CATEGORIES = np.array(["Electronics", "Books", "Home", "Toys", "Sports", "Garden", "Beauty", "Grocery"], dtype=object);
+STATUSES = np.array(["Pending", "Shipped", "Delivered", "Returned"], dtype=object);
+CITIES = np.array(["Calgary", "Edmonton", "Vancouver", "Toronto", "Montreal", "Ottawa", "Winnipeg", "Halifax", "Regina", "Victoria"], dtype=object);
+
+# Orders are placed from this day on.
+START_DATE = np.datetime64("2025-01-01", "D");
+
+# ======================================================================== [FUNCTIONS] ======================================================================= #
+def scale_counts(scale):
+    '''
+    Sizes of every table for a number of orders: 1 customer per 10 orders, 1 product per 1000 orders (at least 10),
+    and 1 delivery per order.
+    '''
+    return {
+        "orders": scale,
+        "customers": max(scale // 10, 1),
+        "products": max(scale // 1000, 10),
+        "deliveries": scale,
+    };
+
+
+def chunk_ranges(total, chunk_rows=CHUNK_ROWS):
+    '''
+    Yields (start, stop) of every chunk of `total` rows.
+    '''
+    for start in range(0, total, chunk_rows):
+        yield start, min(start + chunk_rows, total);
+
+
+def chunk_rng(seed, stream, start):
+    '''
+    Random generator of one chunk, derived from the seed, the name of the stream and the first row,
+    so every chunk is reproducible on its own, whatever the chunk size of the run before it.
+    '''
+    return np.random.default_rng([seed, zlib.crc32(stream.encode()), start]);
+
+
+def numbered(prefix, numbers, suffix=""):
+    return pd.Series(numbers).map(lambda n: f"{prefix}{n}{suffix}").to_numpy(dtype=object);
+
+# ======================================================================== [A1] ======================================================================= #
+def iter_customers(customers, seed, chunk_rows=CHUNK_ROWS):
+    '''
+    Chunks of ./A1/CSV/customers.csv rows. Emails are unique, so no row is skipped as a duplicate.
+    '''
+    for start, stop in chunk_ranges(customers, chunk_rows):
+        rng = chunk_rng(seed, "customers", start);
+        numbers = np.arange(start + 1, stop + 1);
+        yield pd.DataFrame({
+            "name": numbered("Customer ", numbers),
+            "email": numbered("customer", numbers, "@example.com"),
+            "phone": numbered("555-", rng.integers(1000, 9999, stop - start)),
+            "address": numbered("", rng.integers(1, 9999, stop - start), " Main Street"),
+        });
+
+
+def iter_orders(orders, customers, products, seed, chunk_rows=CHUNK_ROWS):
+    '''
+    Chunks of ./A1/CSV/orders.csv rows. Order i belongs to customer (i mod customers) + 1 and is placed
+    (i div customers) days after START_DATE, so every (customer_id, order_date) pair, and every row, is unique.
+    '''
+    for start, stop in chunk_ranges(orders, chunk_rows):
+        rng = chunk_rng(seed, "orders", start);
+        positions = np.arange(start, stop);
+        product_ids = rng.integers(1, products + 1, stop - start);
+        yield pd.DataFrame({
+            "customer_id": positions % customers + 1,
+            "order_date": (START_DATE + (positions // customers).astype("timedelta64[D]")).astype(str).astype(object),
+            "total_amount": np.round(rng.uniform(5, 500, stop - start), 2),
+            "product_id": product_ids,
+            "product_category": CATEGORIES[product_ids % len(CATEGORIES)],
+            "product_name": numbered("Product ", product_ids),
+        });
+
+
+def iter_deliveries(deliveries, orders, seed, chunk_rows=CHUNK_ROWS):
+    '''
+    Chunks of ./A1/CSV/deliveries.csv rows, delivery i is for order (i mod orders) + 1, in the first 30 days after START_DATE.
+    '''
+    for start, stop in chunk_ranges(deliveries, chunk_rows):
+        rng = chunk_rng(seed, "deliveries", start);
+        order_ids = np.arange(start, stop) % orders + 1;
+        days = rng.integers(1, 31, stop - start);
+        yield pd.DataFrame({
+            "order_id": order_ids,
+            "delivery_date": (START_DATE + days.astype("timedelta64[D]")).astype(str).astype(object),
+            "status": STATUSES[rng.integers(0, len(STATUSES), stop - start)],
+        });
+
+# ======================================================================== [A2] ======================================================================= #
+def iter_customer_changes(customers, rounds, change_fraction, seed, chunk_rows=CHUNK_ROWS):
+    '''
+    SCD change stream of dim_customers: `rounds` daily feeds, each one moving `change_fraction` of the customers
+    to a new city. Yields (round, DataFrame of customer_id, name, email, city) chunks. Cities are numbered by round,
+    so a change never matches an old version.
+    '''
+    changed = max(int(customers * change_fraction), 1);
+    for change_round in range(1, rounds + 1):
+        rng = chunk_rng(seed, "customer_changes", change_round);
+        customer_ids = np.sort(rng.choice(customers, size=min(changed, customers), replace=False) + 1);
+        for start, stop in chunk_ranges(len(customer_ids), chunk_rows):
+            ids = customer_ids[start:stop];
+            yield change_round, pd.DataFrame({
+                "customer_id": ids,
+                "name": numbered("Customer ", ids),
+                "email": "",
+                "city": numbered("", CITIES[ids % len(CITIES)], f" {change_round}"),
+            });
+
+
+def iter_fact_orders(orders, customers, products, seed, days=364, chunk_rows=CHUNK_ROWS):
+    '''
+    Chunks of orders keyed by BUSINESS ids, as fact_loader.load_orders() takes them, spread over `days` days
+    from START_DATE in UTC.
+    '''
+    for start, stop in chunk_ranges(orders, chunk_rows):
+        rng = chunk_rng(seed, "fact_orders", start);
+        seconds = rng.integers(0, days * 86400, stop - start);
+        yield pd.DataFrame({
+            "customer_id": rng.integers(1, customers + 1, stop - start),
+            "product_id": rng.integers(1, products + 1, stop - start),
+            "amount": np.round(rng.uniform(50, 150, stop - start), 2),
+            "order_date": pd.to_datetime(START_DATE.astype("datetime64[s]") + seconds.astype("timedelta64[s]")).tz_localize("UTC"),
+        });
+
+
+# dim_customers and dim_products with %(depth)s consecutive versions per key during the year before START_DATE,
+# the last one still open. Generated by Postgres, so deep histories of many keys are not sent over the network.
+HISTORY_SQL = """
+    INSERT INTO dim_customers (customer_id, name, email, city, valid_start_date, valid_end_date)
+    SELECT k, 'Customer ' || k, '', 'History ' || v,
+        TIMESTAMPTZ '2024-01-01 00:00:00+00' + (v - 1) * (INTERVAL '365 days' / %(depth)s),
+        CASE WHEN v < %(depth)s THEN TIMESTAMPTZ '2024-01-01 00:00:00+00' + v * (INTERVAL '365 days' / %(depth)s) END
+    FROM generate_series(1, %(depth)s) AS v, generate_series(1, %(customers)s) AS k;
+
+    INSERT INTO dim_products (product_id, name, category, price, valid_start_date, valid_end_date)
+    SELECT k, 'Product ' || k, 'Category ' || (k %% 10), 100 + v,
+        TIMESTAMPTZ '2024-01-01 00:00:00+00' + (v - 1) * (INTERVAL '365 days' / %(depth)s),
+        CASE WHEN v < %(depth)s THEN TIMESTAMPTZ '2024-01-01 00:00:00+00' + v * (INTERVAL '365 days' / %(depth)s) END
+    FROM generate_series(1, %(depth)s) AS v, generate_series(1, %(products)s) AS k;
+""";
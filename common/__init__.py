@@ -0,0 +1 @@
+# Modules shared by the A1 and A2 scripts.
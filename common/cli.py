@@ -0,0 +1,78 @@
+import argparse;
+import json;
+from contextlib import contextmanager, nullcontext;
+import dotenv;
+from common import instrument; # --metrics and --profile.
+
+# Same .env file the scripts already read their secrets from, relative to the parent directory.
+ENV_PATH = "./.env";
+
+# ==================================================== [COMMAND LINE] =================================================================== #
+def base_parser(description, modes, default_mode):
+    '''
+    Argument parser with the flags every script shares. Scripts add their own flags to it.
+    The endpoint and password default to DB_ENDPOINT and DB_PASSWORD of the .env file.
+    '''
+    parser = argparse.ArgumentParser(description=description);
+    parser.add_argument("--endpoint", default=None, help="Database endpoint, or localhost (default: DB_ENDPOINT of the .env file).");
+    parser.add_argument("--database", default=None, help="PostgreSQL database name.");
+    parser.add_argument("--mode", choices=modes, default=default_mode);
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per batch / chunk.");
+    parser.add_argument("--dry-run", action="store_true", help="Connect and report what would be done, without writing anything.");
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.");
+    parser.add_argument("--metrics", default=None, help="Record per-operation database metrics and write them here (.prom, .jsonl or .json).");
+    parser.add_argument("--profile", nargs="?", const="", default=None, help="Run under cProfile, print the top functions, and save the profile to this file if given.");
+    return parser;
+
+
+def env_value(key, default=None):
+    '''
+    Returns a value of the .env file, `default` if it is not set.
+    '''
+    value = dotenv.get_key(dotenv_path=ENV_PATH, key_to_get=key);
+    return default if value is None else str(value);
+
+
+def make_result(mode, rows, elapsed, dry_run=False, **details):
+    '''
+    Structured result of a run() function: what was done, how many rows, how long it took and the throughput,
+    plus anything specific to the script in `details`.
+    '''
+    return {
+        "mode": mode,
+        "dry_run": dry_run,
+        "rows": rows,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        **details,
+    };
+
+
+def print_result(result, as_json=False):
+    '''
+    Prints the result of a run, as JSON for other programs, or one line per field.
+    '''
+    if(as_json):
+        print(json.dumps(result, indent=2, default=str));
+        return;
+    for key, value in result.items():
+        print(f"{key}: {value}");
+
+
+@contextmanager
+def instrumentation(args):
+    '''
+    Turns on the instrumentation of ./common/instrument.py and the profiler for the duration of a run, as asked by the
+    --metrics and --profile flags, prints the per-operation summary and writes the metrics file when the run ends.
+    '''
+    if(args.metrics is not None):
+        instrument.enable();
+    profiler = nullcontext() if args.profile is None else instrument.profile(output_path=args.profile or None);
+    try:
+        with profiler:
+            yield;
+    finally:
+        if(args.metrics is not None):
+            print(instrument.METRICS.summary());
+            instrument.METRICS.write(args.metrics);
+            instrument.disable();
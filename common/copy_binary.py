@@ -0,0 +1,366 @@
+import struct;
+from decimal import Decimal, InvalidOperation;
+import numpy as np;
+import pandas as pd;
+from common.copy_text import CopyStream; # File-like object over the encoded chunks.
+
+# Start and end of every binary COPY stream: signature, flags, header extension length, and the -1 field count trailer.
+HEADER = b"PGCOPY\n\xff\r\n\x00" + np.array([0, 0], dtype=">i4").tobytes();
+TRAILER = np.array([-1], dtype=">i2").tobytes();
+
+# Rows encoded at a time.
+CHUNK_ROWS = 100000;
+
+# Dates and timestamps are sent relative to the Postgres epoch.
+PG_EPOCH_DAY = np.datetime64("2000-01-01", "D");
+PG_EPOCH_US = np.datetime64("2000-01-01T00:00:00", "us");
+
+# Sign words of the binary NUMERIC header, Postgres stores NUMERIC in base 10000 digits.
+NUMERIC_POS = 0x0000;
+NUMERIC_NEG = 0x4000;
+NUMERIC_PINF = 0xD000; # Infinity and -Infinity, Postgres 14 and later.
+NUMERIC_NINF = 0xF000;
+NUMERIC_BASE = 10000;
+
+# Decimals tried for a float NUMERIC, the fewest that give back the same float are sent (180.0 as 180, 19.99 as 19.99).
+# Floats that need more, or are too big to scale exactly, are encoded from their Decimal instead.
+NUMERIC_FLOAT_MAX_SCALE = 15;
+
+# Spellings of the column types used in the repo, mapped to the encoder names below.
+TYPE_ALIASES = {
+    "int": "int4", "integer": "int4", "serial": "int4", "smallint": "int2", "bigint": "int8", "bigserial": "int8",
+    "double precision": "float8", "float": "float8", "decimal": "numeric", "boolean": "bool",
+    "timestamp with time zone": "timestamptz", "timestamp without time zone": "timestamp",
+};
+
+# ==================================================== [ENCODERS] =================================================================== #
+# Every encoder takes a pandas Series and returns (fields, used): `fields` is a uint8 matrix with one row per value,
+# holding the 4 byte length of the field followed by its bytes, and `used` is how many bytes of each row are real
+# (the rest is padding). NULLs are a length of -1 with no bytes.
+
+def fixed_fields(data, nulls):
+    '''
+    Fields of a fixed-size type, from a big-endian NumPy array with one value per row.
+    '''
+    size = data.dtype.itemsize;
+    lengths = np.where(nulls, -1, size).astype(">i4");
+    fields = np.hstack([lengths.view(np.uint8).reshape(-1, 4), np.ascontiguousarray(data).view(np.uint8).reshape(-1, size)]);
+    return fields, np.where(nulls, 4, 4 + size);
+
+
+def parse_numbers(series):
+    '''
+    The numbers of a column, with NaN for its NULLs and empty strings. A value that is not a number raises a ValueError
+    instead of being sent as NULL, so the COPY is rolled back like a failed INSERT would be.
+    '''
+    try:
+        return pd.to_numeric(series, errors="raise");
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Column {series.name} has a value that is not a number: {e}") from e;
+
+
+def encode_integer(dtype):
+    '''
+    Encoder of int2 / int4 / int8, values out of the range of the type raise a ValueError instead of wrapping around,
+    and so do values with a fraction (1.7) instead of being truncated. Whole floats such as 116.0 are fine, pandas reads
+    an INT column with blank cells as float64.
+    '''
+    limits = np.iinfo(dtype);
+    def encoder(series):
+        numbers = parse_numbers(series);
+        nulls = numbers.isna().to_numpy();
+        if(pd.api.types.is_float_dtype(numbers.dtype)):
+            floats = numbers.to_numpy(dtype=np.float64, na_value=0.0);
+            if(not np.all(np.isfinite(floats) & (np.floor(floats) == floats))):
+                raise ValueError(f"Column {series.name} has values that are not whole numbers.");
+            # Checked as floats, converting a float out of the int64 range does not raise.
+            if(len(floats) > 0 and (floats.min() < limits.min or floats.max() >= limits.max + 1.0)):
+                raise ValueError(f"Column {series.name} has values out of the range of {np.dtype(dtype).name}.");
+            values = floats.astype(np.int64);
+        else:
+            values = numbers.to_numpy(dtype=np.int64, na_value=0);
+        if(len(values) > 0 and (values.min() < limits.min or values.max() > limits.max)):
+            raise ValueError(f"Column {series.name} has values out of the range of {np.dtype(dtype).name}.");
+        return fixed_fields(values.astype(np.dtype(dtype).newbyteorder(">")), nulls);
+    return encoder;
+
+
+def encode_float8(series):
+    numbers = parse_numbers(series).to_numpy(dtype=np.float64, na_value=np.nan);
+    nulls = np.isnan(numbers);
+    return fixed_fields(numbers.astype(">f8"), nulls);
+
+
+def encode_bool(series):
+    nulls = series.isna().to_numpy();
+    return fixed_fields(series.fillna(False).to_numpy(dtype=bool).astype(np.uint8), nulls);
+
+
+def to_utc_naive(series):
+    '''
+    Parses a column into naive datetime64 values in UTC. Values without a time zone are read as UTC.
+    A value that is not a date raises a ValueError instead of being sent as NULL.
+    '''
+    try:
+        timestamps = pd.to_datetime(series, errors="raise", utc=True);
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Column {series.name} has a value that is not a date: {e}") from e;
+    return timestamps.dt.tz_localize(None);
+
+
+def encode_date(series):
+    timestamps = to_utc_naive(series);
+    nulls = timestamps.isna().to_numpy();
+    days = (timestamps.to_numpy(dtype="datetime64[D]") - PG_EPOCH_DAY).astype(np.int64);
+    return fixed_fields(np.where(nulls, 0, days).astype(">i4"), nulls);
+
+
+def encode_timestamp(series):
+    # timestamp and timestamptz have the same wire format: microseconds since 2000-01-01 (UTC for timestamptz).
+    timestamps = to_utc_naive(series);
+    nulls = timestamps.isna().to_numpy();
+    microseconds = (timestamps.to_numpy(dtype="datetime64[us]") - PG_EPOCH_US).astype(np.int64);
+    return fixed_fields(np.where(nulls, 0, microseconds).astype(">i8"), nulls);
+
+
+def encode_text(series):
+    nulls = series.isna().to_numpy();
+    # Text cannot contain NUL bytes, so the fixed-width bytes array keeps every value whole.
+    values = np.ascontiguousarray(series.where(~nulls, "").astype(str).str.encode("utf-8").to_numpy().astype("S"));
+    if(values.dtype.itemsize == 0):
+        values = values.astype("S1");
+    sizes = np.where(nulls, 0, np.char.str_len(values));
+    lengths = np.where(nulls, -1, sizes).astype(">i4");
+    fields = np.hstack([lengths.view(np.uint8).reshape(-1, 4), values.view(np.uint8).reshape(-1, values.dtype.itemsize)]);
+    return fields, 4 + sizes;
+
+
+def to_decimal(value):
+    '''
+    Exact Decimal of a NUMERIC value, or None for NULL. Floats are read from their shortest repr without trailing zeros
+    (19.99, not the binary expansion, and 180.0 as 180), strings and ints as written.
+    None, NaN and empty strings are NULL, a value that is not a number raises a ValueError.
+    '''
+    if(value is None or (not isinstance(value, str) and pd.isna(value))):
+        return None;
+    try:
+        if(isinstance(value, (float, np.floating))):
+            number = Decimal(repr(float(value)));
+            return number if number.is_infinite() else number.normalize();
+        elif(isinstance(value, (int, np.integer))):
+            return Decimal(int(value));
+        elif(str(value).strip() == ""):
+            return None;
+        number = Decimal(str(value).strip());
+    except (InvalidOperation, ValueError, TypeError) as e:
+        raise ValueError(f"{value!r} is not a number") from e;
+    return None if number.is_nan() else number;
+
+
+def numeric_bytes(number):
+    '''
+    Binary NUMERIC of a Decimal, the same layout as numeric_send(): ndigits, weight, sign and dscale as int2,
+    then the base 10000 digits. The decimal digits are grouped by 4 on each side of the point, so nothing is rounded.
+    '''
+    if(number.is_infinite()):
+        return struct.pack(">hhHH", 0, 0, NUMERIC_NINF if number < 0 else NUMERIC_PINF, 0);
+    sign, digits, exponent = number.as_tuple();
+    text = "".join(map(str, digits));
+    dscale = max(-exponent, 0);
+    if(exponent >= 0):
+        integer_text, fraction_text = text + "0" * exponent, "";
+    else:
+        text = text.rjust(-exponent, "0");
+        integer_text, fraction_text = text[:exponent], text[exponent:];
+    integer_text = integer_text.rjust(-(-len(integer_text) // 4) * 4, "0");
+    fraction_text = fraction_text.ljust(-(-len(fraction_text) // 4) * 4, "0");
+    groups = [int(integer_text[i:i + 4]) for i in range(0, len(integer_text), 4)];
+    weight = len(groups) - 1;
+    groups += [int(fraction_text[i:i + 4]) for i in range(0, len(fraction_text), 4)];
+    # Postgres strips the leading and trailing zero digits, zero itself has none.
+    while(groups and groups[0] == 0):
+        groups.pop(0); weight -= 1;
+    while(groups and groups[-1] == 0):
+        groups.pop();
+    if(not groups):
+        weight = 0; sign = 0;
+    return struct.pack(f">hhHH{len(groups)}h", len(groups), weight, NUMERIC_NEG if sign else NUMERIC_POS, dscale, *groups);
+
+
+def packed_fields(encoded):
+    '''
+    Fields of values encoded one at a time, `encoded` holds the bytes of every value or None for NULL.
+    '''
+    nulls = np.array([value is None for value in encoded], dtype=bool);
+    sizes = np.array([0 if value is None else len(value) for value in encoded], dtype=np.int64);
+    # Fixed-width bytes keep the trailing zero bytes of each value in memory, `sizes` says how many are real.
+    values = np.array([b"" if value is None else value for value in encoded], dtype=f"S{max(int(sizes.max(initial=0)), 1)}");
+    lengths = np.where(nulls, -1, sizes).astype(">i4");
+    fields = np.hstack([lengths.view(np.uint8).reshape(-1, 4), values.view(np.uint8).reshape(-1, values.dtype.itemsize)]);
+    return fields, 4 + sizes;
+
+
+def numeric_fields(magnitude, scale, negative, nulls):
+    '''
+    Binary NUMERIC of many values at once, each one `magnitude` (uint64) * 10^-`scale` (0 to 16), with integer NumPy arrays:
+    the fraction is padded to whole base 10000 digits, split into 5 digits with vectorized divmod, and the leading and
+    trailing zero digits are dropped by moving the first non-zero digit to the front and sending only `ndigits` of them.
+    '''
+    row_count = len(magnitude);
+    fraction_digits = -(-scale // 4);
+    shifted = magnitude * (10 ** (4 * fraction_digits - scale)).astype(np.uint64);
+    powers = np.uint64(NUMERIC_BASE) ** np.arange(4, -1, -1, dtype=np.uint64);
+    groups = (shifted[:, None] // powers) % np.uint64(NUMERIC_BASE);
+
+    nonzero = groups != 0;
+    has_digits = nonzero.any(axis=1);
+    first = np.argmax(nonzero, axis=1);
+    last = 4 - np.argmax(nonzero[:, ::-1], axis=1);
+    ndigits = np.where(has_digits, last - first + 1, 0);
+
+    header = np.empty((row_count, 4), dtype=">i2");
+    header[:, 0] = ndigits;
+    header[:, 1] = np.where(has_digits, 4 - first - fraction_digits, 0); # weight of the first digit sent
+    header[:, 2] = np.where(negative & has_digits, NUMERIC_NEG, NUMERIC_POS);
+    header[:, 3] = scale; # dscale
+    digits = np.take_along_axis(groups, np.minimum(first[:, None] + np.arange(5), 4), axis=1).astype(">i2");
+    data = np.hstack([header.view(np.uint8).reshape(row_count, 8), digits.view(np.uint8).reshape(row_count, 10)]);
+
+    sizes = 8 + 2 * ndigits;
+    lengths = np.where(nulls, -1, sizes).astype(">i4");
+    fields = np.hstack([lengths.view(np.uint8).reshape(-1, 4), data]);
+    return fields, np.where(nulls, 4, 4 + sizes);
+
+
+def replace_rows(fields, used, rows, row_fields, row_used):
+    '''
+    Puts the fields of some rows, encoded another way, into a field matrix, widening whichever is narrower.
+    '''
+    width = max(fields.shape[1], row_fields.shape[1]);
+    fields = np.pad(fields, ((0, 0), (0, width - fields.shape[1])));
+    fields[rows] = np.pad(row_fields, ((0, 0), (0, width - row_fields.shape[1])));
+    used = used.copy();
+    used[rows] = row_used;
+    return fields, used;
+
+
+def encode_numeric_numbers(series):
+    '''
+    encode_numeric() of an integer or float column, without a Python object per value.
+    Integers are sent with scale 0. A float is scaled by the fewest powers of 10 (up to NUMERIC_FLOAT_MAX_SCALE) that give
+    an integer which divides back to the same float, which is the shortest decimal of the float; the few floats
+    that need more digits than a float64 holds exactly, and the infinities, are encoded from their Decimal.
+    '''
+    row_count = len(series);
+    nulls = series.isna().to_numpy();
+    if(pd.api.types.is_integer_dtype(series.dtype)):
+        values = series.to_numpy(dtype=np.int64, na_value=0);
+        # abs() of the smallest int64 wraps around, but its uint64 view is still the right magnitude.
+        return numeric_fields(np.abs(values).astype(np.uint64), np.zeros(row_count, dtype=np.int64), values < 0, nulls);
+
+    numbers = series.to_numpy(dtype=np.float64, na_value=np.nan);
+    nulls = np.isnan(numbers);
+    magnitude = np.abs(np.where(nulls, 0.0, numbers));
+    scale = np.where(nulls, 0, -1);
+    scaled = np.zeros(row_count, dtype=np.float64);
+    for digits in range(NUMERIC_FLOAT_MAX_SCALE + 1):
+        pending = np.flatnonzero(scale < 0);
+        if(len(pending) == 0):
+            break;
+        power = 10.0 ** digits;
+        # Huge floats overflow to inf here, and fail the checks below.
+        with np.errstate(over="ignore"):
+            candidate = np.rint(magnitude[pending] * power);
+        # Whole floats are exact integers below 2^64, scaled fractions have to stay below 2^53 to divide back exactly.
+        exact = (candidate < (2.0 ** 64 if digits == 0 else 2.0 ** 53)) & (candidate / power == magnitude[pending]);
+        scale[pending[exact]] = digits;
+        scaled[pending[exact]] = candidate[exact];
+
+    leftover = np.flatnonzero(scale < 0);
+    fields, used = numeric_fields(scaled.astype(np.uint64), np.maximum(scale, 0), numbers < 0, nulls | (scale < 0));
+    if(len(leftover) > 0):
+        row_fields, row_used = packed_fields([numeric_bytes(to_decimal(numbers[row])) for row in leftover]);
+        fields, used = replace_rows(fields, used, leftover, row_fields, row_used);
+    return fields, used;
+
+
+def encode_numeric(series):
+    '''
+    NUMERIC in its base 10000 wire format. Integer and float columns are encoded with NumPy (see encode_numeric_numbers),
+    object columns (Decimal, string, or mixed values) from the exact decimal digits of every value, one at a time,
+    so any precision and magnitude is kept and the scale is the one written (19.90 stays 19.90).
+    NaN and None are sent as NULL, infinities as Infinity / -Infinity, and a value that is not a number raises a ValueError.
+    '''
+    numeric_dtype = pd.api.types.is_float_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype);
+    # uint64 values can be above the int64 the integer path works with.
+    if(numeric_dtype and not (pd.api.types.is_unsigned_integer_dtype(series.dtype) and series.dtype.itemsize == 8)):
+        return encode_numeric_numbers(series);
+    try:
+        numbers = [to_decimal(value) for value in series];
+    except ValueError as e:
+        raise ValueError(f"Column {series.name} has a value that is not a number: {e}") from e;
+    return packed_fields([None if number is None else numeric_bytes(number) for number in numbers]);
+
+
+ENCODERS = {
+    "int2": encode_integer(np.int16),
+    "int4": encode_integer(np.int32),
+    "int8": encode_integer(np.int64),
+    "float8": encode_float8,
+    "bool": encode_bool,
+    "numeric": encode_numeric,
+    "date": encode_date,
+    "timestamp": encode_timestamp,
+    "timestamptz": encode_timestamp,
+    "text": encode_text,
+};
+
+# ==================================================== [STREAM] =================================================================== #
+def encoder_for(col_type):
+    '''
+    Returns the encoder of a column type, written the way the repo spells it ("int4", "INT", "NUMERIC", "TIMESTAMPTZ", ...).
+    '''
+    col_type = col_type.strip().lower();
+    return ENCODERS[TYPE_ALIASES.get(col_type, col_type)];
+
+
+def encode_frame(df_arg, column_types):
+    '''
+    Encodes the rows of a DataFrame as binary COPY tuples, column-wise: every column is encoded into a padded field
+    matrix, the matrices are laid side by side after the 2 byte field count, and one boolean mask keeps the real bytes.
+    Reading the kept bytes in row order gives the tuples.
+    '''
+    row_count = len(df_arg);
+    if(row_count == 0):
+        return b"";
+    field_count = np.full((row_count, 1), len(df_arg.columns), dtype=">i2");
+    matrices = [field_count.view(np.uint8).reshape(row_count, 2)];
+    masks = [np.ones((row_count, 2), dtype=bool)];
+    for col in df_arg.columns:
+        fields, used = encoder_for(column_types.get(col, "text"))(df_arg[col]);
+        matrices.append(fields);
+        masks.append(np.arange(fields.shape[1]) < used[:, None]);
+    return np.hstack(matrices)[np.hstack(masks)].tobytes();
+
+
+def iter_copy_binary(df_arg, column_types, chunk_rows=CHUNK_ROWS):
+    '''
+    Generator of the binary COPY stream of a DataFrame: the header, the tuples `chunk_rows` rows at a time, and the trailer.
+    `column_types` maps column names to their Postgres types, columns that are not in it are sent as text.
+    '''
+    yield HEADER;
+    for start in range(0, len(df_arg), chunk_rows):
+        yield encode_frame(df_arg.iloc[start:start + chunk_rows], column_types);
+    yield TRAILER;
+
+
+def copy_dataframe(df_arg, table_name, column_types, cursor_arg, chunk_rows=CHUNK_ROWS):
+    '''
+    Sends a DataFrame to `table_name` with COPY FROM STDIN in the binary format, so Postgres does not parse any text.
+    The types in `column_types` MUST be the types of the table columns, binary COPY does not cast. Does NOT commit.
+    Returns the number of rows copied.
+    '''
+    cols = ",".join(list(df_arg.columns));
+    cursor_arg.copy_expert(sql=f"COPY {table_name} ({cols}) FROM STDIN WITH (FORMAT binary)",
+                           file=CopyStream(iter_copy_binary(df_arg, column_types, chunk_rows)));
+    return cursor_arg.rowcount;
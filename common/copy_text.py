@@ -0,0 +1,130 @@
+import numpy as np;
+import pandas as pd;
+
+# How PostgreSQL's COPY text format writes a NULL.
+NULL = b"\\N";
+
+# Rows serialized at a time. Every chunk needs about 2 bytes per character of its widest values, per row.
+CHUNK_ROWS = 100000;
+
+# Column types whose text has to be a whole number, in the spellings used by the repo.
+INTEGER_TYPES = {"int2", "int4", "int8", "smallint", "int", "integer", "bigint", "serial", "bigserial"};
+
+# Characters that mean something in the COPY text format, and how they are escaped inside a text value.
+TEXT_ESCAPES = [("\\", "\\\\"), ("\t", "\\t"), ("\n", "\\n"), ("\r", "\\r")];
+
+# ==================================================== [SERIALIZATION] =================================================================== #
+def whole_numbers(series):
+    '''
+    A float column as Int64, for an integer table column: pandas reads an INT column with blank cells as float64,
+    and Postgres does not accept 116.0 as an integer. Values with a fraction raise a ValueError instead of being truncated.
+    '''
+    numbers = series.to_numpy(dtype=np.float64, na_value=np.nan);
+    present = ~np.isnan(numbers);
+    if(not np.all(np.isfinite(numbers[present]) & (np.floor(numbers[present]) == numbers[present]))):
+        raise ValueError(f"Column {series.name} has values that are not whole numbers.");
+    return series.astype("Int64");
+
+
+def render_column(series, col_type=None):
+    '''
+    Renders one column into the COPY text of each of its values, as ONE fixed-width NumPy bytes array.
+    Numbers, booleans and timestamps are converted by NumPy in C, without a Python object per value.
+    Text columns are escaped with the vectorized pandas string methods. NULLs (None, NaN, NaT, pd.NA) become \\N.
+    `col_type` is the type of the table column, float columns going to an integer column are written without ".0".
+    '''
+    if(col_type is not None and col_type.strip().lower() in INTEGER_TYPES and pd.api.types.is_float_dtype(series.dtype)):
+        series = whole_numbers(series);
+    nulls = series.isna().to_numpy();
+    if(pd.api.types.is_bool_dtype(series.dtype)):
+        values = np.where(series.fillna(False).to_numpy(dtype=bool), b"t", b"f");
+    elif(pd.api.types.is_integer_dtype(series.dtype)):
+        values = series.fillna(0).to_numpy(dtype=np.int64).astype("S20");
+    elif(pd.api.types.is_float_dtype(series.dtype)):
+        numbers = series.to_numpy(dtype=np.float64, na_value=np.nan);
+        # NumPy writes the shortest text that parses back to the same float, infinities are spelled the Postgres way.
+        values = np.where(np.isposinf(numbers), b"Infinity", np.where(np.isneginf(numbers), b"-Infinity", numbers.astype("S32")));
+    elif(pd.api.types.is_datetime64_any_dtype(series.dtype)):
+        suffix = b"";
+        if(getattr(series.dt, "tz", None) is not None):
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None);
+            suffix = b"+00";
+        values = series.to_numpy(dtype="datetime64[us]").astype("S26");
+        if(len(suffix) > 0):
+            values = np.char.add(values, suffix);
+    else:
+        text = series.where(~nulls, "").astype(str);
+        for character, escaped in TEXT_ESCAPES:
+            text = text.str.replace(character, escaped, regex=False);
+        values = text.str.encode("utf-8").to_numpy().astype("S");
+    return np.ascontiguousarray(np.where(nulls, NULL, values));
+
+
+def encode_frame(df_arg, column_types=None):
+    '''
+    Serializes a DataFrame into COPY text (tab between columns, newline after each row), column-wise:
+    every column is rendered into a fixed-width byte matrix, the matrices and the separators are laid side by side,
+    and one boolean mask keeps the bytes that are not padding. Reading the kept bytes in row order gives the rows.
+    `column_types` maps column names to the types of the table columns, see render_column().
+    '''
+    column_types = column_types or {};
+    row_count = len(df_arg);
+    if(row_count == 0):
+        return b"";
+    column_count = len(df_arg.columns);
+    matrices = []; masks = [];
+    for position, col in enumerate(df_arg.columns):
+        values = render_column(df_arg[col], column_types.get(col));
+        width = values.dtype.itemsize;
+        matrices.append(values.view(np.uint8).reshape(row_count, width));
+        masks.append(np.arange(width) < np.char.str_len(values)[:, None]);
+
+        separator = b"\n" if position == column_count - 1 else b"\t";
+        matrices.append(np.full((row_count, 1), separator[0], dtype=np.uint8));
+        masks.append(np.ones((row_count, 1), dtype=bool));
+    return np.hstack(matrices)[np.hstack(masks)].tobytes();
+
+
+def iter_copy_text(df_arg, chunk_rows=CHUNK_ROWS, column_types=None):
+    '''
+    Generator of the COPY text of a DataFrame, `chunk_rows` rows at a time, so the padded matrices stay small.
+    '''
+    for start in range(0, len(df_arg), chunk_rows):
+        yield encode_frame(df_arg.iloc[start:start + chunk_rows], column_types);
+
+
+class CopyStream:
+    '''
+    Read-only file-like object over an iterator of byte chunks, which is what cursor.copy_expert() reads from.
+    Chunks are only produced when COPY asks for more data.
+    '''
+    def __init__(self, chunks):
+        self._chunks = iter(chunks);
+        self._buffer = bytearray();
+
+    def read(self, size=-1):
+        while(size < 0 or len(self._buffer) < size):
+            chunk = next(self._chunks, None);
+            if(chunk is None):
+                break;
+            self._buffer.extend(chunk);
+        if(size < 0 or size >= len(self._buffer)):
+            data = bytes(self._buffer);
+            self._buffer.clear();
+            return data;
+        data = bytes(self._buffer[:size]);
+        del self._buffer[:size];
+        return data;
+
+
+def copy_dataframe(df_arg, table_name, cursor_arg, chunk_rows=CHUNK_ROWS, column_types=None):
+    '''
+    Sends a DataFrame to `table_name` with COPY FROM STDIN, in the text format produced by iter_copy_text().
+    The DataFrame columns must have the names of the table columns. `column_types` are the types of the table columns
+    (only the integer ones matter, see render_column). Does NOT commit.
+    Returns the number of rows copied.
+    '''
+    cols = ",".join(list(df_arg.columns));
+    cursor_arg.copy_expert(sql=f"COPY {table_name} ({cols}) FROM STDIN",
+                           file=CopyStream(iter_copy_text(df_arg, chunk_rows, column_types)));
+    return cursor_arg.rowcount;
@@ -0,0 +1,136 @@
+import threading; # The pool is shared by worker threads.
+from contextlib import contextmanager;
+import dotenv;
+from psycopg2 import pool; # ThreadedConnectionPool, psycopg2's thread safe connection pool.
+from common import instrument; # Timing and counting of the statements, when enabled.
+
+# Same .env file the scripts already read their secrets from, relative to the parent directory.
+ENV_PATH = "./.env";
+
+# Pool size, can be overwritten with DB_POOL_MIN and DB_POOL_MAX in the .env file.
+DEFAULT_MIN_CONN = 1;
+DEFAULT_MAX_CONN = 8;
+
+# One manager per database, so every caller in a process reuses the same open connections.
+_managers = {};
+_managers_lock = threading.Lock();
+
+# ==================================================== [CONNECTION MANAGER] =================================================================== #
+class ConnectionManager:
+    '''
+    Pool of psycopg2 connections to ONE database, shared by all the helpers and worker threads of a script.
+    Connections are opened once and handed out again, so each query does not pay for a new TCP + TLS + auth
+    handshake against RDS. When every connection is in use, callers wait for one to be returned
+    instead of failing.
+
+    ## Usage:
+    - `with manager.connection() as conn:` borrows a connection, and returns it to the pool afterwards.
+    - `with manager.transaction() as (conn, cursor):` also commits at the end, or rolls back if an exception is raised.
+    '''
+    def __init__(self, host, database, user="postgres", password=None, port=5432, min_conn=DEFAULT_MIN_CONN, max_conn=DEFAULT_MAX_CONN, **connect_kwargs):
+        self.connect_kwargs = dict(host=host, database=database, user=user, password=password, port=port, **connect_kwargs);
+        self.max_conn = max_conn;
+        self._pool = pool.ThreadedConnectionPool(min_conn, max_conn, **self.connect_kwargs);
+        # ThreadedConnectionPool raises when it runs out, the semaphore makes callers wait instead.
+        self._available = threading.BoundedSemaphore(max_conn);
+
+    def getconn(self):
+        '''
+        Borrows a connection from the pool, waits if all of them are in use.
+        Every connection borrowed MUST be given back with putconn().
+        '''
+        self._available.acquire();
+        try:
+            return self._pool.getconn();
+        except Exception:
+            self._available.release();
+            raise;
+
+    def putconn(self, conn):
+        '''
+        Gives a connection back to the pool. Anything that was not committed is rolled back first,
+        so the next caller never starts in the middle of someone else's transaction.
+        '''
+        try:
+            if(conn.closed == 0):
+                conn.rollback();
+            self._pool.putconn(conn, close=(conn.closed != 0));
+        finally:
+            self._available.release();
+
+    @contextmanager
+    def connection(self):
+        '''
+        Borrows a connection for the duration of a `with` block.
+        '''
+        conn = self.getconn();
+        try:
+            yield conn;
+        finally:
+            self.putconn(conn);
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Borrows a connection and a cursor for one transaction. Commits when the `with` block ends,
+        or rolls back everything if an exception was raised inside it.
+        '''
+        with self.connection() as conn:
+            cursor = conn.cursor();
+            try:
+                yield conn, cursor;
+                conn.commit();
+            except Exception:
+                conn.rollback();
+                raise;
+            finally:
+                cursor.close();
+
+    def close(self):
+        '''
+        Closes every connection of the pool.
+        '''
+        self._pool.closeall();
+
+# ==================================================== [FUNCTIONS] =================================================================== #
+def get_manager(host, database, user="postgres", password=None, port=5432, min_conn=None, max_conn=None, **connect_kwargs):
+    '''
+    Returns the ConnectionManager of a database, creating it the first time it is asked for.
+    The pool size comes from the arguments, then DB_POOL_MIN / DB_POOL_MAX in the .env file, then the defaults
+    (it is only used when the pool is created).
+    Raises a ValueError if max_conn is given and the pool of that database is already open with another size,
+    for example load.run(workers=N) after a smaller pool was created: close it first (close_all()).
+    '''
+    requested_max = max_conn;
+    if(min_conn is None):
+        min_conn = int(dotenv.get_key(dotenv_path=ENV_PATH, key_to_get="DB_POOL_MIN") or DEFAULT_MIN_CONN);
+    if(max_conn is None):
+        max_conn = int(dotenv.get_key(dotenv_path=ENV_PATH, key_to_get="DB_POOL_MAX") or DEFAULT_MAX_CONN);
+    max_conn = max(min_conn, max_conn);
+    # DB_INSTRUMENT=1 in the .env file turns the instrumentation on for every script.
+    if(str(dotenv.get_key(dotenv_path=ENV_PATH, key_to_get="DB_INSTRUMENT") or "0") == "1"):
+        instrument.enable();
+    if(instrument.ENABLED):
+        connect_kwargs.setdefault("connection_factory", instrument.InstrumentedConnection);
+
+    key = (host, port, database, user);
+    with _managers_lock:
+        manager = _managers.get(key);
+        if(manager is None):
+            manager = ConnectionManager(host, database, user=user, password=password, port=port,
+                                        min_conn=min_conn, max_conn=max_conn, **connect_kwargs);
+            _managers[key] = manager;
+        elif(requested_max is not None and max_conn != manager.max_conn):
+            raise ValueError(f"The pool of {database} is already open with max_conn={manager.max_conn}, not {max_conn}, "
+                             f"close it first (db.close_all())");
+        return manager;
+
+
+def close_all():
+    '''
+    Closes the pools of every database, call it once when the script is finished.
+    '''
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.close();
+        _managers.clear();
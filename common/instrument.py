@@ -0,0 +1,377 @@
+import bisect; import cProfile; import functools; import json; import pstats; import threading; import time;
+from contextlib import contextmanager;
+from psycopg2 import extensions; # Base cursor and connection classes.
+
+# Instrumentation of the database hot paths: every statement, COPY, fetch, commit and rollback sent through an
+# InstrumentedConnection is timed and counted, and charged to the operations (@traced helpers) running at that moment.
+# Nothing is recorded until enable() is called (or DB_INSTRUMENT=1 is in the .env file, see db.get_manager),
+# and the @traced helpers cost one flag check when it is off.
+#
+# Per operation: a latency histogram of its calls, and its round trips, rows, bytes sent, commits, rollbacks and
+# the time spent serializing COPY data, all inclusive of the operations it calls
+# (update_customer_city() also counts the statements of the get_current_customer() it calls).
+# Per statement kind (SELECT, INSERT, COPY, FETCH, COMMIT, ...): a latency histogram, rows and bytes sent.
+
+# Upper bounds of the histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0);
+
+# Name of the statements run outside of any @traced operation.
+UNTRACED = "untraced";
+
+ENABLED = False;
+_local = threading.local(); # Stack of the operations running on each thread.
+
+# ==================================================== [METRICS] =================================================================== #
+class Histogram:
+    '''
+    Counts of observations per LATENCY_BUCKETS bucket, plus their sum, like a Prometheus histogram.
+    '''
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets;
+        self.counts = [0] * (len(buckets) + 1); # The last one is +Inf.
+        self.total = 0.0;
+        self.count = 0;
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1;
+        self.total += seconds;
+        self.count += 1;
+
+    def quantile(self, q):
+        '''
+        Upper bound of the bucket holding the q-th quantile (what Prometheus' histogram_quantile estimates from).
+        '''
+        if(self.count == 0):
+            return 0.0;
+        rank = q * self.count; seen = 0;
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count;
+            if(seen >= rank):
+                return bound;
+        return float("inf");
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts)),
+        };
+
+
+def new_counters():
+    return {"round_trips": 0, "rows": 0, "bytes_sent": 0, "commits": 0, "rollbacks": 0, "serialization_seconds": 0.0};
+
+
+class Metrics:
+    '''
+    Thread-safe registry of the operation and statement metrics of the process.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock();
+        self.reset();
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}; # name -> {"calls": Histogram, counters...}
+            self.statements = {}; # kind -> {"latency": Histogram, "rows": n, "bytes_sent": n}
+
+    def _charge(self, **counters):
+        # Every operation on the stack of this thread, or UNTRACED.
+        for name in (active_operations() or [UNTRACED]):
+            operation = self.operations.setdefault(name, {"calls": Histogram(), **new_counters()});
+            for key, value in counters.items():
+                operation[key] += value;
+
+    def record_call(self, name, seconds):
+        with self._lock:
+            operation = self.operations.setdefault(name, {"calls": Histogram(), **new_counters()});
+            operation["calls"].observe(seconds);
+
+    def record_statement(self, kind, seconds, rows=0, bytes_sent=0, serialization_seconds=0.0, round_trips=1):
+        with self._lock:
+            statement = self.statements.setdefault(kind, {"latency": Histogram(), "rows": 0, "bytes_sent": 0});
+            statement["latency"].observe(seconds);
+            statement["rows"] += max(rows, 0);
+            statement["bytes_sent"] += bytes_sent;
+            self._charge(round_trips=round_trips, rows=max(rows, 0), bytes_sent=bytes_sent,
+                         serialization_seconds=serialization_seconds,
+                         commits=1 if kind == "COMMIT" else 0, rollbacks=1 if kind == "ROLLBACK" else 0);
+
+    def snapshot(self):
+        '''
+        All the metrics as one JSON-serializable dict.
+        '''
+        with self._lock:
+            operations = {};
+            for name, operation in self.operations.items():
+                calls = operation["calls"].count;
+                operations[name] = {
+                    "calls": operation["calls"].to_dict(),
+                    **{key: (round(value, 6) if isinstance(value, float) else value) for key, value in operation.items() if key != "calls"},
+                    # Per call, what the instrumentation is mostly read for.
+                    "round_trips_per_call": round(operation["round_trips"] / calls, 2) if calls > 0 else None,
+                    "commits_per_call": round(operation["commits"] / calls, 2) if calls > 0 else None,
+                };
+            statements = {kind: {"latency": statement["latency"].to_dict(), "rows": statement["rows"], "bytes_sent": statement["bytes_sent"]}
+                          for kind, statement in self.statements.items()};
+        return {"operations": operations, "statements": statements};
+
+    def to_prometheus(self):
+        '''
+        All the metrics in the Prometheus text exposition format.
+        '''
+        lines = [];
+        def histogram(metric, label, values):
+            lines.append(f"# TYPE {metric} histogram");
+            for value, hist in values:
+                cumulative = 0;
+                for bound, count in zip([str(bound) for bound in hist.buckets] + ["+Inf"], hist.counts):
+                    cumulative += count;
+                    lines.append(f'{metric}_bucket{{{label}="{escape_label(value)}",le="{bound}"}} {cumulative}');
+                lines.append(f'{metric}_sum{{{label}="{escape_label(value)}"}} {hist.total}');
+                lines.append(f'{metric}_count{{{label}="{escape_label(value)}"}} {hist.count}');
+        def counter(metric, label, values):
+            lines.append(f"# TYPE {metric} counter");
+            for value, number in values:
+                lines.append(f'{metric}{{{label}="{escape_label(value)}"}} {number}');
+
+        with self._lock:
+            histogram("db_operation_seconds", "operation", [(name, op["calls"]) for name, op in self.operations.items()]);
+            for key in new_counters():
+                counter(f"db_operation_{key}_total", "operation", [(name, op[key]) for name, op in self.operations.items()]);
+            histogram("db_statement_seconds", "kind", [(kind, st["latency"]) for kind, st in self.statements.items()]);
+            counter("db_statement_rows_total", "kind", [(kind, st["rows"]) for kind, st in self.statements.items()]);
+            counter("db_statement_bytes_sent_total", "kind", [(kind, st["bytes_sent"]) for kind, st in self.statements.items()]);
+        return "\n".join(lines) + "\n";
+
+    def log_lines(self):
+        '''
+        One JSON line per operation and per statement kind, for structured logs.
+        '''
+        snapshot = self.snapshot();
+        for name, operation in snapshot["operations"].items():
+            yield json.dumps({"event": "db_operation", "operation": name, **operation});
+        for kind, statement in snapshot["statements"].items():
+            yield json.dumps({"event": "db_statement", "kind": kind, **statement});
+
+    def summary(self):
+        '''
+        One line per operation: calls, p50 / p99, and round trips, commits and rows per call.
+        '''
+        lines = [];
+        for name, operation in sorted(self.snapshot()["operations"].items()):
+            calls = operation["calls"];
+            lines.append(f"{name:>28}: {calls['count']:>7} calls  p50 <= {calls['p50_seconds'] * 1000:g} ms  "
+                         f"p99 <= {calls['p99_seconds'] * 1000:g} ms  {operation['round_trips_per_call']} round trips/call  "
+                         f"{operation['commits_per_call']} commits/call  {operation['rows']} rows  {operation['bytes_sent']} bytes sent");
+        return "\n".join(lines);
+
+    def write(self, path):
+        '''
+        Writes the metrics to a file: Prometheus text for .prom / .txt files, JSON lines for .jsonl, JSON otherwise.
+        '''
+        with open(path, "w") as output_file:
+            if(path.endswith(".prom") or path.endswith(".txt")):
+                output_file.write(self.to_prometheus());
+            elif(path.endswith(".jsonl")):
+                output_file.write("\n".join(self.log_lines()) + "\n");
+            else:
+                json.dump(self.snapshot(), output_file, indent=2);
+
+
+METRICS = Metrics();
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n");
+
+# ==================================================== [OPERATIONS] =================================================================== #
+def enable():
+    global ENABLED;
+    ENABLED = True;
+
+
+def disable():
+    global ENABLED;
+    ENABLED = False;
+
+
+def active_operations():
+    return getattr(_local, "stack", []);
+
+
+@contextmanager
+def operation(name):
+    '''
+    Charges everything sent to the database inside the `with` block to the operation `name`, and times it as one call.
+    '''
+    if(not ENABLED):
+        yield;
+        return;
+    stack = getattr(_local, "stack", None);
+    if(stack is None):
+        stack = _local.stack = [];
+    # An operation that calls itself (recursion) is only counted once.
+    nested = name in stack;
+    if(not nested):
+        stack.append(name);
+    start_time = time.perf_counter();
+    try:
+        yield;
+    finally:
+        if(not nested):
+            stack.pop();
+            METRICS.record_call(name, time.perf_counter() - start_time);
+
+
+def traced(function=None, name=None):
+    '''
+    Decorator that runs a helper as an operation (see operation()), named after the function by default.
+    '''
+    def decorate(function):
+        label = name or function.__name__;
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if(not ENABLED):
+                return function(*args, **kwargs);
+            with operation(label):
+                return function(*args, **kwargs);
+        return wrapper;
+    return decorate(function) if function is not None else decorate;
+
+# ==================================================== [PSYCOPG2] =================================================================== #
+def statement_kind(query):
+    '''
+    First keyword of the SQL that was sent (SELECT, INSERT, WITH, ...).
+    '''
+    if(isinstance(query, bytes)):
+        query = query.decode("utf-8", errors="replace");
+    words = str(query or "").split(None, 1);
+    return words[0].upper() if len(words) > 0 else "OTHER";
+
+
+class CountingReader:
+    '''
+    File-like wrapper of the data given to copy_expert(), counts the bytes COPY reads and the time spent producing them
+    (the serialization, for the CopyStream of ./common/copy_text.py and ./common/copy_binary.py).
+    '''
+    def __init__(self, file):
+        self._file = file;
+        self.bytes_read = 0;
+        self.seconds = 0.0;
+
+    def read(self, size=-1):
+        start_time = time.perf_counter();
+        data = self._file.read(size);
+        self.seconds += time.perf_counter() - start_time;
+        self.bytes_read += len(data);
+        return data;
+
+    def readline(self, size=-1):
+        start_time = time.perf_counter();
+        data = self._file.readline(size);
+        self.seconds += time.perf_counter() - start_time;
+        self.bytes_read += len(data);
+        return data;
+
+
+class InstrumentedCursor(extensions.cursor):
+    '''
+    psycopg2 cursor that records every round trip it makes in METRICS (when instrumentation is enabled).
+    '''
+    def execute(self, query, vars=None):
+        if(not ENABLED):
+            return super().execute(query, vars);
+        start_time = time.perf_counter();
+        try:
+            return super().execute(query, vars);
+        finally:
+            sent = self.query or b"";
+            METRICS.record_statement(statement_kind(sent or query), time.perf_counter() - start_time, self.rowcount, len(sent));
+
+    def executemany(self, query, vars_list):
+        if(not ENABLED):
+            return super().executemany(query, vars_list);
+        vars_list = list(vars_list);
+        start_time = time.perf_counter();
+        try:
+            return super().executemany(query, vars_list);
+        finally:
+            # One round trip per row, only the last query is kept by psycopg2.
+            METRICS.record_statement(statement_kind(query), time.perf_counter() - start_time, self.rowcount,
+                                     len(self.query or b"") * len(vars_list), round_trips=len(vars_list));
+
+    def copy_expert(self, sql, file, size=8192):
+        if(not ENABLED):
+            return super().copy_expert(sql, file, size);
+        reader = CountingReader(file);
+        start_time = time.perf_counter();
+        try:
+            return super().copy_expert(sql, reader, size);
+        finally:
+            METRICS.record_statement("COPY", time.perf_counter() - start_time, self.rowcount,
+                                     reader.bytes_read, serialization_seconds=reader.seconds);
+
+    def _fetch(self, method, *args):
+        # Named (server-side) cursors make a round trip for every fetch, client-side ones read from memory.
+        if(not ENABLED or self.name is None):
+            return method(*args);
+        start_time = time.perf_counter();
+        rows = method(*args);
+        METRICS.record_statement("FETCH", time.perf_counter() - start_time, len(rows) if isinstance(rows, list) else int(rows is not None));
+        return rows;
+
+    def fetchone(self):
+        return self._fetch(super().fetchone);
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size);
+
+    def fetchall(self):
+        return self._fetch(super().fetchall);
+
+
+class InstrumentedConnection(extensions.connection):
+    '''
+    psycopg2 connection whose cursors are InstrumentedCursors, and whose commits and rollbacks are recorded.
+    Pass it as `connection_factory` to psycopg2.connect() or to the pool (db.get_manager does when instrumentation is on).
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs);
+        self.cursor_factory = InstrumentedCursor;
+
+    def commit(self):
+        if(not ENABLED):
+            return super().commit();
+        start_time = time.perf_counter();
+        try:
+            return super().commit();
+        finally:
+            METRICS.record_statement("COMMIT", time.perf_counter() - start_time);
+
+    def rollback(self):
+        if(not ENABLED):
+            return super().rollback();
+        start_time = time.perf_counter();
+        try:
+            return super().rollback();
+        finally:
+            METRICS.record_statement("ROLLBACK", time.perf_counter() - start_time);
+
+# ==================================================== [PROFILER] =================================================================== #
+@contextmanager
+def profile(output_path=None, top=25, sort="cumulative"):
+    '''
+    Runs the `with` block under cProfile and prints the `top` functions by cumulative time when it ends.
+    With `output_path`, the raw profile is also saved, so it can be opened as a flame graph (snakeviz, flameprof).
+    '''
+    profiler = cProfile.Profile();
+    profiler.enable();
+    try:
+        yield profiler;
+    finally:
+        profiler.disable();
+        if(output_path is not None):
+            profiler.dump_stats(output_path);
+        pstats.Stats(profiler).strip_dirs().sort_stats(sort).print_stats(top);
@@ -0,0 +1,89 @@
+import hashlib;
+import threading; # The registry is shared by worker threads.
+import weakref; # Forgets a connection when it is closed and collected.
+from psycopg2 import sql;
+
+# Registry of server-side prepared statements for the single-row helpers.
+# Every distinct statement is sent once per connection with PREPARE, then run with a short EXECUTE name (params),
+# so Postgres parses and plans it once per session instead of on every call. Statements use $1, $2, ... for their
+# parameters, psycopg2 fills in the values of the EXECUTE.
+
+# Statement name of every SQL text seen, the same in every connection.
+_names = {};
+# Names already PREPAREd on each connection.
+_prepared = weakref.WeakKeyDictionary();
+# INSERT statements composed by insert_statement(), keyed by (table, columns, returning column).
+_inserts = {};
+_lock = threading.Lock();
+
+# ==================================================== [REGISTRY] =================================================================== #
+def statement_name(statement):
+    '''
+    Name of a statement, derived from its text, so the same text is only prepared once per connection.
+    '''
+    with _lock:
+        name = _names.get(statement);
+        if(name is None):
+            name = "stmt_" + hashlib.sha1(statement.encode()).hexdigest()[:16];
+            _names[statement] = name;
+        return name;
+
+
+def prepare(statement, cursor_arg):
+    '''
+    PREPAREs a statement on the connection of the cursor, unless it already is.
+    Prepared statements belong to the session, not to the transaction: a rollback does not undo them.
+
+    ## Returns:
+    - The name of the prepared statement.
+    '''
+    name = statement_name(statement);
+    conn = cursor_arg.connection;
+    with _lock:
+        prepared = _prepared.setdefault(conn, set());
+        if(name in prepared):
+            return name;
+    cursor_arg.execute(f"PREPARE {name} AS {statement}");
+    with _lock:
+        prepared.add(name);
+    return name;
+
+
+def execute(statement, params, cursor_arg):
+    '''
+    Runs a statement with $1, $2, ... parameters as a prepared statement: PREPARE the first time it is used on
+    the connection, then only EXECUTE with the values of `params`. Rows are fetched from the cursor as usual.
+    '''
+    name = prepare(statement, cursor_arg);
+    if(len(params) == 0):
+        cursor_arg.execute(f"EXECUTE {name}");
+    else:
+        cursor_arg.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params);
+
+
+def forget(conn):
+    '''
+    Forgets what was prepared on a connection, for example after DISCARD ALL.
+    '''
+    with _lock:
+        _prepared.pop(conn, None);
+
+# ==================================================== [STATEMENTS] =================================================================== #
+def insert_statement(table_name, columns, returning_col, cursor_arg):
+    '''
+    INSERT INTO table_name (columns) VALUES ($1, ...) RETURNING returning_col, with quoted identifiers.
+    Composed once per (table, columns, returning column) and cached as text, ready for execute().
+    '''
+    key = (table_name, tuple(columns), returning_col);
+    with _lock:
+        statement = _inserts.get(key);
+    if(statement is None):
+        statement = sql.SQL("INSERT INTO {table} ({fields}) VALUES ({placeholders}) RETURNING {returning}").format(
+            table=sql.Identifier(table_name),
+            fields=sql.SQL(", ").join(map(sql.Identifier, columns)),
+            placeholders=sql.SQL(", ").join(sql.SQL(f"${position}") for position in range(1, len(columns) + 1)),
+            returning=sql.Identifier(returning_col)
+        ).as_string(cursor_arg);
+        with _lock:
+            _inserts[key] = statement;
+    return statement;
@@ -0,0 +1,46 @@
+import pytest;
+
+pd = pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import aggregates;
+import fact_loader;
+import scd_batch;
+
+START = pd.Timestamp("2025-01-01 00:00:00", tz="UTC");
+BOUNDARY = pd.Timestamp("2025-03-01 00:00:00", tz="UTC");
+
+
+def reports(cursor, conn):
+    return (sorted(aggregates.customer_city_counts(cursor, conn)), sorted(aggregates.city_sales(cursor, conn)),
+            sorted(aggregates.product_discounts(cursor, conn)));
+
+
+def test_batch_loads_keep_the_aggregates_up_to_date(pg_conn):
+    cursor = pg_conn.cursor();
+    aggregates.ensure_aggregate_tables(pg_conn, cursor);
+    cursor.execute(
+        query="""
+        INSERT INTO dim_customers (customer_id, name, email, city, valid_start_date, valid_end_date)
+        VALUES (1, 'Alice', '', 'New York', %(start)s, %(boundary)s), (1, 'Alice', '', 'Chicago', %(boundary)s, NULL);
+        INSERT INTO dim_products (product_id, name, category, price, valid_start_date)
+        VALUES (1, 'Laptop', 'Electronics', 1000, %(start)s);
+        """,
+        vars={"start": START.to_pydatetime(), "boundary": BOUNDARY.to_pydatetime()}
+    );
+    pg_conn.commit();
+    assert aggregates.rebuild_aggregates(pg_conn, cursor) == 1;
+
+    orders_df = pd.DataFrame({"customer_id": [1, 1, 1], "product_id": [1, 1, 1], "amount": [1000, 900, 950],
+                              "order_date": [START, BOUNDARY, BOUNDARY + pd.Timedelta(days=1)]});
+    assert fact_loader.load_orders(orders_df, pg_conn, cursor, refresh_aggregates=True) is not None;
+    products_df = pd.DataFrame({"product_id": [1, 2], "name": ["Laptop", "Phone"], "category": ["Electronics", "Electronics"],
+                                "price": [800, 500]});
+    assert scd_batch.merge_products(products_df, pg_conn, cursor, refresh_aggregates=True) is not None;
+    refreshed = reports(cursor, pg_conn);
+
+    # The refreshed tables hold the same reports as a rebuild from scratch.
+    assert aggregates.rebuild_aggregates(pg_conn, cursor) == 1;
+    assert refreshed == reports(cursor, pg_conn);
+    # The order placed at BOUNDARY counts for Chicago only.
+    assert [(city, float(total)) for _, _, city, total in refreshed[1]] == [("Chicago", 1850.0), ("New York", 1000.0)];
@@ -0,0 +1,35 @@
+import pytest;
+
+pd = pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import asof_index;
+import fact_loader;
+
+START = pd.Timestamp("2025-01-01 00:00:00", tz="UTC");
+BOUNDARY = pd.Timestamp("2025-03-01 00:00:00", tz="UTC");
+
+
+def build_index(table_name, versions):
+    index = asof_index.AsOfIndex(table_name);
+    index.build(pd.DataFrame(versions));
+    return index;
+
+
+def test_orders_are_resolved_in_memory_with_the_half_open_rule():
+    customer_index = build_index("dim_customers", {
+        "id": [10, 11], "customer_id": [1, 1], "name": ["Alice", "Alice"], "email": ["", ""], "city": ["New York", "Chicago"],
+        "valid_start_date": [START, BOUNDARY], "valid_end_date": [BOUNDARY, None]});
+    # Product 2 was retired without a new version.
+    product_index = build_index("dim_products", {
+        "id": [20, 21], "product_id": [1, 2], "name": ["Laptop", "Phone"], "category": ["Electronics", "Electronics"],
+        "price": [1000, 500], "valid_start_date": [START, START], "valid_end_date": [None, BOUNDARY]});
+    orders_df = pd.DataFrame({"customer_id": [1, 1, 1, 3], "product_id": [1, 1, 2, 1], "amount": [1, 2, 3, 4],
+                              "order_date": [START, BOUNDARY, BOUNDARY, BOUNDARY]});
+
+    resolved_df = fact_loader.resolve_in_memory(orders_df, customer_index, product_index);
+
+    # The order at BOUNDARY gets the new customer version, the retired product and the unknown customer are dropped.
+    assert resolved_df["amount"].tolist() == [1, 2];
+    assert resolved_df["customer_id"].tolist() == [10, 11];
+    assert resolved_df["product_id"].tolist() == [20, 20];
@@ -0,0 +1,105 @@
+import struct;
+from decimal import Decimal, localcontext;
+import pytest;
+
+pytest.importorskip("numpy");
+pd = pytest.importorskip("pandas");
+from common import copy_binary;
+
+
+def decode_numeric(field):
+    '''
+    Value and dscale of one binary NUMERIC field, the way numeric_recv() reads it.
+    '''
+    ndigits, weight, sign, dscale = struct.unpack(">hhHH", field[:8]);
+    groups = struct.unpack(f">{ndigits}h", field[8:]);
+    with localcontext() as context:
+        # Wide enough for every value of the tests, the default context rounds to 28 digits.
+        context.prec = 100;
+        value = sum((Decimal(group).scaleb(4 * (weight - position)) for position, group in enumerate(groups)), Decimal(0));
+    return (-value if sign == copy_binary.NUMERIC_NEG else value), dscale;
+
+
+def test_numeric_bytes_layout():
+    # 19.99 is the base 10000 digits 19 and 9900, the first one of weight 0.
+    assert copy_binary.numeric_bytes(Decimal("19.99")) == struct.pack(">hhHH2h", 2, 0, 0, 2, 19, 9900);
+    assert copy_binary.numeric_bytes(Decimal("10000")) == struct.pack(">hhHH1h", 1, 1, 0, 0, 1);
+    assert copy_binary.numeric_bytes(Decimal("-0.00")) == struct.pack(">hhHH", 0, 0, 0, 2);
+
+
+@pytest.mark.parametrize("value", ["19.90", "-0.0001", "1E+16", "12345678901234567890.123456789", "99999999999999999.99"])
+def test_numeric_keeps_every_digit(value):
+    number = Decimal(value);
+    assert decode_numeric(copy_binary.numeric_bytes(number)) == (number, max(-number.as_tuple().exponent, 0));
+
+
+def test_encode_numeric_nulls_and_mixed_inputs():
+    series = pd.Series([Decimal("10000000000000001"), "2.50", 19.99, 7, None, float("nan"), ""], dtype=object);
+    fields, used = copy_binary.encode_numeric(series);
+
+    decoded = [];
+    for row, size in zip(fields, used):
+        length = struct.unpack(">i", row[:4].tobytes())[0];
+        decoded.append(None if length == -1 else decode_numeric(row[4:size].tobytes())[0]);
+        assert length == -1 or length == size - 4;
+    assert decoded == [Decimal("10000000000000001"), Decimal("2.50"), Decimal("19.99"), Decimal(7), None, None, None];
+
+
+@pytest.mark.parametrize("series", [
+    pd.Series(["2.50", "abc"], name="total_amount", dtype=object),
+    pd.Series([Decimal("1"), object()], name="total_amount", dtype=object),
+], ids=["text", "object"])
+def test_encode_numeric_rejects_values_that_are_not_numbers(series):
+    with pytest.raises(ValueError, match="total_amount"):
+        copy_binary.encode_numeric(series);
+
+
+def test_infinite_numeric_is_not_null():
+    fields, used = copy_binary.encode_numeric(pd.Series([float("inf"), -float("inf")]));
+    assert fields_of(fields, used) == [struct.pack(">ihhHH", 8, 0, 0, copy_binary.NUMERIC_PINF, 0),
+                                       struct.pack(">ihhHH", 8, 0, 0, copy_binary.NUMERIC_NINF, 0)];
+
+
+@pytest.mark.parametrize("values", [["116", "abc"], [116.0, 1.7], [2.0 ** 40]], ids=["not a number", "fraction", "out of range"])
+def test_encode_integer_rejects_what_an_insert_would(values):
+    with pytest.raises(ValueError, match="customer_id"):
+        copy_binary.ENCODERS["int4"](pd.Series(values, name="customer_id"));
+
+
+def test_encode_integer_accepts_whole_floats_and_blanks():
+    # pandas reads an INT column with a blank cell as float64.
+    fields, used = copy_binary.ENCODERS["int4"](pd.Series([116.0, float("nan"), 7.0]));
+    assert fields_of(fields, used) == [struct.pack(">ii", 4, 116), struct.pack(">i", -1), struct.pack(">ii", 4, 7)];
+
+
+def test_encode_date_rejects_text_that_is_not_a_date():
+    with pytest.raises(ValueError, match="order_date"):
+        copy_binary.ENCODERS["date"](pd.Series(["2024-01-02", "not a date"], name="order_date"));
+
+
+def fields_of(fields, used):
+    return [row[:size].tobytes() for row, size in zip(fields, used)];
+
+
+@pytest.mark.parametrize("series", [
+    pd.Series([19.99, 180.0, -0.5, 0.0, 1e16, 2e19, 0.1 + 0.2, 1e300, 1e-7, -9999.9999, 1 / 3, float("nan")]),
+    pd.Series([19.99, None, -2.5], dtype="Float64"),
+    pd.Series([0, -1, 9999, 10000, -123456789012, 2 ** 63 - 1, -2 ** 63]),
+    pd.Series([1, None, -5], dtype="Int64"),
+], ids=["float64", "Float64", "int64", "Int64"])
+def test_numpy_numeric_matches_the_decimal_encoding(series):
+    # The same values as an object column go through to_decimal() and numeric_bytes() one at a time.
+    expected = copy_binary.encode_numeric(series.astype(object));
+    assert fields_of(*copy_binary.encode_numeric(series)) == fields_of(*expected);
+
+
+def test_copy_dataframe_numeric_round_trip(pg_conn):
+    cursor = pg_conn.cursor();
+    cursor.execute("CREATE TEMPORARY TABLE numeric_copy (amount NUMERIC)");
+    values = [Decimal("10000000000000001.25"), Decimal("-0.000000001"), Decimal("19.90"), None];
+    assert copy_binary.copy_dataframe(pd.DataFrame({"amount": values}), "numeric_copy", {"amount": "NUMERIC"}, cursor) == 4;
+    amounts = pd.Series([19.99, 180.0, -0.0001, None]);
+    assert copy_binary.copy_dataframe(pd.DataFrame({"amount": amounts}), "numeric_copy", {"amount": "NUMERIC"}, cursor) == 4;
+
+    cursor.execute("SELECT amount::text FROM numeric_copy");
+    assert [row[0] for row in cursor.fetchall()] == ["10000000000000001.25", "-0.000000001", "19.90", None, "19.99", "180", "-0.0001", None];
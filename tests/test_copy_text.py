@@ -0,0 +1,33 @@
+import pytest;
+
+pytest.importorskip("numpy");
+pd = pytest.importorskip("pandas");
+from common import copy_text;
+
+
+def test_whole_floats_of_an_integer_column_lose_their_fraction():
+    # pandas reads an INT column with a blank cell as float64.
+    series = pd.Series([116.0, float("nan"), 7.0], name="customer_id");
+    assert copy_text.render_column(series, "int4").tolist() == [b"116", b"\\N", b"7"];
+    # Without the table type it is just a float column.
+    assert copy_text.render_column(series).tolist() == [b"116.0", b"\\N", b"7.0"];
+
+
+def test_a_fraction_in_an_integer_column_raises():
+    with pytest.raises(ValueError, match="customer_id"):
+        copy_text.render_column(pd.Series([116.0, 1.5], name="customer_id"), "INT");
+
+
+def test_bulk_insert_text_format_with_blank_integers(a1_conn, monkeypatch):
+    load = pytest.importorskip("load");
+    monkeypatch.setattr(load, "BULK_COPY_FORMAT", "text");
+    cursor = a1_conn.cursor();
+    cursor.execute("INSERT INTO customers (name) VALUES ('Alice')");
+    a1_conn.commit();
+
+    orders_df = pd.DataFrame({"customer_id": [1.0, float("nan")], "order_date": ["2025-01-15", "2025-01-16"],
+                              "total_amount": [120.5, 75.0], "product_id": [101.0, 102.0],
+                              "product_category": ["Electronics", "Books"], "product_name": ["Mouse", "Python"]});
+    assert load.bulk_insert("orders", orders_df, cursor, a1_conn) == 1;
+    cursor.execute("SELECT customer_id, product_id FROM orders ORDER BY order_id");
+    assert cursor.fetchall() == [(1, 101), (None, 102)];
@@ -0,0 +1,23 @@
+import pytest;
+
+psycopg2 = pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+from common import db;
+from conftest import DATABASE_URL;
+
+
+def test_get_manager_refuses_another_pool_size():
+    if(DATABASE_URL is None):
+        pytest.skip("TEST_DATABASE_URL is not set");
+    dsn = psycopg2.extensions.parse_dsn(DATABASE_URL);
+    target = dict(host=dsn.get("host"), database=dsn.get("dbname"), user=dsn.get("user", "postgres"),
+                  password=dsn.get("password"), port=int(dsn.get("port", 5432)));
+    try:
+        manager = db.get_manager(**target, max_conn=3);
+        # Same size, or no size at all: the open pool is reused.
+        assert db.get_manager(**target, max_conn=3) is manager and db.get_manager(**target) is manager;
+        # load.run(workers=4) needs 5 connections, it must not silently get the pool of 3.
+        with pytest.raises(ValueError, match="max_conn=3"):
+            db.get_manager(**target, max_conn=5);
+    finally:
+        db.close_all();
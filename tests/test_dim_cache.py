@@ -0,0 +1,100 @@
+import pytest;
+
+pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import dim_cache;
+import part2;
+
+
+def customer(surrogate_id, city):
+    return {"id": surrogate_id, "name": "Alice", "email": "", "city": city};
+
+
+def test_the_least_recently_used_entity_is_dropped_first():
+    cache = dim_cache.DimensionCache("dim_customers", max_size=2);
+    cache.put(1, customer(10, "New York"));
+    cache.put(2, customer(20, "Boston"));
+    # Reading 1 makes 2 the least recently used one.
+    assert cache.get(1)["id"] == 10;
+    cache.put(3, customer(30, "Chicago"));
+
+    assert cache.get(2) is None;
+    assert cache.get(1)["id"] == 10 and cache.get(3)["id"] == 30;
+    assert cache.stats() == {"table": "dim_customers", "size": 2, "max_size": 2, "hits": 3, "misses": 1,
+                             "evictions": 1, "hit_rate": 0.75};
+
+
+def test_invalidate_forgets_an_entity():
+    cache = dim_cache.DimensionCache("dim_products");
+    cache.put(1, {"id": 5, "name": "Laptop", "category": "Electronics", "price": 1000});
+    cache.invalidate(1);
+    # Forgetting an entity that is not cached is not an error.
+    cache.invalidate(2);
+    assert cache.get(1) is None and cache.stats()["size"] == 0;
+
+
+def test_warm_and_surrogate_id(pg_conn):
+    cursor = pg_conn.cursor();
+    cursor.execute("""
+        INSERT INTO dim_customers (customer_id, name, email, city, valid_end_date) VALUES (1, 'Alice', '', 'New York', now());
+        INSERT INTO dim_customers (customer_id, name, email, city) VALUES (1, 'Alice', '', 'Boston'), (2, 'Bob', '', 'Denver');
+        """);
+    pg_conn.commit();
+
+    # Only the current versions, and at most max_size of them.
+    cache = dim_cache.DimensionCache("dim_customers", max_size=1);
+    assert cache.warm(cursor, pg_conn) == 1;
+    assert cache.stats()["size"] == 1 and cache.stats()["evictions"] == 0;
+
+    cache = dim_cache.DimensionCache("dim_customers");
+    assert cache.warm(cursor, pg_conn) == 2;
+    cursor.execute("SELECT id FROM dim_customers WHERE customer_id = 1 AND valid_end_date IS NULL");
+    assert cache.surrogate_id(1, cursor, pg_conn) == cursor.fetchone()[0];
+    assert cache.get(2)["city"] == "Denver";
+    # Not in the table: a miss that is loaded from the database, and not cached.
+    assert cache.surrogate_id(3, cursor, pg_conn) is None and cache.get(3) is None;
+
+
+def test_a_miss_is_loaded_once(pg_conn):
+    cursor = pg_conn.cursor();
+    cursor.execute("INSERT INTO dim_products (product_id, name, category, price) VALUES (1, 'Laptop', 'Electronics', 1000)");
+    pg_conn.commit();
+    cache = dim_cache.DimensionCache("dim_products");
+
+    assert cache.get_or_load(1, cursor, pg_conn)["name"] == "Laptop";
+    assert cache.get_or_load(1, cursor, pg_conn)["name"] == "Laptop";
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1;
+
+
+def test_the_part2_helpers_write_through(pg_conn):
+    cursor = pg_conn.cursor();
+    assert part2.ensure_current_version_indexes(pg_conn, cursor) == 1;
+    customer_cache = dim_cache.DimensionCache("dim_customers");
+    product_cache = dim_cache.DimensionCache("dim_products");
+
+    first = part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor, customer_cache);
+    assert customer_cache.get(1) == customer(first[0], "New York");
+    moved = part2.update_customer_city(1, "Alice", "", "Boston", pg_conn, cursor, customer_cache);
+    assert customer_cache.get(1) == customer(moved[0], "Boston");
+    cursor.execute("SELECT id FROM dim_customers WHERE customer_id = 1 AND valid_end_date IS NULL");
+    assert cursor.fetchone()[0] == moved[0];
+
+    laptop = part2.add_product(1, "Laptop", "Electronics", 1000, pg_conn, cursor, product_cache);
+    cheaper = part2.update_product_price(1, "Laptop", "Electronics", 800, pg_conn, cursor, product_cache);
+    assert cheaper[0] != laptop[0];
+    assert product_cache.get(1) == {"id": cheaper[0], "name": "Laptop", "category": "Electronics", "price": 800};
+
+
+def test_a_failed_update_rolls_back_and_forgets_the_entity(pg_conn):
+    cursor = pg_conn.cursor();
+    customer_cache = dim_cache.DimensionCache("dim_customers");
+    first = part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor, customer_cache);
+
+    # NULL name breaks the NOT NULL of dim_customers after the retire ran: both are rolled back.
+    assert part2.update_customer_city(1, None, "", "Boston", pg_conn, cursor, customer_cache) is None;
+    cursor.execute("SELECT id, city FROM dim_customers WHERE customer_id = 1 AND valid_end_date IS NULL");
+    assert cursor.fetchall() == [(first[0], "New York")];
+    assert customer_cache.get(1) is None;
+    # The next lookup loads the version that is still current.
+    assert customer_cache.surrogate_id(1, cursor, pg_conn) == first[0];
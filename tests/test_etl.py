@@ -0,0 +1,60 @@
+import pytest;
+
+pytest.importorskip("pandas");
+psycopg2 = pytest.importorskip("psycopg2");
+pytest.importorskip("pymongo");
+pytest.importorskip("dotenv");
+import etl;
+from conftest import DATABASE_URL;
+
+
+def test_the_watermark_waits_for_the_transactions_of_the_last_sync():
+    last = {"order_id": 100, "pending_order_id": 250, "pending_xmax": 1000};
+    # A transaction older than the last sync is still running: nothing moves.
+    assert etl.next_watermark(last, {"max_order_id": 400, "xmin": 999, "xmax": 1200}, {"xmin": 999, "xmax": 1300}) == last;
+    # They have all ended: the mark moves up to what the last sync read, and this sync becomes the pending one.
+    assert etl.next_watermark(last, {"max_order_id": 400, "xmin": 1000, "xmax": 1200}, {"xmin": 1250, "xmax": 1300}) == \
+        {"order_id": 250, "pending_order_id": 400, "pending_xmax": 1300};
+    assert etl.incremental_params(last, {"max_order_id": 400, "xmin": 999, "xmax": 1200}) == {"from_order_id": 100, "max_order_id": 400};
+
+
+def test_an_order_committed_after_a_sync_is_exported_by_the_next_one(pg_conn, tmp_path):
+    mongomock = pytest.importorskip("mongomock");
+    cursor = pg_conn.cursor();
+    cursor.execute("""
+        INSERT INTO dim_customers (customer_id, name, email, city) VALUES (1, 'Alice', '', 'New York');
+        INSERT INTO dim_products (product_id, name, category, price) VALUES (1, 'Laptop', 'Electronics', 1000);
+        """);
+    pg_conn.commit();
+    cursor.execute("SHOW search_path");
+    schema = cursor.fetchone()[0];
+
+    # A second session takes the first order_id but has not committed yet when the first sync runs.
+    late_conn = psycopg2.connect(DATABASE_URL);
+    try:
+        late_cursor = late_conn.cursor();
+        late_cursor.execute(f"SET search_path TO {schema}");
+        late_cursor.execute("INSERT INTO fact_orders (product_id, customer_id, amount) "
+                            "SELECT dp.id, dc.id, 900 FROM dim_products AS dp, dim_customers AS dc RETURNING order_id");
+        late_id = late_cursor.fetchone()[0];
+        cursor.execute("INSERT INTO fact_orders (product_id, customer_id, amount) "
+                       "SELECT dp.id, dc.id, 1000 FROM dim_products AS dp, dim_customers AS dc");
+        pg_conn.commit();
+
+        orders_summary = mongomock.MongoClient().db.orders_summary;
+        watermark_path = str(tmp_path / "watermark.json");
+        first = etl.incremental_export(pg_conn, orders_summary, watermark_path=watermark_path);
+        assert first["documents"] == 1 and first["watermark"]["pending_order_id"] == late_id + 1;
+        # The late transaction still runs: the next sync reads the same orders and keeps the mark below its order_id.
+        again = etl.incremental_export(pg_conn, orders_summary, watermark_path=watermark_path);
+        assert again["documents"] == 1 and again["watermark"] == first["watermark"];
+
+        late_conn.commit();
+    finally:
+        late_conn.close();
+
+    second = etl.incremental_export(pg_conn, orders_summary, watermark_path=watermark_path);
+    assert second["documents"] == 2 and second["watermark"]["order_id"] == late_id + 1;
+    assert sorted(doc["order_id"] for doc in orders_summary.find()) == [late_id, late_id + 1];
+    # Once both orders are confirmed, a sync without new orders reads nothing.
+    assert etl.incremental_export(pg_conn, orders_summary, watermark_path=watermark_path)["documents"] == 0;
@@ -0,0 +1,132 @@
+import asyncio;
+import pytest;
+
+pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("pymongo");
+pytest.importorskip("dotenv");
+pytest.importorskip("asyncpg");
+pytest.importorskip("motor");
+import etl_async;
+
+# The pipeline runs against fakes of the asyncpg connection and the motor collection, no server is needed.
+
+
+class FakeTransaction:
+    def __init__(self, conn):
+        self.conn = conn;
+
+    async def __aenter__(self):
+        self.conn.open_transactions += 1;
+
+    async def __aexit__(self, *exc_info):
+        self.conn.open_transactions -= 1;
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn;
+        self.position = 0;
+
+    async def fetch(self, count):
+        self.conn.fetches += 1;
+        rows = self.conn.rows[self.position:self.position + count];
+        self.position += len(rows);
+        return rows;
+
+
+class FakeConnection:
+    '''
+    asyncpg connection with `rows` as the result of every query, dicts have the keys() / values() of a Record.
+    '''
+    def __init__(self, rows):
+        self.rows = rows;
+        self.fetches = 0;
+        self.open_transactions = 0;
+
+    def transaction(self):
+        return FakeTransaction(self);
+
+    async def cursor(self, query, *args):
+        return FakeCursor(self);
+
+
+class FakeCollection:
+    '''
+    motor collection whose insert_many() waits for `released` (set by default), and raises `error` if it is given.
+    '''
+    def __init__(self, error=None):
+        self.documents = [];
+        self.released = asyncio.Event();
+        self.released.set();
+        self.error = error;
+
+    async def insert_many(self, documents, ordered=True):
+        await self.released.wait();
+        if(self.error is not None):
+            raise self.error;
+        self.documents.extend(documents);
+
+
+def order_rows(count):
+    return [{"order_id": order_id, "customer_id": 1, "amount": 10} for order_id in range(1, count + 1)];
+
+
+async def wait_until_idle(conn):
+    '''
+    Yields to the other tasks until the producer stops fetching.
+    '''
+    fetches = -1;
+    while(fetches != conn.fetches):
+        fetches = conn.fetches;
+        await asyncio.sleep(0.05);
+
+
+def test_a_slow_writer_makes_the_producer_wait():
+    async def scenario():
+        conn = FakeConnection(order_rows(100));
+        orders_summary = FakeCollection();
+        orders_summary.released.clear();
+        export = asyncio.create_task(etl_async.export_pipeline(conn, orders_summary, batch_size=10, writers=1, queue_size=1));
+
+        await wait_until_idle(conn);
+        # One batch in the writer, one in each queue, one in the transform and one in the producer, not the 10 batches.
+        assert conn.fetches <= 5 and orders_summary.documents == [];
+
+        orders_summary.released.set();
+        report = await export;
+        return conn, orders_summary, report;
+
+    conn, orders_summary, report = asyncio.run(scenario());
+    assert [doc["order_id"] for doc in orders_summary.documents] == list(range(1, 101));
+    # 10 batches and the empty fetch that ends the cursor.
+    assert conn.fetches == 11 and report["batches"] == 10 and report["documents"] == 100;
+
+
+def test_every_stage_stops_at_the_end():
+    async def scenario():
+        conn = FakeConnection(order_rows(25));
+        orders_summary = FakeCollection();
+        report = await etl_async.export_pipeline(conn, orders_summary, batch_size=10, writers=3, queue_size=2);
+        # Every writer got its None, nothing is left running once the export returns.
+        return conn, orders_summary, report, asyncio.all_tasks() - {asyncio.current_task()};
+
+    conn, orders_summary, report, pending = asyncio.run(scenario());
+    assert pending == set();
+    assert conn.open_transactions == 0;
+    assert sorted(doc["order_id"] for doc in orders_summary.documents) == list(range(1, 26));
+    assert report["batches"] == 3;
+
+
+def test_a_failing_writer_cancels_the_other_stages():
+    async def scenario():
+        conn = FakeConnection(order_rows(100));
+        orders_summary = FakeCollection(error=RuntimeError("write failed"));
+        with pytest.raises(RuntimeError, match="write failed"):
+            await etl_async.export_pipeline(conn, orders_summary, batch_size=10, writers=2, queue_size=1);
+        return conn, asyncio.all_tasks() - {asyncio.current_task()};
+
+    conn, pending = asyncio.run(scenario());
+    assert pending == set();
+    # The producer was cancelled before reading the whole table, and its transaction was closed.
+    assert conn.fetches < 11 and conn.open_transactions == 0;
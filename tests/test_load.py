@@ -0,0 +1,156 @@
+import pytest;
+
+pd = pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import load;
+
+
+def write_orders_csv(path, customer_ids):
+    lines = ["customer_id,order_date,total_amount,product_id,product_category,product_name"];
+    lines += [f"{customer_id},2025-01-{day + 10},{day}.50,{100 + day},Books,Book {day}" for day, customer_id in enumerate(customer_ids)];
+    path.write_text("\n".join(lines) + "\n");
+    return str(path);
+
+
+@pytest.mark.parametrize("copy_format", ["binary", "text"])
+def test_chunked_insert_copies_every_chunk(a1_conn, tmp_path, monkeypatch, copy_format):
+    monkeypatch.setattr(load, "BULK_COPY_FORMAT", copy_format);
+    cursor = a1_conn.cursor();
+    cursor.execute("INSERT INTO customers (name) VALUES ('Alice'), ('Bob')");
+    a1_conn.commit();
+    # The blank customer_id makes pandas read the column of that chunk as float64.
+    csv_path = write_orders_csv(tmp_path / "orders.csv", ["1", "", "2", "1", "2"]);
+
+    assert load.chunked_insert("orders", csv_path, cursor, a1_conn, chunk_size=2, commit_every=1, prefetch=0) == 1;
+    cursor.execute("SELECT customer_id, total_amount::text FROM orders ORDER BY order_id");
+    assert cursor.fetchall() == [(1, "0.5"), (None, "1.5"), (2, "2.5"), (1, "3.5"), (2, "4.5")];
+
+
+def test_chunked_insert_fails_on_a_value_that_is_not_a_number(a1_conn, tmp_path):
+    cursor = a1_conn.cursor();
+    cursor.execute("INSERT INTO customers (name) VALUES ('Alice')");
+    a1_conn.commit();
+    csv_path = write_orders_csv(tmp_path / "orders.csv", ["1", "abc"]);
+
+    assert load.chunked_insert("orders", csv_path, cursor, a1_conn, chunk_size=10, prefetch=0) == -1;
+    cursor.execute("SELECT COUNT(*) FROM orders");
+    assert cursor.fetchone()[0] == 0;
+
+
+def test_insert_key_range_keeps_the_given_keys(a1_conn):
+    cursor = a1_conn.cursor();
+    range_df = pd.DataFrame({"customer_id": [5, 7], "name": ["Alice", "Bob"], "email": ["a@x", "b@x"],
+                             "phone": ["0123", None], "address": ["1 St", "2 St"]});
+    assert load.insert_key_range("customers", range_df, cursor, a1_conn) == 1;
+    # Loading the same range again skips every row.
+    assert load.insert_key_range("customers", range_df, cursor, a1_conn) == 1;
+    cursor.execute("SELECT customer_id, name, phone FROM customers ORDER BY customer_id");
+    assert cursor.fetchall() == [(5, "Alice", "0123"), (7, "Bob", None)];
+
+
+def test_bulk_and_chunked_reads_get_the_same_row_hash(tmp_path):
+    csv_path = write_orders_csv(tmp_path / "orders.csv", ["1", "", "2", "1"]);
+    # bulk_insert gets the whole file with the types pandas infers, the blank makes customer_id float64.
+    bulk_df = pd.read_csv(csv_path);
+    # The chunked loader: in the first chunk customer_id is float64, in the second one int64.
+    chunked_df = pd.concat(list(load.read_csv_chunks("orders", csv_path, chunk_size=2)));
+    # And every column as text.
+    text_df = pd.read_csv(csv_path, dtype=str);
+    assert bulk_df["customer_id"].dtype != text_df["customer_id"].dtype;
+
+    hashes = [load.fingerprint_rows("orders", frame_df, drop_duplicates=False)[load.ROW_HASH_COLUMN].tolist()
+              for frame_df in (bulk_df, chunked_df, text_df)];
+    assert hashes[0] == hashes[1] == hashes[2];
+    assert len(set(hashes[0])) == 4;
+
+
+def test_fingerprint_rows_drops_the_duplicates_of_a_batch():
+    orders_df = pd.DataFrame({"customer_id": ["1", "1.0", "2", "1"], "order_date": ["2025-01-10"] * 4,
+                              "total_amount": ["0.50", "0.5", "0.50", "0.50"], "product_id": ["100"] * 4,
+                              "product_category": ["Books"] * 4, "product_name": ["Book 0"] * 4});
+    # The first three rows are the same order written three ways, only the first one is kept.
+    fingerprinted = load.fingerprint_rows("orders", orders_df);
+    assert fingerprinted.index.tolist() == [0, 2];
+    assert fingerprinted["customer_id"].tolist() == ["1", "2"];
+
+
+def test_chunked_insert_skips_the_rows_of_a_bulk_insert_in_hash_mode(a1_conn, tmp_path, monkeypatch):
+    monkeypatch.setattr(load, "DEDUP_MODE", "hash");
+    cursor = a1_conn.cursor();
+    cursor.execute("INSERT INTO customers (name) VALUES ('Alice'), ('Bob')");
+    a1_conn.commit();
+    csv_path = write_orders_csv(tmp_path / "orders.csv", ["1", "", "2", "1"]);
+
+    assert load.bulk_insert("orders", pd.read_csv(csv_path), cursor, a1_conn) == 1;
+    assert load.chunked_insert("orders", csv_path, cursor, a1_conn, chunk_size=2, prefetch=0) == 1;
+    # The NULL customer_id too: its row_hash is the same, unlike the UNIQUE index over the columns.
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT row_hash) FROM orders");
+    assert cursor.fetchone() == (4, 4);
+
+
+class CommitCounter:
+    '''
+    psycopg2 connection that counts its commits.
+    '''
+    def __init__(self, conn):
+        self.conn = conn;
+        self.commits = 0;
+
+    def commit(self):
+        self.commits += 1;
+        self.conn.commit();
+
+    def rollback(self):
+        self.conn.rollback();
+
+
+def bundle(name, orders):
+    return {"customer": {"name": name, "email": f"{name.lower()}@example.com", "phone": "555", "address": "1 Main St"},
+            "orders": [{"order_date": "2025-01-10", "total_amount": amount, "product_id": 7, "product_category": "Books",
+                        "product_name": "Book", "deliveries": [{"delivery_date": "2025-01-12", "status": status}]}
+                       for amount, status in orders]};
+
+
+@pytest.mark.parametrize("dedup_mode", ["columns", "hash"])
+def test_insert_bundles_maps_children_to_their_parents(a1_conn, monkeypatch, dedup_mode):
+    monkeypatch.setattr(load, "DEDUP_MODE", dedup_mode);
+    cursor = a1_conn.cursor();
+    # Loaded earlier, so it also has its row_hash.
+    carol_id = load.insert_bundles([bundle("Carol", [])], cursor, a1_conn)[0]["customer_id"];
+    conn = CommitCounter(a1_conn);
+
+    bundles = [
+        bundle("Alice", [(10, "Shipped"), (10, "Shipped")]),  # Two identical orders of the same customer.
+        bundle("Alice", [(20, "Pending")]),                   # Identical customer in the same batch.
+        bundle("Carol", [(30, "Pending")]),                   # Customer already in the table (ON CONFLICT).
+        bundle("Bob", [(10, "Shipped")]),                     # Same order attributes as Alice's, other customer.
+        bundle("Alice", [(40, "Pending")]),                   # Alice again, in the next batch.
+    ];
+    results = load.insert_bundles(bundles, cursor, conn, batch_size=4);
+
+    # The UNIQUE indexes, then one commit per batch.
+    assert conn.commits == 3;
+    alice_id = results[0]["customer_id"];
+    assert [result["customer_id"] for result in results] == [alice_id, alice_id, carol_id, results[3]["customer_id"], alice_id];
+    assert len({alice_id, carol_id, results[3]["customer_id"]}) == 3;
+    # The identical orders share one row and its delivery.
+    assert results[0]["orders"][0] == results[0]["orders"][1];
+
+    cursor.execute("SELECT COUNT(*) FROM customers");
+    assert cursor.fetchone()[0] == 3;
+    cursor.execute("""
+        SELECT c.name, o.total_amount::int, d.status
+        FROM deliveries AS d
+        JOIN orders AS o ON o.order_id = d.order_id
+        JOIN customers AS c ON c.customer_id = o.customer_id
+        ORDER BY d.delivery_id
+        """);
+    assert cursor.fetchall() == [("Alice", 10, "Shipped"), ("Alice", 20, "Pending"), ("Carol", 30, "Pending"),
+                                 ("Bob", 10, "Shipped"), ("Alice", 40, "Pending")];
+    for result, (name, amounts) in zip(results, [("Alice", [10, 10]), ("Alice", [20]), ("Carol", [30]), ("Bob", [10]), ("Alice", [40])]):
+        for order, amount in zip(result["orders"], amounts):
+            cursor.execute("SELECT o.customer_id, o.total_amount::int FROM orders AS o WHERE o.order_id = %s", (order["order_id"],));
+            assert cursor.fetchone() == (result["customer_id"], amount);
+            cursor.execute("SELECT order_id FROM deliveries WHERE delivery_id = ANY(%s)", (order["delivery_ids"],));
+            assert cursor.fetchall() == [(order["order_id"],)];
@@ -0,0 +1,108 @@
+import threading;
+import pytest;
+
+pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import psycopg2;
+import part2;
+from conftest import DATABASE_URL;
+
+
+def test_prepared_lookups_survive_a_new_column(pg_conn):
+    cursor = pg_conn.cursor();
+    assert part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor) is not None;
+    # Prepared on this connection by the first call.
+    before = part2.get_current_customer(1, cursor, pg_conn);
+
+    cursor.execute("ALTER TABLE dim_customers ADD COLUMN loyalty_tier TEXT");
+    pg_conn.commit();
+
+    after = part2.get_current_customer(1, cursor, pg_conn);
+    assert after == before and len(after) == 7;
+    assert part2.get_current_customers([1], cursor, pg_conn)[1] == before;
+
+
+def test_second_current_version_is_skipped(pg_conn):
+    cursor = pg_conn.cursor();
+    assert part2.ensure_current_version_indexes(pg_conn, cursor) == 1;
+    assert part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor) is not None;
+
+    # Different attributes, same customer_id: the partial UNIQUE index rejects it, without an exception.
+    assert part2.add_customer(1, "Alice", "", "Boston", pg_conn, cursor) is None;
+    cursor.execute("SELECT city FROM dim_customers WHERE customer_id = 1 AND valid_end_date IS NULL");
+    assert cursor.fetchall() == [("New York",)];
+
+
+def test_concurrent_add_customer_does_not_raise(pg_conn):
+    cursor = pg_conn.cursor();
+    assert part2.ensure_current_version_indexes(pg_conn, cursor) == 1;
+    cursor.execute("SHOW search_path");
+    search_path = cursor.fetchone()[0];
+
+    other_conn = psycopg2.connect(DATABASE_URL);
+    try:
+        other_cursor = other_conn.cursor();
+        other_cursor.execute(f"SET search_path TO {search_path}");
+        other_conn.commit();
+        # The other session holds an uncommitted current version of customer 1.
+        other_cursor.execute("INSERT INTO dim_customers (customer_id, name, email, city) VALUES (1, 'Alice', '', 'Boston')");
+
+        results = [];
+        adding = threading.Thread(target=lambda: results.append(part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor)));
+        adding.start();
+        # add_customer() waits on the index entry of the other session until it commits.
+        adding.join(timeout=1);
+        assert adding.is_alive();
+        other_conn.commit();
+        adding.join(timeout=10);
+
+        assert results == [None];
+        cursor.execute("SELECT city FROM dim_customers WHERE customer_id = 1 AND valid_end_date IS NULL");
+        assert cursor.fetchall() == [("Boston",)];
+    finally:
+        other_conn.close();
+
+
+def test_a_skipped_update_keeps_the_current_version(pg_conn):
+    dim_cache = pytest.importorskip("dim_cache");
+    cursor = pg_conn.cursor();
+    assert part2.ensure_current_version_indexes(pg_conn, cursor) == 1;
+    first = part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor);
+    assert part2.update_customer_city(1, "Alice", "", "Boston", pg_conn, cursor) is not None;
+    cursor.execute("SELECT valid_end_date FROM dim_customers WHERE id = %s", (first[0],));
+    retired_at = cursor.fetchone()[0];
+
+    # A stale cache still has the retired New York version: its retire is undone when the insert conflicts with Boston.
+    customer_cache = dim_cache.DimensionCache("dim_customers");
+    customer_cache.put(1, {"id": first[0], "name": "Alice", "email": "", "city": "New York"});
+    assert part2.update_customer_city(1, "Alice", "", "Chicago", pg_conn, cursor, customer_cache) is None;
+    cursor.execute("SELECT city FROM dim_customers WHERE customer_id = 1 AND valid_end_date IS NULL");
+    assert cursor.fetchall() == [("Boston",)];
+    cursor.execute("SELECT valid_end_date FROM dim_customers WHERE id = %s", (first[0],));
+    assert cursor.fetchone()[0] == retired_at;
+    assert customer_cache.get(1) is None;
+
+
+def test_a_revert_to_an_old_city_is_a_new_version(pg_conn):
+    scd_batch = pytest.importorskip("scd_batch");
+    pd = pytest.importorskip("pandas");
+    cursor = pg_conn.cursor();
+    assert part2.add_customer(1, "Alice", "", "New York", pg_conn, cursor) is not None;
+    assert part2.update_customer_city(1, "Alice", "", "Boston", pg_conn, cursor) is not None;
+    assert part2.update_customer_city(1, "Alice", "", "New York", pg_conn, cursor) is not None;
+
+    # The batch merge too: back to Boston retires New York and inserts a third version.
+    counts = scd_batch.merge_customers(pd.DataFrame({"customer_id": [1], "name": ["Alice"], "email": [""], "city": ["Boston"]}),
+                                       pg_conn, cursor);
+    assert counts[0]["inserted"] == 1 and counts[0]["retired"] == 1;
+    cursor.execute("SELECT city, valid_end_date IS NULL FROM dim_customers WHERE customer_id = 1 ORDER BY id");
+    assert cursor.fetchall() == [("New York", False), ("Boston", False), ("New York", False), ("Boston", True)];
+
+
+def test_count_rows_does_not_create_missing_tables(pg_conn):
+    cursor = pg_conn.cursor();
+    # The aggregate tables are only created by a run that writes, a dry run counts them as empty.
+    assert part2.count_rows(part2.TRUNCATE_TABLES, cursor, pg_conn) == {table_name: 0 for table_name in part2.TRUNCATE_TABLES};
+    cursor.execute("SELECT to_regclass('agg_city_sales') IS NULL");
+    assert cursor.fetchone()[0];
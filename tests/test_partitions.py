@@ -0,0 +1,84 @@
+import pytest;
+
+pd = pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import partitions;
+from conftest import run_sql_file;
+
+
+@pytest.fixture
+def partitioned_conn(pg_conn):
+    '''
+    pg_conn with fact_orders turned into monthly partitions by partition-fact-orders.sql, and one customer and product.
+    '''
+    cursor = pg_conn.cursor();
+    run_sql_file(cursor, "A2/SQL/partition-fact-orders.sql");
+    cursor.execute("""
+        INSERT INTO dim_customers (customer_id, name, email, city) VALUES (1, 'Alice', '', 'New York');
+        INSERT INTO dim_products (product_id, name, category, price) VALUES (1, 'Laptop', 'Electronics', 1000);
+        """);
+    pg_conn.commit();
+    yield pg_conn;
+
+
+def add_orders(cursor, order_dates):
+    cursor.executemany("INSERT INTO fact_orders (product_id, customer_id, amount, order_date) "
+                       "SELECT dp.id, dc.id, %s, %s FROM dim_products AS dp, dim_customers AS dc",
+                       [(900 + position, order_date) for position, order_date in enumerate(order_dates)]);
+
+
+def rows_of(cursor, table_name):
+    cursor.execute(f"SELECT order_id, amount::int FROM {table_name} ORDER BY order_id");
+    return cursor.fetchall();
+
+
+def test_create_partition_moves_the_rows_out_of_the_default_partition(partitioned_conn):
+    cursor = partitioned_conn.cursor();
+    # No partition for 2020, the orders land in the default partition.
+    add_orders(cursor, ["2020-05-03 10:00:00+00", "2020-05-31 23:59:59+00", "2020-06-01 00:00:00+00"]);
+    partitioned_conn.commit();
+    before = rows_of(cursor, "fact_orders");
+
+    assert partitions.ensure_partitions("2020-05-10", "2020-05-10", partitioned_conn, cursor) == ["fact_orders_2020_05"];
+    # The orders of May are in their partition with their order_id, the one of June stays in the default partition.
+    assert rows_of(cursor, "fact_orders_2020_05") == before[:2];
+    assert rows_of(cursor, partitions.DEFAULT_PARTITION) == before[2:];
+    assert rows_of(cursor, "fact_orders") == before;
+    assert "fact_orders_2020_05" in partitions.existing_partitions(cursor);
+
+
+def test_batch_target_routes_a_single_month_to_its_partition(partitioned_conn):
+    cursor = partitioned_conn.cursor();
+    one_month = pd.Series(pd.to_datetime(["2021-02-01 00:00:00", "2021-02-28 23:00:00"], utc=True));
+    assert partitions.batch_target(one_month, partitioned_conn, cursor) == "fact_orders_2021_02";
+
+    # Two months, or an order without a date (placed now), go through fact_orders, after their partitions are created.
+    two_months = pd.Series(pd.to_datetime(["2021-03-15", "2021-04-15"], utc=True));
+    assert partitions.batch_target(two_months, partitioned_conn, cursor) == partitions.FACT_TABLE;
+    assert {"fact_orders_2021_03", "fact_orders_2021_04"} <= partitions.existing_partitions(cursor);
+    undated = pd.Series([pd.Timestamp("2021-02-10", tz="UTC"), pd.NaT]);
+    assert partitions.batch_target(undated, partitioned_conn, cursor) == partitions.FACT_TABLE;
+
+    # The batch lands in the partition, nothing in the default one.
+    add_orders(cursor, one_month.tolist());
+    partitioned_conn.commit();
+    assert len(rows_of(cursor, "fact_orders_2021_02")) == 2 and rows_of(cursor, partitions.DEFAULT_PARTITION) == [];
+
+
+def test_batch_target_of_a_plain_fact_orders(pg_conn):
+    cursor = pg_conn.cursor();
+    dates = pd.Series(pd.to_datetime(["2021-02-01"], utc=True));
+    assert partitions.batch_target(dates, pg_conn, cursor) == partitions.FACT_TABLE;
+    assert partitions.existing_partitions(cursor) is None;
+
+
+def test_ensure_upcoming_partitions_is_idempotent(partitioned_conn):
+    cursor = partitioned_conn.cursor();
+    # The migration created the months up to MONTHS_AHEAD, two more are missing.
+    created = partitions.ensure_upcoming_partitions(partitioned_conn, cursor, months_ahead=partitions.MONTHS_AHEAD + 2);
+    assert len(created) == 2;
+    existing = partitions.existing_partitions(cursor);
+
+    assert partitions.ensure_upcoming_partitions(partitioned_conn, cursor, months_ahead=partitions.MONTHS_AHEAD + 2) == [];
+    assert partitions.existing_partitions(cursor) == existing;
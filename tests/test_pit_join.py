@@ -0,0 +1,66 @@
+import warnings;
+import pytest;
+
+pd = pytest.importorskip("pandas");
+psycopg2 = pytest.importorskip("psycopg2");
+pytest.importorskip("dotenv");
+import pit_join;
+import fact_loader;
+
+# A customer moved from New York to Chicago at BOUNDARY, the first version ends exactly when the second one starts.
+START = pd.Timestamp("2025-01-01 00:00:00", tz="UTC");
+BOUNDARY = pd.Timestamp("2025-03-01 00:00:00", tz="UTC");
+
+
+def normalized(summary_df):
+    summary_df = summary_df.sort_values("order_id").reset_index(drop=True);
+    summary_df["order_date"] = pd.to_datetime(summary_df["order_date"], utc=True);
+    summary_df["amount"] = summary_df["amount"].astype(float);
+    summary_df["product_price"] = summary_df["product_price"].astype(float);
+    return summary_df;
+
+
+def test_frames_match_the_version_of_the_order():
+    customers_df = pd.DataFrame({"id": [1, 2], "customer_id": [1, 1], "name": ["Alice", "Alice"], "city": ["New York", "Chicago"]});
+    products_df = pd.DataFrame({"id": [1], "product_id": [1], "name": ["Laptop"], "price": [1000]});
+    # Surrogate ids, the order placed at BOUNDARY belongs to the new version.
+    orders_df = pd.DataFrame({"order_id": [1, 2], "order_date": [START, BOUNDARY], "customer_id": [1, 2],
+                              "product_id": [1, 1], "amount": [1000, 900]});
+
+    summary_df = pit_join.pit_join_frames(orders_df, customers_df, products_df);
+
+    assert summary_df["order_id"].tolist() == [1, 2];
+    assert summary_df["customer_city"].tolist() == ["New York", "Chicago"];
+    # Business keys in the summary, like ORDERS_SUMMARY_SQL.
+    assert summary_df["customer_id"].tolist() == [1, 1];
+    assert list(summary_df.columns) == pit_join.SUMMARY_COLUMNS;
+
+
+def test_sql_and_frames_agree_on_a_boundary_order(pg_conn):
+    cursor = pg_conn.cursor();
+    cursor.execute("SET TIME ZONE 'UTC'");
+    cursor.execute(
+        query="""
+        INSERT INTO dim_customers (customer_id, name, email, city, valid_start_date, valid_end_date)
+        VALUES (1, 'Alice', '', 'New York', %(start)s, %(boundary)s), (1, 'Alice', '', 'Chicago', %(boundary)s, NULL);
+        INSERT INTO dim_products (product_id, name, category, price, valid_start_date)
+        VALUES (1, 'Laptop', 'Electronics', 1000, %(start)s);
+        """,
+        vars={"start": START.to_pydatetime(), "boundary": BOUNDARY.to_pydatetime()}
+    );
+    pg_conn.commit();
+    orders_df = pd.DataFrame({"customer_id": [1, 1], "product_id": [1, 1], "amount": [1000, 900], "order_date": [START, BOUNDARY]});
+    assert fact_loader.load_orders(orders_df, pg_conn, cursor) is not None;
+
+    with warnings.catch_warnings():
+        # pd.read_sql_query() warned on the psycopg2 connection.
+        warnings.simplefilter("error");
+        sql_df = normalized(pit_join.read_orders_summary(pg_conn));
+        frames_df = normalized(pit_join.pit_join_frames(*pit_join.read_pit_frames(pg_conn)));
+    # The read transaction is committed, the pooled connection is not left idle in it.
+    assert pg_conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE;
+
+    # One row per order, the boundary order only with the version that starts at BOUNDARY.
+    assert len(sql_df) == 2;
+    assert sql_df.loc[sql_df["order_date"] == BOUNDARY, "customer_city"].tolist() == ["Chicago"];
+    pd.testing.assert_frame_equal(sql_df, frames_df, check_dtype=False);
@@ -0,0 +1,40 @@
+import pytest;
+
+pytest.importorskip("pandas");
+pytest.importorskip("psycopg2");
+import asof_index;
+
+
+def test_validity_ranges_in_a_non_utc_session(pg_conn):
+    cursor = pg_conn.cursor();
+    cursor.execute("SET TIME ZONE 'America/Edmonton'");
+    # Tables created before valid_end_date had a time zone.
+    cursor.execute("ALTER TABLE dim_customers ALTER COLUMN valid_end_date TYPE TIMESTAMP WITHOUT TIME ZONE");
+    cursor.execute("INSERT INTO dim_customers (customer_id, name, email, city) VALUES (1, 'Alice', '', 'New York')");
+    pg_conn.commit();
+    # Retired and replaced in one transaction like update_customer_city(), both with the same CURRENT_TIMESTAMP.
+    cursor.execute("UPDATE dim_customers SET valid_end_date = CURRENT_TIMESTAMP WHERE customer_id = 1");
+    cursor.execute("INSERT INTO dim_customers (customer_id, name, email, city) VALUES (1, 'Alice', '', 'Chicago')");
+    pg_conn.commit();
+
+    assert asof_index.ensure_validity_ranges(pg_conn, cursor) == 1;
+
+    cursor.execute("SELECT data_type FROM information_schema.columns WHERE table_schema = current_schema() "
+                   "AND table_name = 'dim_customers' AND column_name = 'valid_end_date'");
+    assert cursor.fetchone()[0] == "timestamp with time zone";
+    # The exclusion constraint was created, the two versions do not overlap.
+    cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = 'dim_customers_validity_excl' "
+                   "AND connamespace = current_schema()::regnamespace");
+    assert cursor.fetchone() is not None;
+    # The old version ends exactly where the new one starts.
+    cursor.execute("SELECT upper(validity) FROM dim_customers WHERE city = 'New York'");
+    old_end = cursor.fetchone()[0];
+    cursor.execute("SELECT lower(validity) FROM dim_customers WHERE city = 'Chicago'");
+    assert cursor.fetchone()[0] == old_end;
+
+    # Same answers from another time zone.
+    cursor.execute("SET TIME ZONE 'Asia/Tokyo'");
+    version = asof_index.get_customer_as_of(1, old_end, cursor, pg_conn);
+    assert version is not None and "Chicago" in version;
+    cursor.execute("SELECT COUNT(*) FROM dim_customers WHERE validity @> %s::TIMESTAMPTZ", (old_end,));
+    assert cursor.fetchone()[0] == 1;